@@ -1,128 +1,475 @@
+import time
+_import_start = time.perf_counter()
+
 import os
-import numpy as np
-import pandas as pd
-import joblib
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import logging
 
+from features import FEATURES, FeatureValidationError, records_to_matrix, columns_to_matrix
+from prediction_cache import PredictionCache
+from request_coalescer import RequestCoalescer
+from prediction_intervals import parse_quantiles, summarize
+import wire_format
+from forecast import ForecastError, parse_request, forecast_chunks
+from prediction_log import PredictionLog, LOG_PATH, parse_time
+from model_loader import ModelLoader, MODEL_PATH, READY, FAILED
+import model_registry
+import metrics
+from metrics import SamplingProfiler
+
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+logger.info(f"Startup phase 'imports' took {time.perf_counter() - _import_start:.3f}s")
 
 # Create Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Path to the trained model
-MODEL_PATH = os.path.join('model', 'electricity_price_model.pkl')
+# Maximum number of rows accepted by /predict/batch in a single request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 10000))
 
-def load_model():
-    """Load the trained model"""
-    try:
-        if os.path.exists(MODEL_PATH):
-            logger.info(f"Loading model from {MODEL_PATH}")
-            return joblib.load(MODEL_PATH)
-        else:
-            logger.warning(f"Model file not found at {MODEL_PATH}")
-            # Attempt to train a model since one doesn't exist
-            from train_model import train_model
-            logger.info("Attempting to train a new model...")
-            model = train_model()
-            return model
-    except Exception as e:
-        logger.error(f"Error loading model: {str(e)}")
-        return None
+# Serve single-row predictions from the compiled forest instead of the sklearn pipeline
+FAST_INFERENCE = os.environ.get('FAST_INFERENCE', 'true').lower() == 'true'
+
+# Answer /predict from the precomputed grid (see train_model GRID_MODE) when one is available
+USE_PREDICTION_GRID = os.environ.get('USE_PREDICTION_GRID', 'false').lower() == 'true'
+GRID_INTERPOLATION = os.environ.get('GRID_INTERPOLATION', 'linear')
+
+# 'background' binds the server immediately and loads the model in a thread; 'blocking' loads it first
+MODEL_LOADING = os.environ.get('MODEL_LOADING', 'background').lower()
+
+# Set by serve.py: workers memory-map one shared copy of the compiled model
+SHARED_MODEL = os.environ.get('SHARED_MODEL', 'false').lower() == 'true'
+
+# Serve the pruned, reduced-precision forest written by compress_model.py when one exists
+COMPRESSED_MODEL = os.environ.get('COMPRESSED_MODEL', 'false').lower() == 'true'
+
+# Seconds between checks of the model registry for a newly activated version (0 disables hot reload)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 10))
+
+# Gather concurrent /predict calls into vectorized batches (window in ms, max rows per batch)
+COALESCE_REQUESTS = os.environ.get('COALESCE_REQUESTS', 'false').lower() == 'true'
+COALESCE_WINDOW_MS = float(os.environ.get('COALESCE_WINDOW_MS', 2))
+COALESCE_MAX_BATCH = int(os.environ.get('COALESCE_MAX_BATCH', 64))
+
+# Default latency budget for a coalesced request; callers can override it with X-Latency-Budget-Ms
+COALESCE_BUDGET_MS = float(os.environ.get('COALESCE_BUDGET_MS', 50))
+
+# Echo the request fields back in /predict responses (callers can also send ?echo=false)
+ECHO_INPUT = os.environ.get('PREDICT_ECHO_INPUT', 'true').lower() == 'true'
+
+# Profile one request in every PROFILE_EVERY with cProfile (0 disables it; adjustable at runtime via /debug/profile)
+profiler = SamplingProfiler(every=int(os.environ.get('PROFILE_EVERY', 0)))
+
+# Prediction cache settings (CACHE_MAX_ENTRIES=0 disables the cache, a step of 0 keeps exact values)
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+    ttl_seconds=float(os.environ.get('CACHE_TTL_SECONDS', 3600)),
+    load_step=float(os.environ.get('CACHE_LOAD_STEP', 0)),
+    temperature_step=float(os.environ.get('CACHE_TEMPERATURE_STEP', 0))
+)
 
 # Load the model at startup
-model = load_model()
+model_loader = ModelLoader(MODEL_PATH, fast_inference=FAST_INFERENCE, use_grid=USE_PREDICTION_GRID,
+                           grid_interpolation=GRID_INTERPOLATION, shared=SHARED_MODEL,
+                           compressed=COMPRESSED_MODEL)
+if MODEL_LOADING == 'blocking':
+    model_loader.load()
+else:
+    model_loader.start()
+model_loader.watch(MODEL_WATCH_INTERVAL)
+
+coalescer = RequestCoalescer(COALESCE_WINDOW_MS, COALESCE_MAX_BATCH).start() if COALESCE_REQUESTS else None
+
+# Prediction log settings (PREDICTION_LOG=false disables it)
+prediction_log = PredictionLog(
+    path=os.environ.get('PREDICTION_LOG_PATH', LOG_PATH),
+    flush_seconds=float(os.environ.get('PREDICTION_LOG_FLUSH_SECONDS', 1)),
+    max_buffer_rows=int(os.environ.get('PREDICTION_LOG_MAX_BUFFER', 200000)),
+    retention_days=float(os.environ.get('PREDICTION_LOG_RETENTION_DAYS', 0)) or None
+).start() if os.environ.get('PREDICTION_LOG', 'true').lower() == 'true' else None
+
+@app.before_request
+def start_request_metrics():
+    """Count the request as in flight and start the sampling profiler if it is this request's turn"""
+    g.request_start = time.perf_counter()
+    g.profiler = profiler.start()
+    metrics.IN_FLIGHT.inc(endpoint=request.endpoint or 'unmatched')
+
+@app.after_request
+def record_status(response):
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    """Record the request's duration, status and model version"""
+    endpoint = request.endpoint or 'unmatched'
+    status = g.get('status', 500)
+    loaded = model_loader.current
+
+    metrics.IN_FLIGHT.dec(endpoint=endpoint)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.get('request_start', time.perf_counter()),
+                                    endpoint=endpoint)
+    metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=status,
+                         model_version=loaded.version if loaded is not None else '')
+    if status >= 500:
+        metrics.ERRORS.inc(endpoint=endpoint)
+
+    if g.get('profiler') is not None:
+        path = profiler.finish(g.profiler, endpoint)
+        metrics.PROFILED.inc(endpoint=endpoint)
+        logger.info(f"Profile of {request.method} {request.path} written to {path}")
+
+def stage(name):
+    """Time one stage of the current request into the stage histogram"""
+    return metrics.STAGE_SECONDS.time(endpoint=request.endpoint, stage=name)
+
+def active_model():
+    """Return (loaded model, None), or (None, error response) if no model is available yet"""
+    loaded = model_loader.current
+    if loaded is not None:
+        return loaded, None
+    if model_loader.state == FAILED:
+        return None, (jsonify({
+            "status": "error",
+            "message": "No model is loaded"
+        }), 500)
+    return None, (jsonify({
+        "status": "error",
+        "message": "Model is still loading"
+    }), 503)
+
+def predict_one(loaded, features, budget_ms=None):
+    """Predict the price for one record of feature values"""
+    if loaded.grid is not None:
+        # Inputs outside the grid fall through to the model
+        with stage('grid'):
+            prediction = loaded.grid.predict_one(features)
+        if prediction is not None:
+            return prediction
+
+    if coalescer is not None:
+        # Share a vectorized call with concurrent requests; score directly if the budget runs out
+        try:
+            with stage('coalesce'):
+                return coalescer.predict(loaded, features, budget_ms or COALESCE_BUDGET_MS)
+        except TimeoutError as e:
+            logger.warning(f"{str(e)}; predicting directly")
+
+    if loaded.fast_model is not None:
+        # Evaluate the compiled forest straight from the request fields
+        with stage('compiled_forest'):
+            return loaded.fast_model.predict_one(features)
+
+    import pandas as pd
+
+    # Create input DataFrame
+    with stage('dataframe'):
+        input_df = pd.DataFrame({
+            'hour': [features['hour']],
+            'load': [features['load']],
+            'temperature': [features['temperature']],
+            'is_weekend': [1 if features['is_weekend'] else 0],
+            'is_holiday': [1 if features['is_holiday'] else 0]
+        })
+
+    # Make prediction, timing the pipeline steps separately
+    pipeline = loaded.pipeline
+    with stage('scaler'):
+        scaled = pipeline['scaler'].transform(input_df)
+    with stage('forest'):
+        return pipeline['regressor'].predict(scaled)[0]
+
+def log_predictions(loaded, matrix, predictions):
+    """Queue served predictions for the prediction log (the flush happens in the background)"""
+    if prediction_log is not None:
+        prediction_log.record(matrix, predictions, loaded.version, request.endpoint)
+
+def echo_input():
+    """Whether the /predict response should repeat the request fields"""
+    return request.args.get('echo', 'true' if ECHO_INPUT else 'false').lower() == 'true'
+
+def predict_binary(loaded):
+    """Score a binary request body (see wire_format) and answer in the format the client accepts"""
+    try:
+        with stage('parse'):
+            matrix = wire_format.decode(request.get_data(cache=False), request.mimetype)
+    except FeatureValidationError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    n_rows = matrix.shape[0]
+    if n_rows == 0:
+        return jsonify({
+            "status": "error",
+            "message": "Body must contain at least one record"
+        }), 400
+    if n_rows > MAX_BATCH_SIZE:
+        return jsonify({
+            "status": "error",
+            "message": f"Batch size {n_rows} exceeds the maximum of {MAX_BATCH_SIZE}"
+        }), 413
+
+    with stage('predict'):
+        predictions = loaded.predict_matrix(matrix)
+    log_predictions(loaded, matrix, predictions)
+
+    with stage('serialize'):
+        # JSON stays the default for clients that accept anything
+        if request.accept_mimetypes.best_match(['application/json', wire_format.FLOAT32_MIMETYPE]) \
+                == wire_format.FLOAT32_MIMETYPE:
+            return Response(wire_format.encode_predictions(predictions), mimetype=wire_format.FLOAT32_MIMETYPE,
+                            headers={"X-Model-Version": loaded.version, "X-Prediction-Count": str(n_rows)})
+        return jsonify({
+            "status": "success",
+            "count": n_rows,
+            "predictions": predictions.tolist(),
+            "model_version": loaded.version
+        })
+
+def wants_uncertainty(data=None):
+    """Whether the request asked for prediction intervals (?uncertainty=true or a quantiles field)"""
+    if request.args.get('uncertainty', 'false').lower() == 'true' or 'quantiles' in request.args:
+        return True
+    return isinstance(data, dict) and 'quantiles' in data
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint to check the health of the service"""
-    status = "healthy" if model is not None else "unhealthy"
-    return jsonify({
+    loaded = model_loader.current
+    status = "healthy" if loaded is not None else "unhealthy"
+    return jsonify(dict(model_loader.status(), **{
         "status": status,
         "message": "ML service is running",
-        "model_loaded": model is not None
+        "model_loaded": loaded is not None,
+        "fast_inference": loaded is not None and loaded.fast_model is not None,
+        "prediction_grid": loaded is not None and loaded.grid is not None,
+        "cache": prediction_cache.stats(),
+        "prediction_log": prediction_log.stats() if prediction_log is not None else {"enabled": False}
+    }))
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once a model is loaded, 503 while loading or after a failure"""
+    ready = model_loader.state == READY
+    return jsonify({
+        "ready": ready,
+        "state": model_loader.state
+    }), 200 if ready else 503
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Endpoint to get prediction cache counters"""
+    return jsonify({
+        "status": "success",
+        "cache": prediction_cache.stats()
+    })
+
+@app.route('/coalescer/stats', methods=['GET'])
+def coalescer_stats():
+    """Endpoint to get micro-batching histograms"""
+    if coalescer is None:
+        return jsonify({
+            "status": "success",
+            "enabled": False
+        })
+    return jsonify({
+        "status": "success",
+        "enabled": True,
+        "coalescer": coalescer.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Endpoint exposing request, stage and cache metrics in the Prometheus text format"""
+    loaded = model_loader.current
+    if loaded is not None:
+        metrics.MODEL_INFO.replace(1, model_version=loaded.version)
+    cache = prediction_cache.stats()
+    for stat in ('hits', 'misses', 'evictions', 'expirations', 'size'):
+        metrics.CACHE_STATS.set(cache[stat], stat=stat)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def profile_settings():
+    """Endpoint to read or change the sampling profiler rate ({"every": N}, 0 disables it)"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            every = int(data['every'])
+            if every < 0:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                "status": "error",
+                "message": "every must be a non-negative integer"
+            }), 400
+        profiler.every = every
+        logger.info(f"Profiling one request in every {every}" if every else "Request profiling disabled")
+    return jsonify({
+        "status": "success",
+        "every": profiler.every,
+        "output_dir": profiler.output_dir
     })
 
 @app.route('/model-info', methods=['GET'])
 def model_info():
     """Endpoint to get information about the model"""
-    if model is None:
-        return jsonify({
-            "status": "error",
-            "message": "No model is loaded"
-        }), 500
+    loaded, error = active_model()
+    if error:
+        return error
     
     # Extract model information
     info = {
+        "version": loaded.version,
         "model_type": "Random Forest Regressor",
-        "features": ["hour", "load", "temperature", "is_weekend", "is_holiday"],
+        "features": list(FEATURES),
         "preprocessing": "StandardScaler",
     }
     
-    # Add feature importances if available
-    if hasattr(model['regressor'], 'feature_importances_'):
-        importances = model['regressor'].feature_importances_
-        feature_importance = {}
-        for i, feature in enumerate(info["features"]):
-            feature_importance[feature] = float(importances[i])
-        info["feature_importance"] = feature_importance
+    # Add feature importances if available; shared and compressed forests read them from the
+    # metadata saved with the forest, so the pipeline is not unpickled just for this endpoint
+    if "feature_importance" in loaded.info:
+        info["feature_importance"] = loaded.info["feature_importance"]
     
+    # Add compression details if a compressed forest is being served
+    if loaded.compression is not None:
+        info["compression"] = loaded.compression
+
+    # Add prediction grid details if grid mode is active
+    if loaded.grid is not None:
+        info["prediction_grid"] = dict(loaded.grid.info, interpolation=loaded.grid.interpolation)
+
     # Add hyperparameters if available
-    if hasattr(model['regressor'], 'get_params'):
-        params = model['regressor'].get_params()
-        info["hyperparameters"] = params
+    if "hyperparameters" in loaded.info:
+        info["hyperparameters"] = loaded.info["hyperparameters"]
     
     return jsonify({
         "status": "success",
         "model_info": info
     })
 
+@app.route('/model/versions', methods=['GET'])
+def model_versions():
+    """Endpoint to list registered model versions"""
+    loaded = model_loader.current
+    return jsonify(dict(model_registry.list_versions(), **{
+        "status": "success",
+        "serving": loaded.version if loaded is not None else None
+    }))
+
+@app.route('/model/rollback', methods=['POST'])
+def model_rollback():
+    """Endpoint to re-activate an earlier model version and swap it in"""
+    data = request.get_json(silent=True) or {}
+    try:
+        version = model_registry.rollback(data.get('version'))
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    # Load the rolled-back version now rather than waiting for the watcher
+    model_loader.reload()
+    loaded = model_loader.current
+    return jsonify({
+        "status": "success",
+        "active": version,
+        "serving": loaded.version if loaded is not None else None
+    })
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Endpoint to make price predictions based on input parameters"""
-    if model is None:
-        return jsonify({
-            "status": "error",
-            "message": "No model is loaded"
-        }), 500
+    loaded, error = active_model()
+    if error:
+        return error
+    if request.mimetype in wire_format.DECODERS:
+        return predict_binary(loaded)
     
     try:
         # Get data from request
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         
         # Validate required fields
-        required_fields = ['hour', 'load', 'temperature', 'is_weekend', 'is_holiday']
-        for field in required_fields:
-            if field not in data:
+        with stage('validate'):
+            if not isinstance(data, dict):
+                raise FeatureValidationError("Request body must be a JSON object")
+            missing = [field for field in FEATURES if field not in data]
+            if not missing:
+                features = prediction_cache.quantize(data)
+        if missing:
+            return jsonify({
+                "status": "error",
+                "message": f"Missing required field: {missing[0]}"
+            }), 400
+        
+        if wants_uncertainty(data):
+            # Intervals need every tree's output, so skip the cache and grid shortcuts
+            try:
+                quantiles = parse_quantiles(data.get('quantiles', request.args.get('quantiles')))
+            except ValueError as e:
                 return jsonify({
                     "status": "error",
-                    "message": f"Missing required field: {field}"
+                    "message": str(e)
                 }), 400
-        
-        # Create input DataFrame
-        input_df = pd.DataFrame({
-            'hour': [data['hour']],
-            'load': [data['load']],
-            'temperature': [data['temperature']],
-            'is_weekend': [1 if data['is_weekend'] else 0],
-            'is_holiday': [1 if data['is_holiday'] else 0]
-        })
-        
-        # Make prediction
-        prediction = model.predict(input_df)[0]
+            summary = summarize(loaded.predict_trees(records_to_matrix([features])), quantiles)
+            if prediction_log is not None:
+                prediction_log.record_one(features, summary["mean"][0], loaded.version, request.endpoint)
+            response = {
+                "status": "success",
+                "prediction": float(summary["mean"][0]),
+                "uncertainty": {
+                    "std": float(summary["std"][0]),
+                    "quantiles": {label: float(values[0]) for label, values in summary["quantiles"].items()}
+                },
+                "model_version": loaded.version
+            }
+            if echo_input():
+                response["input"] = data
+            return jsonify(response)
+
+        # Look up the (quantized) features in the cache before running the model
+        prediction = None
+        if prediction_cache.enabled:
+            with stage('cache'):
+                prediction_cache.bind_model(loaded)
+                key = prediction_cache.make_key(features)
+                prediction = prediction_cache.get(key)
+
+        if prediction is None:
+            budget_ms = request.headers.get('X-Latency-Budget-Ms', type=float)
+            prediction = predict_one(loaded, features, budget_ms)
+            if prediction_cache.enabled:
+                prediction_cache.put(key, prediction, loaded)
+        if prediction_log is not None:
+            prediction_log.record_one(features, prediction, loaded.version, request.endpoint)
         
         # Return prediction
-        return jsonify({
-            "status": "success",
-            "prediction": float(prediction),
-            "input": data
-        })
+        with stage('serialize'):
+            response = {
+                "status": "success",
+                "prediction": float(prediction),
+                "model_version": loaded.version
+            }
+            if echo_input():
+                response["input"] = data
+            return jsonify(response)
         
+    except FeatureValidationError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error making prediction: {str(e)}")
         return jsonify({
@@ -130,6 +477,213 @@ def predict():
             "message": f"Error making prediction: {str(e)}"
         }), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Endpoint to score many feature records in a single vectorized call
+
+    Accepts either {"records": [{...}, ...]}, a bare list of records, or a
+    columnar payload {"hour": [...], "load": [...], ...}, or a binary body
+    in one of the wire_format layouts.
+    """
+    loaded, error = active_model()
+    if error:
+        return error
+    if request.mimetype in wire_format.DECODERS:
+        return predict_binary(loaded)
+
+    try:
+        with stage('parse'):
+            data = request.get_json()
+
+        # Build the feature matrix, validating the whole batch in one pass
+        try:
+            with stage('validate'):
+                if isinstance(data, list):
+                    matrix = records_to_matrix(data)
+                elif isinstance(data, dict) and 'records' in data:
+                    matrix = records_to_matrix(data['records'])
+                elif isinstance(data, dict):
+                    matrix = columns_to_matrix(data)
+                else:
+                    raise FeatureValidationError("Request body must be a JSON object or list")
+        except FeatureValidationError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+
+        n_rows = matrix.shape[0]
+        if n_rows == 0:
+            return jsonify({
+                "status": "error",
+                "message": "Batch must contain at least one record"
+            }), 400
+        if n_rows > MAX_BATCH_SIZE:
+            return jsonify({
+                "status": "error",
+                "message": f"Batch size {n_rows} exceeds the maximum of {MAX_BATCH_SIZE}"
+            }), 413
+
+        if wants_uncertainty():
+            try:
+                quantiles = parse_quantiles(request.args.get('quantiles'))
+            except ValueError as e:
+                return jsonify({
+                    "status": "error",
+                    "message": str(e)
+                }), 400
+
+            # All per-tree outputs for the batch in one pass
+            summary = summarize(loaded.predict_trees(matrix), quantiles)
+            log_predictions(loaded, matrix, summary["mean"])
+            return jsonify({
+                "status": "success",
+                "count": n_rows,
+                "predictions": summary["mean"].tolist(),
+                "uncertainty": {
+                    "std": summary["std"].tolist(),
+                    "quantiles": {label: values.tolist() for label, values in summary["quantiles"].items()}
+                },
+                "model_version": loaded.version
+            })
+
+        # Score the whole batch at once
+        with stage('predict'):
+            predictions = loaded.predict_matrix(matrix)
+        log_predictions(loaded, matrix, predictions)
+
+        with stage('serialize'):
+            return jsonify({
+                "status": "success",
+                "count": n_rows,
+                "predictions": predictions.tolist(),
+                "model_version": loaded.version
+            })
+
+    except Exception as e:
+        logger.error(f"Error making batch prediction: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": f"Error making batch prediction: {str(e)}"
+        }), 500
+
+def prediction_log_params():
+    """start, end and model_version query arguments of the prediction log endpoints"""
+    return (parse_time(request.args.get('start')), parse_time(request.args.get('end')),
+            request.args.get('model_version') or None)
+
+@app.route('/predictions', methods=['GET'])
+def prediction_history():
+    """Endpoint to list logged predictions in a time range, newest first
+
+    Query arguments: start and end (ISO 8601 or unix seconds, end exclusive),
+    model_version and limit (default 100).
+    """
+    if prediction_log is None:
+        return jsonify({
+            "status": "error",
+            "message": "The prediction log is disabled"
+        }), 404
+    try:
+        start, end, model_version = prediction_log_params()
+        limit = request.args.get('limit', 100, type=int)
+        predictions = prediction_log.query(start, end, model_version, limit)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    return jsonify({
+        "status": "success",
+        "count": len(predictions),
+        "predictions": predictions
+    })
+
+@app.route('/predictions/aggregate', methods=['GET'])
+def prediction_aggregate():
+    """Endpoint to summarize logged predictions over a time range
+
+    Query arguments: start, end and model_version as for /predictions, and
+    group_by: hour (hour-of-day feature, the default), day, model_version or none.
+    """
+    if prediction_log is None:
+        return jsonify({
+            "status": "error",
+            "message": "The prediction log is disabled"
+        }), 404
+    group_by = request.args.get('group_by', 'hour')
+    try:
+        start, end, model_version = prediction_log_params()
+        groups = prediction_log.aggregate(start, end, group_by, model_version)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    return jsonify({
+        "status": "success",
+        "group_by": group_by,
+        "groups": groups
+    })
+
+@app.route('/forecast', methods=['POST'])
+def forecast():
+    """Endpoint to predict an hourly price curve for a whole horizon
+
+    Accepts {"start": "<ISO timestamp>", "load": [...], "temperature": [...]}
+    with one load/temperature value per hour; hour, is_weekend and is_holiday
+    are derived from the timestamps. Send Accept: application/x-ndjson (or
+    ?stream=true) to receive one JSON line per hour as chunks are scored.
+    """
+    loaded, error = active_model()
+    if error:
+        return error
+
+    try:
+        try:
+            start, load, temperature = parse_request(request.get_json())
+        except ForecastError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+
+        # Log each chunk's hourly predictions as it is scored
+        endpoint = request.endpoint
+        log_chunk = None
+        if prediction_log is not None:
+            log_chunk = lambda matrix, predictions: prediction_log.record(matrix, predictions, loaded.version,
+                                                                          endpoint)
+
+        stream = (request.args.get('stream', 'false').lower() == 'true'
+                  or request.accept_mimetypes.best == 'application/x-ndjson')
+        if stream:
+            def generate():
+                for records in forecast_chunks(loaded, start, load, temperature, on_scored=log_chunk):
+                    yield ''.join(json.dumps(record) + '\n' for record in records)
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                            headers={"X-Model-Version": loaded.version})
+
+        # Score the whole horizon in one vectorized call
+        forecast_curve = next(forecast_chunks(loaded, start, load, temperature, chunk_hours=len(load),
+                                              on_scored=log_chunk))
+
+        return jsonify({
+            "status": "success",
+            "start": start.isoformat(),
+            "count": len(forecast_curve),
+            "forecast": forecast_curve,
+            "model_version": loaded.version
+        })
+
+    except Exception as e:
+        logger.error(f"Error making forecast: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": f"Error making forecast: {str(e)}"
+        }), 500
+
 # Add this main block for direct execution
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,286 @@
+"""
+Rolling-origin backtesting over the timestamped history.
+
+Instead of one random train/test split, the model is refitted at a series
+of forecast origins: each fold trains on the --train-window before its
+origin (or on everything before it with --expanding) and is scored on the
+--horizon after it, and the origin then moves forward by --step. No fold
+ever sees rows from after its own origin.
+
+The feature matrix is built from the columnar store once and cached under
+CACHE_DIR as memory-mappable .npy files, keyed on the store's partitions,
+so overlapping windows (and later runs over unchanged data) reuse the same
+rows instead of recomputing them: a fold is just a slice. Folds are fitted
+in parallel worker processes that map the cached arrays.
+
+Per-fold RMSE, MAE, R² and timings are written to <output>/folds.csv and
+a summary to <output>/summary.json.
+
+Usage:
+    python backtest.py --train-window 90D --step 7D --horizon 7D --workers 4
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from features import FEATURES
+from data_store import DATA_PATH, STORE_DIR, ensure_store, iter_partitions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Default windows, as pandas timedeltas
+TRAIN_WINDOW = '90D'
+STEP = '7D'
+HORIZON = '7D'
+
+OUTPUT_DIR = 'backtest'
+CACHE_DIR = os.path.join('data', 'backtest_cache')
+
+# Feature caches kept under CACHE_DIR; caches of older store versions are deleted
+CACHE_KEEP = int(os.environ.get('BACKTEST_CACHE_KEEP', 3))
+
+# Folds with fewer training rows than this are skipped
+MIN_TRAIN_ROWS = 24
+
+# Cached arrays mapped once in each worker process by _init_worker
+_arrays = None
+
+
+def _store_fingerprint(store_dir, manifest):
+    """Changes whenever any partition of the store is rewritten"""
+    digest = hashlib.sha1(os.path.abspath(store_dir).encode())
+    for name, info in sorted(manifest['partitions'].items()):
+        mtime = os.stat(os.path.join(store_dir, name, 'price.npy')).st_mtime_ns
+        digest.update(f"{name}:{info['rows']}:{info['min_timestamp']}:{info['max_timestamp']}:{mtime}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _prune_cache(cache_dir, keep):
+    """Delete all but the `keep` most recently used feature caches"""
+    if not os.path.isdir(cache_dir):
+        return
+    directories = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    directories = sorted((path for path in directories if os.path.isdir(path)), key=os.path.getmtime, reverse=True)
+    for path in directories[max(keep, 1):]:
+        shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Removed stale feature cache {path}")
+
+
+def build_feature_cache(store_dir=STORE_DIR, cache_dir=CACHE_DIR, csv_path=None, keep=CACHE_KEEP):
+    """Write (or reuse) the timestamp, feature and price arrays of the whole history, returning their paths
+
+    Partitions are copied one at a time into preallocated memory-mapped
+    files, so memory stays bounded by one month of rows. Only the default
+    store is synced from DATA_PATH unless csv_path is given; any other store
+    is read as it is.
+    """
+    if csv_path is None and os.path.abspath(store_dir) == os.path.abspath(STORE_DIR):
+        csv_path = DATA_PATH
+    manifest = ensure_store(csv_path, store_dir)
+    if manifest is None or manifest['rows'] == 0:
+        raise RuntimeError(f"No historical data in {store_dir}")
+
+    directory = os.path.join(cache_dir, _store_fingerprint(store_dir, manifest))
+    paths = {name: os.path.join(directory, f"{name}.npy") for name in ('timestamp', 'X', 'y')}
+    if all(os.path.exists(path) for path in paths.values()):
+        logger.info(f"Reusing cached features for {manifest['rows']} rows from {directory}")
+        # Mark it as recently used so pruning keeps it
+        os.utime(directory)
+        _prune_cache(cache_dir, keep)
+        return paths
+
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    rows = manifest['rows']
+    tmp = {name: f"{path}.tmp" for name, path in paths.items()}
+    timestamps = np.lib.format.open_memmap(tmp['timestamp'], mode='w+', dtype=np.int64, shape=(rows,))
+    # RandomForestRegressor fits on float32, so storing float32 avoids a copy per fold
+    X = np.lib.format.open_memmap(tmp['X'], mode='w+', dtype=np.float32, shape=(rows, len(FEATURES)))
+    y = np.lib.format.open_memmap(tmp['y'], mode='w+', dtype=np.float64, shape=(rows,))
+
+    offset = 0
+    for frame in iter_partitions(['timestamp'] + FEATURES + ['price'], csv_path=csv_path, store_dir=store_dir):
+        stop = offset + len(frame)
+        timestamps[offset:stop] = frame['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        X[offset:stop] = frame[FEATURES].to_numpy(dtype=np.float32)
+        y[offset:stop] = frame['price'].to_numpy(dtype=np.float64)
+        offset = stop
+
+    if offset != rows:
+        raise RuntimeError(f"Store returned {offset} rows but its manifest lists {rows}")
+    for array in (timestamps, X, y):
+        array.flush()
+    del timestamps, X, y
+    for name, path in paths.items():
+        os.replace(tmp[name], path)
+    logger.info(f"Cached features for {rows} rows in {time.perf_counter() - started:.2f}s under {directory}")
+    _prune_cache(cache_dir, keep)
+    return paths
+
+
+def make_folds(timestamps, train_window=TRAIN_WINDOW, step=STEP, horizon=HORIZON, expanding=False,
+               min_train_rows=MIN_TRAIN_ROWS):
+    """Row ranges of every fold as dicts, from sorted int64 nanosecond timestamps
+
+    Each fold trains on [origin - train_window, origin) (or everything before
+    origin when expanding) and tests on [origin, origin + horizon). The last
+    test window may be cut short by the end of the history.
+    """
+    train_window, step, horizon = (pd.Timedelta(value).value for value in (train_window, step, horizon))
+    first, last = int(timestamps[0]), int(timestamps[-1])
+
+    folds = []
+    origin = first + train_window
+    while origin <= last:
+        train_start = first if expanding else origin - train_window
+        bounds = np.searchsorted(timestamps, [train_start, origin, origin + horizon], side='left')
+        train_lo, origin_index, test_hi = (int(bound) for bound in bounds)
+        if origin_index - train_lo >= min_train_rows and test_hi > origin_index:
+            folds.append({
+                "fold": len(folds),
+                "train_start": str(pd.Timestamp(train_start)),
+                "origin": str(pd.Timestamp(origin)),
+                "test_end": str(pd.Timestamp(origin + horizon)),
+                "train_rows": (train_lo, origin_index),
+                "test_rows": (origin_index, test_hi),
+            })
+        origin += step
+    return folds
+
+
+def _init_worker(paths):
+    """Map the cached arrays once per worker process"""
+    global _arrays
+    _arrays = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+
+
+def _run_fold(task):
+    """Worker: fit one fold's model on its training slice and score its test slice"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.pipeline import Pipeline
+    from sklearn.metrics import r2_score
+
+    fold, params = task
+    (train_lo, train_hi), (test_lo, test_hi) = fold['train_rows'], fold['test_rows']
+    X, y = _arrays['X'], _arrays['y']
+
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('regressor', RandomForestRegressor(random_state=42, n_jobs=1, **params))
+    ])
+    start = time.perf_counter()
+    pipeline.fit(X[train_lo:train_hi], y[train_lo:train_hi])
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = pipeline.predict(X[test_lo:test_hi])
+    predict_seconds = time.perf_counter() - start
+
+    actual = np.asarray(y[test_lo:test_hi])
+    errors = predictions - actual
+    return dict(
+        {key: value for key, value in fold.items() if key not in ('train_rows', 'test_rows')},
+        train_rows=train_hi - train_lo,
+        test_rows=test_hi - test_lo,
+        rmse=float(np.sqrt(np.mean(errors ** 2))),
+        mae=float(np.mean(np.abs(errors))),
+        # R² is undefined for a single test row
+        r2=float(r2_score(actual, predictions)) if len(actual) > 1 else None,
+        fit_seconds=round(fit_seconds, 4),
+        predict_seconds=round(predict_seconds, 4),
+        sum_squared_error=float(np.sum(errors ** 2)),
+        sum_absolute_error=float(np.sum(np.abs(errors))),
+    )
+
+
+def summarize(results):
+    """Mean and spread of the fold metrics, plus RMSE/MAE pooled over every test row"""
+    frame = pd.DataFrame(results)
+    rows = int(frame['test_rows'].sum())
+    summary = {
+        "folds": len(frame),
+        "test_rows": rows,
+        "pooled_rmse": float(np.sqrt(frame['sum_squared_error'].sum() / rows)),
+        "pooled_mae": float(frame['sum_absolute_error'].sum() / rows),
+        "fit_seconds": float(frame['fit_seconds'].sum()),
+    }
+    for metric in ('rmse', 'mae', 'r2'):
+        values = pd.to_numeric(frame[metric], errors='coerce').dropna()
+        summary[metric] = {
+            "mean": float(values.mean()) if len(values) else None,
+            "std": float(values.std()) if len(values) > 1 else None,
+            "min": float(values.min()) if len(values) else None,
+            "max": float(values.max()) if len(values) else None,
+        }
+    return summary
+
+
+def run_backtest(train_window=TRAIN_WINDOW, step=STEP, horizon=HORIZON, expanding=False, workers=None,
+                 n_estimators=100, max_depth=None, output_dir=OUTPUT_DIR, store_dir=STORE_DIR,
+                 cache_dir=CACHE_DIR, min_train_rows=MIN_TRAIN_ROWS):
+    """Run every fold in parallel, write folds.csv and summary.json, and return the summary"""
+    started = time.perf_counter()
+    paths = build_feature_cache(store_dir, cache_dir)
+    folds = make_folds(np.load(paths['timestamp'], mmap_mode='r'), train_window, step, horizon, expanding,
+                       min_train_rows)
+    if not folds:
+        raise RuntimeError(f"The history is too short for a {train_window} training window")
+    logger.info(f"Running {len(folds)} folds (train window {train_window}{' expanding' if expanding else ''}, "
+                f"step {step}, horizon {horizon})")
+
+    params = {"n_estimators": n_estimators, "max_depth": max_depth}
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths,)) as pool:
+        for result in pool.map(_run_fold, [(fold, params) for fold in folds]):
+            results.append(result)
+            logger.info(f"Fold {result['fold']} (origin {result['origin']}): RMSE {result['rmse']:.2f}, "
+                        f"MAE {result['mae']:.2f}, fit {result['fit_seconds']:.2f}s")
+
+    summary = dict(summarize(results), **{
+        "train_window": train_window,
+        "step": step,
+        "horizon": horizon,
+        "expanding": expanding,
+        "params": params,
+        "total_seconds": round(time.perf_counter() - started, 2),
+    })
+
+    os.makedirs(output_dir, exist_ok=True)
+    columns = [key for key in results[0] if key not in ('sum_squared_error', 'sum_absolute_error')]
+    pd.DataFrame(results)[columns].to_csv(os.path.join(output_dir, 'folds.csv'), index=False)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    logger.info(f"Backtest of {summary['folds']} folds: pooled RMSE {summary['pooled_rmse']:.2f}, "
+                f"pooled MAE {summary['pooled_mae']:.2f}, {summary['total_seconds']:.1f}s; results in {output_dir}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the price model")
+    parser.add_argument('--train-window', default=TRAIN_WINDOW, help="training window before each origin (e.g. 90D)")
+    parser.add_argument('--step', default=STEP, help="distance between consecutive origins (e.g. 7D)")
+    parser.add_argument('--horizon', default=HORIZON, help="test window after each origin (e.g. 7D, 24h)")
+    parser.add_argument('--expanding', action='store_true', help="train on all history before each origin")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--min-train-rows', type=int, default=MIN_TRAIN_ROWS)
+    parser.add_argument('--store', default=STORE_DIR, help="columnar store to backtest on")
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    run_backtest(args.train_window, args.step, args.horizon, expanding=args.expanding, workers=args.workers,
+                 n_estimators=args.n_estimators, max_depth=args.max_depth, output_dir=args.output,
+                 store_dir=args.store, min_train_rows=args.min_train_rows)
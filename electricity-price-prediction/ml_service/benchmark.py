@@ -0,0 +1,245 @@
+"""
+Benchmark suite for inference and training.
+
+Measures cold start (load_model in a fresh interpreter), single-row and
+batch prediction latency/throughput for the sklearn pipeline and the
+compiled forest, end-to-end /predict through the Flask test client, and
+train_model() wall time and peak memory on synthetic datasets. Results are
+written as JSON; --compare checks them against a stored baseline and exits
+with status 1 if anything regressed by more than the tolerance.
+
+Usage:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json --tolerance 0.2
+    python benchmark.py --train-sizes 10000,100000,1000000,10000000 --search halving
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+import logging
+import numpy as np
+
+from features import FEATURES
+from fast_inference import CompiledForest, sample_domain
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TRAIN_SIZES = '10000,100000'
+BATCH_SIZES = [100, 10000]
+RECORD = {'hour': 12, 'load': 15000, 'temperature': 25, 'is_weekend': False, 'is_holiday': False}
+
+# Run in a fresh interpreter so imports and unpickling are measured cold
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from model_loader import load_model
+load_model(sys.argv[1])
+print(json.dumps({"seconds": time.perf_counter() - start}))
+"""
+
+# Run in a scratch directory so the trained model and registry entry are thrown away
+TRAIN_SCRIPT = """
+import json, resource, sys, time
+from train_model import train_model, generate_synthetic_data
+data = generate_synthetic_data(n_samples=int(sys.argv[1]))
+start = time.perf_counter()
+train_model(data=data, search=sys.argv[2], n_jobs=int(sys.argv[3]))
+seconds = time.perf_counter() - start
+peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+# Pool workers only count towards RUSAGE_CHILDREN once they have exited and been reaped
+from joblib.externals.loky import get_reusable_executor
+get_reusable_executor().shutdown(wait=True)
+worker_peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+print(json.dumps({"seconds": seconds, "peak_mb": peak_mb, "worker_peak_mb": worker_peak_mb}))
+"""
+
+
+def result(value, unit, higher_is_better=False, **extra):
+    """One benchmark measurement as stored in the JSON output"""
+    return dict({"value": float(value), "unit": unit, "higher_is_better": higher_is_better}, **extra)
+
+
+def time_calls(func, repeat):
+    """Median and p95 latency of func() in milliseconds"""
+    func()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples)), float(np.percentile(samples, 95))
+
+
+def latency(name, func, repeat, results):
+    median, p95 = time_calls(func, repeat)
+    results[name] = result(median, 'ms', p95_ms=p95)
+    logger.info(f"{name}: median {median:.3f} ms, p95 {p95:.3f} ms")
+
+
+def throughput(name, func, n_rows, repeat, results):
+    median, _ = time_calls(func, repeat)
+    rows_per_second = n_rows / (median / 1000)
+    results[name] = result(rows_per_second, 'rows/s', higher_is_better=True)
+    logger.info(f"{name}: {rows_per_second:,.0f} rows/s")
+
+
+def run_script(script, args, cwd):
+    """Run a benchmark script in a new interpreter and return the JSON it prints last"""
+    env = dict(os.environ, PYTHONPATH=SERVICE_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    completed = subprocess.run([sys.executable, '-c', script] + [str(a) for a in args], cwd=cwd, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "benchmark failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def model_file():
+    """Path of the model the service would serve"""
+    from model_loader import ModelLoader
+
+    return ModelLoader().resolve()[1]
+
+
+def bench_cold_start(path, repeat, results):
+    timings = [run_script(COLD_START_SCRIPT, [path], SERVICE_DIR)['seconds'] for _ in range(repeat)]
+    results['cold_start_load_model'] = result(min(timings) * 1000, 'ms')
+    logger.info(f"cold_start_load_model: {min(timings) * 1000:.1f} ms")
+
+
+def bench_inference(path, repeat, results):
+    import joblib
+    import pandas as pd
+
+    pipeline = joblib.load(path)
+    compiled = CompiledForest.from_pipeline(pipeline)
+
+    row = pd.DataFrame([RECORD], columns=FEATURES)
+    latency('predict_single_pipeline', lambda: pipeline.predict(row), repeat, results)
+    latency('predict_single_compiled', lambda: compiled.predict_one(RECORD), repeat, results)
+
+    for n_rows in BATCH_SIZES:
+        X = sample_domain(n_rows)
+        frame = pd.DataFrame(X, columns=FEATURES)
+        batch_repeat = max(3, repeat // 10)
+        throughput(f'predict_batch_{n_rows}_pipeline', lambda: pipeline.predict(frame), n_rows, batch_repeat, results)
+        throughput(f'predict_batch_{n_rows}_compiled', lambda: compiled.predict(X), n_rows, batch_repeat, results)
+
+
+def bench_flask(repeat, results):
+    # Measure real predictions: load the model up front and leave the cache out
+    os.environ.setdefault('MODEL_LOADING', 'blocking')
+    os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+    os.environ.setdefault('CACHE_MAX_ENTRIES', '0')
+    # Keep benchmark traffic out of the prediction log, and its flush thread out of the timings
+    os.environ.setdefault('PREDICTION_LOG', 'false')
+    from app import app
+
+    client = app.test_client()
+
+    def call():
+        response = client.post('/predict', json=RECORD)
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}")
+
+    latency('flask_predict', call, repeat, results)
+
+
+def bench_training(sizes, search, n_jobs, results):
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory(prefix='benchmark_train_') as scratch:
+            logger.info(f"Training on {n_rows} synthetic rows...")
+            measured = run_script(TRAIN_SCRIPT, [n_rows, search, n_jobs], scratch)
+        results[f'train_{n_rows}_wall_time'] = result(measured['seconds'], 's')
+        # Peak RSS of the training process itself, and of the largest n_jobs worker process (0 with n_jobs=1)
+        results[f'train_{n_rows}_peak_memory'] = result(measured['peak_mb'], 'MB', process='main')
+        results[f'train_{n_rows}_worker_peak_memory'] = result(measured['worker_peak_mb'], 'MB',
+                                                               process='largest worker')
+        logger.info(f"train_{n_rows}: {measured['seconds']:.2f}s, peak {measured['peak_mb']:.0f} MB in the main "
+                    f"process, {measured['worker_peak_mb']:.0f} MB in the largest worker")
+
+
+def compare(results, baseline, tolerance):
+    """Return the names of benchmarks that are worse than the baseline by more than tolerance"""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None or previous['value'] == 0:
+            continue
+        ratio = current['value'] / previous['value']
+        # Express every change so that > 1 means worse
+        slowdown = 1 / ratio if current['higher_is_better'] else ratio
+        regressed = slowdown > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        logger.info(f"{'REGRESSION' if regressed else 'ok':>10}  {name}: {previous['value']:.4g} -> "
+                    f"{current['value']:.4g} {current['unit']} ({(slowdown - 1) * 100:+.1f}%)")
+    return regressions
+
+
+def environment():
+    """Versions and host details stored alongside the results"""
+    import sklearn
+    import pandas as pd
+
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark inference and training")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to check the results against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed slowdown before a benchmark counts as a regression (default 0.2 = 20%%)")
+    parser.add_argument('--repeat', type=int, default=200, help="timed calls per latency benchmark")
+    parser.add_argument('--train-sizes', default=DEFAULT_TRAIN_SIZES,
+                        help="comma-separated synthetic dataset sizes for train_model()")
+    parser.add_argument('--search', default='grid', choices=['grid', 'halving'])
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--skip-train', action='store_true', help="only run the inference benchmarks")
+    args = parser.parse_args(argv)
+
+    results = {}
+    path = model_file()
+    bench_cold_start(path, 3, results)
+    bench_inference(path, args.repeat, results)
+    bench_flask(args.repeat, results)
+    if not args.skip_train:
+        sizes = [int(size) for size in args.train_sizes.split(',') if size.strip()]
+        bench_training(sizes, args.search, args.n_jobs, results)
+
+    report = {"environment": environment(), "model": path, "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            logger.error(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            return 1
+        logger.info("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Offline bulk scoring of large scenario files.
+
+The input is read in chunks of --chunk-rows rows, so memory stays bounded
+whatever the file size. Supported inputs:
+- a CSV with the feature columns
+- a columnar store directory (data_store.py or synthetic_data.py output)
+- a .npy (n_rows, 5) matrix in FEATURES order
+
+Chunks are scored in a process pool. Each worker loads the model once, by
+default by memory-mapping the compiled forest dump (the same file serve.py
+shares between its workers), so the forest is held once in the page cache
+however many workers run. --engine compressed maps the compress_model.py
+artifact instead. --engine pipeline unpickles the sklearn pipeline: several
+times faster on large chunks, but every worker holds its own copy of the
+forest (sklearn copies the tree arrays when unpickling, so they cannot be
+memory-mapped), and memory grows with the number of workers. At most a few chunks per worker are in flight, and their results
+are written in input order as they complete. The output is a CSV of
+predictions (optionally with the input columns), or raw little-endian
+float32 for .f32/.bin paths.
+
+Usage:
+    python bulk_score.py scenarios.csv predictions.csv --workers 8 --chunk-rows 200000
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from features import FEATURES, FeatureValidationError, columns_to_matrix
+from wire_format import encode_predictions
+from model_loader import ModelLoader, export_compiled, compressed_path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 100000
+
+# Chunks queued or being scored per worker; bounds memory while keeping workers busy
+CHUNKS_PER_WORKER = 2
+
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 10
+
+ENGINES = ('compiled', 'compressed', 'pipeline')
+RAW_EXTENSIONS = ('.f32', '.bin')
+
+# Prediction function of the model loaded once in each worker process by _init_worker
+_predict = None
+
+
+def iter_input(path, chunk_rows=CHUNK_ROWS, columns=None):
+    """Yield DataFrames of at most chunk_rows rows from a CSV, .npy or columnar store, in file order"""
+    columns = list(columns or FEATURES)
+    if os.path.isdir(path):
+        from data_store import iter_partitions
+
+        yield from iter_partitions(columns, chunk_rows=chunk_rows, store_dir=path)
+    elif path.endswith('.npy'):
+        matrix = np.load(path, mmap_mode='r')
+        if matrix.ndim != 2 or matrix.shape[1] != len(FEATURES):
+            raise FeatureValidationError(f".npy input must have shape (n_rows, {len(FEATURES)}), got {matrix.shape}")
+        for start in range(0, len(matrix), chunk_rows):
+            yield pd.DataFrame(np.asarray(matrix[start:start + chunk_rows]), columns=FEATURES)
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=lambda name: name in columns)
+
+
+def _init_worker(engine, artifact):
+    """Load the model once per worker process"""
+    global _predict
+    if engine == 'pipeline':
+        from model_loader import load_model
+
+        pipeline = load_model(artifact)
+        _predict = lambda matrix: pipeline.predict(pd.DataFrame(matrix, columns=FEATURES))
+    else:
+        from fast_inference import CompiledForest
+
+        if engine == 'compressed':
+            forest, _ = CompiledForest.load_arrays(artifact, mmap_mode='r')
+        else:
+            forest = CompiledForest.load(artifact, mmap_mode='r')
+        _predict = forest.predict
+
+
+def _score(task):
+    """Worker: validate and score one chunk"""
+    first_row, columns = task
+    try:
+        matrix = columns_to_matrix(columns)
+    except FeatureValidationError as e:
+        raise FeatureValidationError(f"Chunk starting at row {first_row}: {str(e)}")
+    return _predict(matrix)
+
+
+def resolve_artifact(engine):
+    """Path of the model artifact the workers load for an engine"""
+    version, path = ModelLoader().resolve()
+    if not os.path.exists(path):
+        raise RuntimeError(f"No trained model at {path}; run train_model.py first")
+    if engine == 'pipeline':
+        return version, path
+    if engine == 'compressed':
+        directory = compressed_path(version, path)
+        if not os.path.exists(directory):
+            raise RuntimeError(f"Model version {version} has not been compressed; run compress_model.py first")
+        return version, directory
+
+    dump_path = export_compiled(version, path)
+    if dump_path is None:
+        raise RuntimeError(f"Model at {path} could not be compiled")
+    return version, dump_path
+
+
+class PredictionWriter:
+    """Appends scored chunks to a CSV or a raw float32 file"""
+
+    def __init__(self, path, include_input=False):
+        self.path = path
+        self.raw = path.endswith(RAW_EXTENSIONS)
+        self.include_input = include_input and not self.raw
+        self._file = open(path, 'wb') if self.raw else open(path, 'w', newline='')
+        self._header = True
+
+    def write(self, frame, predictions):
+        """Append one chunk's predictions; frame holds its input columns if they are included"""
+        if self.raw:
+            self._file.write(encode_predictions(predictions))
+            return
+        output = frame.reset_index(drop=True) if self.include_input else pd.DataFrame()
+        output['predicted_price'] = predictions
+        output.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+def bulk_score(input_path, output_path, engine='compiled', workers=None, chunk_rows=CHUNK_ROWS,
+               include_input=False):
+    """Score every row of input_path into output_path in input order, returning summary stats"""
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES}, got {engine}")
+    version, artifact = resolve_artifact(engine)
+    workers = workers or os.cpu_count()
+    max_pending = workers * CHUNKS_PER_WORKER
+    logger.info(f"Scoring {input_path} with model version {version} ({engine}) on {workers} workers")
+
+    started = last_report = time.perf_counter()
+    rows = chunks = 0
+    writer = PredictionWriter(output_path, include_input)
+    pending = deque()
+
+    def write_next():
+        nonlocal rows, last_report
+        frame, future = pending.popleft()
+        predictions = future.result()
+        writer.write(frame, predictions)
+        rows += len(predictions)
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            logger.info(f"Scored {rows:,} rows ({rows / (now - started):,.0f} rows/s)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(engine, artifact)) as pool:
+            first_row = 0
+            for frame in iter_input(input_path, chunk_rows):
+                columns = {field: frame[field].to_numpy() for field in FEATURES if field in frame}
+                # Keep the input frame only if its columns are copied to the output
+                pending.append((frame if writer.include_input else None, pool.submit(_score, (first_row, columns))))
+                first_row += len(frame)
+                chunks += 1
+                # Results are written strictly in submission order, so output rows match input rows
+                while len(pending) >= max_pending or (pending and pending[0][1].done()):
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed) if elapsed > 0 else None,
+        "model_version": version,
+        "engine": engine,
+    }
+    logger.info(f"Scored {rows:,} rows in {elapsed:.1f}s ({stats['rows_per_second']:,} rows/s) into {output_path}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a large scenario file with the trained model")
+    parser.add_argument('input', help="CSV file, .npy matrix or columnar store directory")
+    parser.add_argument('output', help="CSV file, or .f32/.bin for raw float32 predictions")
+    parser.add_argument('--engine', choices=ENGINES, default='compiled',
+                        help="memory-mapped compiled forest (default), memory-mapped compressed forest, or the "
+                             "sklearn pipeline (faster on large chunks, but one full copy of the model per worker)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--include-input', action='store_true', help="copy the feature columns to a CSV output")
+    args = parser.parse_args()
+
+    try:
+        bulk_score(args.input, args.output, engine=args.engine, workers=args.workers,
+                   chunk_rows=args.chunk_rows, include_input=args.include_input)
+    except (FeatureValidationError, RuntimeError) as e:
+        logger.error(f"Bulk scoring failed: {str(e)}")
+        sys.exit(1)
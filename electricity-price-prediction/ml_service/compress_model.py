@@ -0,0 +1,278 @@
+"""
+Post-training compression of the random forest into a small, memory-mappable
+artifact.
+
+The held-out rows stored with the model's registry version (the split
+train_model.py and streaming_train.py evaluate on) are divided in two: a
+selection half and a report half. Trees are chosen by greedy forward
+selection on the selection half: each step adds the tree that lowers the
+RMSE of the ensemble mean the most, and the smallest ensemble within
+COMPRESS_RMSE_TOLERANCE of the full forest is kept. The depth cap is then
+chosen the same way, from DEPTH_CANDIDATES. The result is flattened
+with float32 thresholds and float32 (or float16) leaf values into
+model/compressed/<version>/ as plain .npy files, which the service
+memory-maps with COMPRESSED_MODEL=true.
+
+A report comparing size, load time, latency, RMSE and the largest
+prediction difference with the original pipeline, measured on the report
+half that selection never saw, is stored in the artifact's meta.json and shown on /model-info.
+
+Usage:
+    python compress_model.py [--tolerance 0.02] [--max-trees 50] [--value-dtype float16]
+"""
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from features import FEATURES
+from fast_inference import CompiledForest, COMPACT_NODE_DTYPE, sample_domain
+from model_loader import ModelLoader, load_model, compressed_path, describe_pipeline, UNVERSIONED
+from model_registry import load_holdout
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Largest relative increase in selection-split RMSE accepted from pruning trees and capping depth
+RMSE_TOLERANCE = float(os.environ.get('COMPRESS_RMSE_TOLERANCE', 0.02))
+
+# Fewest trees kept, so a small selection split cannot select a handful of lucky trees
+MIN_TREES = int(os.environ.get('COMPRESS_MIN_TREES', 10))
+
+# Depth caps tried, from the least to the most aggressive
+DEPTH_CANDIDATES = [24, 20, 16, 14, 12, 10, 8]
+
+VALUE_DTYPES = ('float32', 'float16')
+
+# Below this many report rows the reported RMSE delta is mostly noise
+MIN_REPORT_ROWS = 200
+
+
+def _rmse(predictions, y):
+    return float(np.sqrt(np.mean((predictions - y) ** 2)))
+
+
+def _recomputed_holdout():
+    """train_model.py's held-out split, recomputed from the data as it is today"""
+    from train_model import load_historical_data, generate_synthetic_data
+
+    data = load_historical_data()
+    if data is None:
+        data = generate_synthetic_data(n_samples=10000)
+    _, X_val, _, y_val = train_test_split(data[FEATURES], data['price'], test_size=0.2, random_state=42)
+    return X_val.to_numpy(dtype=np.float64), y_val.to_numpy(dtype=np.float64)
+
+
+def validation_splits(version=UNVERSIONED):
+    """A version's held-out rows, halved into (X, y) selection and report splits
+
+    Trees and depth are chosen on the selection split only, so the RMSE
+    reported on the other half is not biased by the selection.
+    """
+    holdout = load_holdout(version) if version != UNVERSIONED else None
+    if holdout is None:
+        logger.warning(f"Model version {version} has no stored held-out rows; recomputing train_model.py's split "
+                       "from the current data, which may include rows the model was trained on")
+        holdout = _recomputed_holdout()
+
+    X_select, X_report, y_select, y_report = train_test_split(*holdout, test_size=0.5, random_state=7)
+    if len(y_report) < MIN_REPORT_ROWS:
+        logger.warning(f"Only {len(y_report)} report rows: the reported RMSE delta is not reliable")
+    return (X_select, y_select), (X_report, y_report)
+
+
+def select_trees(per_tree, y, tolerance=RMSE_TOLERANCE, min_trees=MIN_TREES, max_trees=None):
+    """Greedy forward selection of trees on a validation set
+
+    per_tree is the (n_trees, n_rows) matrix of individual tree predictions.
+    Returns the selected tree indices (in selection order) and the
+    validation RMSE of their mean.
+    """
+    n_trees = len(per_tree)
+    max_trees = min(max_trees or n_trees, n_trees)
+    target = _rmse(per_tree.mean(axis=0), y) * (1 + tolerance)
+
+    selected = []
+    total = np.zeros(per_tree.shape[1])
+    available = np.ones(n_trees, dtype=bool)
+    rmse = np.inf
+    while len(selected) < max_trees:
+        # RMSE of the ensemble after adding each remaining tree, all candidates at once
+        candidates = (total + per_tree) / (len(selected) + 1)
+        errors = np.sqrt(np.mean((candidates - y) ** 2, axis=1))
+        errors[~available] = np.inf
+
+        best = int(np.argmin(errors))
+        selected.append(best)
+        available[best] = False
+        total += per_tree[best]
+        rmse = float(errors[best])
+        if len(selected) >= min(min_trees, max_trees) and rmse <= target:
+            break
+    return selected, rmse
+
+
+def select_depth(pipeline, trees, X, y, target):
+    """Smallest depth cap (None for no cap) whose selection-split RMSE stays within target"""
+    depth = max(pipeline['regressor'].estimators_[i].tree_.max_depth for i in trees)
+    max_depth = None
+    for candidate in DEPTH_CANDIDATES:
+        if candidate >= depth:
+            # The selected trees are no deeper than this cap anyway
+            continue
+        forest = CompiledForest.from_pipeline(pipeline, trees=trees, max_depth=candidate)
+        if _rmse(forest.predict(X), y) > target:
+            break
+        max_depth = candidate
+    return max_depth
+
+
+def _median_latency(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def measure(pipeline, model_path, directory, X_report, y_report, repeat=200):
+    """Size, load time, latency and accuracy of the compressed artifact against the original pipeline
+
+    Accuracy is measured on X_report, which must not have been used to select trees or depth.
+    """
+    import joblib
+
+    start = time.perf_counter()
+    joblib.load(model_path)
+    pipeline_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compressed, _ = CompiledForest.load_arrays(directory, mmap_mode='r')
+    compressed_load = time.perf_counter() - start
+    compiled = CompiledForest.from_pipeline(pipeline)
+
+    record = {'hour': 12, 'load': 15000, 'temperature': 25, 'is_weekend': False, 'is_holiday': False}
+    frame = pd.DataFrame([record], columns=FEATURES)
+    X_batch = sample_domain(10000, seed=1)
+    frame_batch = pd.DataFrame(X_batch, columns=FEATURES)
+
+    pipeline_report = pipeline.predict(pd.DataFrame(X_report, columns=FEATURES))
+    compressed_report = compressed.predict(X_report)
+    X_domain = sample_domain()
+    domain_difference = np.abs(compressed.predict(X_domain)
+                               - pipeline.predict(pd.DataFrame(X_domain, columns=FEATURES)))
+
+    original_rmse, compressed_rmse = _rmse(pipeline_report, y_report), _rmse(compressed_report, y_report)
+    return {
+        "size_bytes": {
+            "pipeline": os.path.getsize(model_path),
+            "compiled": int(compiled.nodes.nbytes + compiled.roots.nbytes),
+            "compressed": _directory_size(directory),
+        },
+        "load_seconds": {"pipeline": round(pipeline_load, 4), "compressed": round(compressed_load, 4)},
+        "single_row_ms": {
+            "pipeline": round(_median_latency(lambda: pipeline.predict(frame), repeat) * 1000, 4),
+            "compiled": round(_median_latency(lambda: compiled.predict_one(record), repeat) * 1000, 4),
+            "compressed": round(_median_latency(lambda: compressed.predict_one(record), repeat) * 1000, 4),
+        },
+        "batch_10000_ms": {
+            "pipeline": round(_median_latency(lambda: pipeline.predict(frame_batch), 5) * 1000, 2),
+            "compiled": round(_median_latency(lambda: compiled.predict(X_batch), 5) * 1000, 2),
+            "compressed": round(_median_latency(lambda: compressed.predict(X_batch), 5) * 1000, 2),
+        },
+        "report_rows": int(len(y_report)),
+        "rmse": {
+            "pipeline": round(original_rmse, 4),
+            "compressed": round(compressed_rmse, 4),
+            "delta": round(compressed_rmse - original_rmse, 4),
+        },
+        "max_difference_vs_pipeline": {
+            "report": round(float(np.max(np.abs(compressed_report - pipeline_report))), 4),
+            "domain": round(float(np.max(domain_difference)), 4),
+        },
+    }
+
+
+def compress_model(version=None, model_path=None, tolerance=RMSE_TOLERANCE, min_trees=MIN_TREES,
+                   max_trees=None, value_dtype='float32'):
+    """Prune, depth-cap and narrow a model's forest and write it to model/compressed/<version>
+
+    Defaults to the version the service would serve. Returns the report.
+    """
+    if value_dtype not in VALUE_DTYPES:
+        raise ValueError(f"value_dtype must be one of {VALUE_DTYPES}, got {value_dtype}")
+    if model_path is None:
+        version, model_path = ModelLoader().resolve()
+    pipeline = load_model(model_path)
+    if pipeline is None:
+        raise RuntimeError(f"No model could be loaded from {model_path}")
+
+    (X_select, y_select), (X_report, y_report) = validation_splits(version)
+    full = CompiledForest.from_pipeline(pipeline)
+    per_tree = full.predict_trees(X_select)
+    full_rmse = _rmse(per_tree.mean(axis=0), y_select)
+    target = full_rmse * (1 + tolerance)
+
+    trees, pruned_rmse = select_trees(per_tree, y_select, tolerance, min_trees, max_trees)
+    logger.info(f"Selected {len(trees)} of {len(per_tree)} trees: selection RMSE {full_rmse:.4f} -> {pruned_rmse:.4f}")
+
+    max_depth = select_depth(pipeline, trees, X_select, y_select, target)
+    logger.info(f"Depth cap: {max_depth if max_depth is not None else 'none'} (forest depth {full.depth})")
+
+    dtype = np.dtype([(name, COMPACT_NODE_DTYPE[name] if name != 'value' else np.dtype(value_dtype))
+                      for name in COMPACT_NODE_DTYPE.names])
+    compressed = CompiledForest.from_pipeline(pipeline, trees=sorted(trees), max_depth=max_depth, dtype=dtype)
+
+    directory = compressed_path(version, model_path)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    settings = {
+        "source_version": version,
+        "source_trees": len(per_tree),
+        "selected_trees": sorted(int(tree) for tree in trees),
+        "max_depth": max_depth,
+        "value_dtype": value_dtype,
+        "tolerance": tolerance,
+        "selection_rows": int(len(y_select)),
+    }
+    # Feature importances and hyperparameters of the source forest, served on /model-info
+    model_info = describe_pipeline(pipeline)
+    compressed.save_arrays(directory, **settings, model_info=model_info)
+
+    report = measure(pipeline, model_path, directory, X_report, y_report)
+    compressed.save_arrays(directory, **settings, report=report, model_info=model_info)
+    logger.info(f"Compressed forest for model version {version} written to {directory}")
+    return dict(settings, report=report)
+
+
+def log_report(report):
+    """Log the comparison with the original pipeline"""
+    for section, values in report['report'].items():
+        if isinstance(values, dict):
+            logger.info(f"{section}: " + ", ".join(f"{name}={value}" for name, value in values.items()))
+        else:
+            logger.info(f"{section}: {values}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune and quantize the trained forest into a compressed artifact")
+    parser.add_argument('--model', default=None, help="model file to compress (default: the active version)")
+    parser.add_argument('--version', default=UNVERSIONED, help="version label for --model")
+    parser.add_argument('--tolerance', type=float, default=RMSE_TOLERANCE,
+                        help="largest relative increase in selection-split RMSE accepted")
+    parser.add_argument('--min-trees', type=int, default=MIN_TREES)
+    parser.add_argument('--max-trees', type=int, default=None)
+    parser.add_argument('--value-dtype', choices=VALUE_DTYPES, default='float32')
+    args = parser.parse_args()
+
+    log_report(compress_model(args.version, args.model, tolerance=args.tolerance, min_trees=args.min_trees,
+                              max_trees=args.max_trees, value_dtype=args.value_dtype))
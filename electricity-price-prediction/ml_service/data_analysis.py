@@ -1,150 +1,422 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
-from datetime import datetime
+import json
+import hashlib
 import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from data_store import ensure_store, read_partition, load_data, STORE_DIR
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def analyze_historical_data():
-    """Analyze and visualize historical electricity price data"""
-    try:
-        # Path to historical data
-        data_path = os.path.join('data', 'historical_electricity_data.csv')
-        
-        # Check if the file exists
-        if not os.path.exists(data_path):
-            logger.error(f"Historical data file not found at {data_path}")
-            return
-        
-        # Load the data
-        logger.info(f"Loading data from {data_path}")
-        data = pd.read_csv(data_path)
-        
-        # Convert timestamp to datetime
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        
-        # Display basic information
-        logger.info(f"Dataset shape: {data.shape}")
-        logger.info("\nData summary:")
-        logger.info(f"\n{data.describe()}")
-        
-        # Create output directory for plots
-        plots_dir = os.path.join('data', 'analysis')
-        os.makedirs(plots_dir, exist_ok=True)
-        
-        # Time series plot of electricity prices
-        plt.figure(figsize=(12, 6))
-        plt.plot(data['timestamp'], data['price'], marker='o', linestyle='-', alpha=0.7)
-        plt.title('Electricity Price Over Time')
-        plt.xlabel('Date')
-        plt.ylabel('Price ($/MWh)')
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_time_series.png'))
-        
-        # Price distribution
-        plt.figure(figsize=(10, 6))
-        sns.histplot(data['price'], kde=True, bins=20)
-        plt.title('Distribution of Electricity Prices')
-        plt.xlabel('Price ($/MWh)')
-        plt.ylabel('Frequency')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_distribution.png'))
-        
-        # Price by hour of day
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(x='hour', y='price', data=data)
-        plt.title('Electricity Price by Hour of Day')
-        plt.xlabel('Hour')
-        plt.ylabel('Price ($/MWh)')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_by_hour.png'))
-        
-        # Price by weekend/weekday
-        plt.figure(figsize=(8, 6))
-        sns.boxplot(x='is_weekend', y='price', data=data)
-        plt.title('Electricity Price: Weekend vs Weekday')
-        plt.xlabel('Weekend (1) vs Weekday (0)')
-        plt.ylabel('Price ($/MWh)')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_weekend_weekday.png'))
-        
-        # Price by holiday/non-holiday
-        plt.figure(figsize=(8, 6))
-        sns.boxplot(x='is_holiday', y='price', data=data)
-        plt.title('Electricity Price: Holiday vs Non-Holiday')
-        plt.xlabel('Holiday (1) vs Non-Holiday (0)')
-        plt.ylabel('Price ($/MWh)')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_holiday_nonholiday.png'))
-        
-        # Correlation heatmap
-        plt.figure(figsize=(10, 8))
-        correlation = data[['hour', 'load', 'temperature', 'is_weekend', 'is_holiday', 'price']].corr()
-        sns.heatmap(correlation, annot=True, cmap='coolwarm', linewidths=0.5)
-        plt.title('Correlation Heatmap')
-        plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'correlation_heatmap.png'))
-        
-        # Price vs Load scatter plot
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(x='load', y='price', hue='hour', data=data, palette='viridis', alpha=0.7)
-        plt.title('Electricity Price vs Load')
-        plt.xlabel('Load (MW)')
+# Columns summarized by the analysis
+COLUMNS = ['hour', 'load', 'temperature', 'is_weekend', 'is_holiday', 'price']
+
+# Histogram bin width per column; every partition uses the same bins so histograms can be merged
+BIN_WIDTHS = {'hour': 1, 'load': 10, 'temperature': 0.1, 'is_weekend': 1, 'is_holiday': 1, 'price': 0.1}
+
+# Columns whose price distribution is shown as one box per value
+GROUP_COLUMNS = ['hour', 'is_weekend', 'is_holiday']
+
+# Points kept per partition for the scatter plots, and the most drawn in total
+SAMPLE_PER_PARTITION = 5000
+MAX_SCATTER_POINTS = 20000
+
+# Bump when the aggregates change shape so cached partitions are recomputed
+AGGREGATE_VERSION = 1
+
+PLOTS_DIR = os.path.join('data', 'analysis')
+CACHE_DIR_NAME = 'cache'
+
+
+def _histogram(values, width):
+    """Counts of values in bins of the given width, as (index of the first bin, counts)"""
+    if len(values) == 0:
+        return 0, np.zeros(0, dtype=np.int64)
+    index = np.floor(values / width + 0.5).astype(np.int64)
+    offset = int(index.min())
+    return offset, np.bincount(index - offset)
+
+
+def _merge_histograms(first, second):
+    if len(first[1]) == 0:
+        return second
+    if len(second[1]) == 0:
+        return first
+    offset = min(first[0], second[0])
+    end = max(first[0] + len(first[1]), second[0] + len(second[1]))
+    counts = np.zeros(end - offset, dtype=np.int64)
+    for start, part in (first, second):
+        counts[start - offset:start - offset + len(part)] += part
+    return offset, counts
+
+
+def _histogram_quantiles(histogram, width, quantiles):
+    """Approximate quantiles (to within half a bin) from a histogram"""
+    offset, counts = histogram
+    cumulative = np.cumsum(counts)
+    positions = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1], side='left')
+    return (offset + np.minimum(positions, len(counts) - 1)) * width
+
+
+def _partition_fingerprint(store_dir, name, info):
+    """Changes whenever the partition's rows are rewritten"""
+    mtime = os.stat(os.path.join(store_dir, name, 'price.npy')).st_mtime_ns
+    return (f"{AGGREGATE_VERSION}:{os.path.abspath(store_dir)}:{name}:{info['rows']}:"
+            f"{info['min_timestamp']}:{info['max_timestamp']}:{mtime}")
+
+
+def aggregate_partition(store_dir, name):
+    """Compute the mergeable aggregates of one month partition"""
+    frame = read_partition(name, ['timestamp'] + COLUMNS, store_dir=store_dir)
+    values = frame[COLUMNS].to_numpy(dtype=np.float64)
+    price = values[:, COLUMNS.index('price')]
+
+    groups = {}
+    for column in GROUP_COLUMNS:
+        keys = values[:, COLUMNS.index(column)].astype(np.int64)
+        groups[column] = {}
+        for key in np.unique(keys):
+            group_price = price[keys == key]
+            groups[column][int(key)] = (len(group_price), float(group_price.sum()),
+                                        _histogram(group_price, BIN_WIDTHS['price']))
+
+    daily = frame.set_index('timestamp')['price'].resample('D').agg(['mean', 'min', 'max', 'count'])
+    daily = daily[daily['count'] > 0]
+
+    rng = np.random.default_rng(int(hashlib.md5(name.encode()).hexdigest()[:8], 16))
+    sample_size = min(len(frame), SAMPLE_PER_PARTITION)
+    sample = frame[['hour', 'load', 'temperature', 'price']].iloc[
+        rng.choice(len(frame), sample_size, replace=False)]
+
+    return {
+        "rows": len(frame),
+        "sum": values.sum(axis=0),
+        "cross": values.T @ values,
+        "min": values.min(axis=0) if len(frame) else np.full(len(COLUMNS), np.nan),
+        "max": values.max(axis=0) if len(frame) else np.full(len(COLUMNS), np.nan),
+        "histograms": {column: _histogram(values[:, i], BIN_WIDTHS[column]) for i, column in enumerate(COLUMNS)},
+        "groups": groups,
+        "daily": daily,
+        "sample": sample,
+        "time_range": (frame['timestamp'].min(), frame['timestamp'].max()),
+    }
+
+
+def _aggregate_task(task):
+    store_dir, name = task
+    return name, aggregate_partition(store_dir, name)
+
+
+def merge_aggregates(parts):
+    """Combine per-partition aggregates into dataset-wide ones"""
+    parts = [part for part in parts if part['rows']]
+    merged = {
+        "rows": sum(part['rows'] for part in parts),
+        "sum": sum(part['sum'] for part in parts),
+        "cross": sum(part['cross'] for part in parts),
+        "min": np.min([part['min'] for part in parts], axis=0),
+        "max": np.max([part['max'] for part in parts], axis=0),
+        "histograms": {},
+        "groups": {column: {} for column in GROUP_COLUMNS},
+        "daily": pd.concat([part['daily'] for part in parts]).sort_index(),
+        "time_range": (min(part['time_range'][0] for part in parts), max(part['time_range'][1] for part in parts)),
+    }
+    for part in parts:
+        for column, histogram in part['histograms'].items():
+            merged['histograms'][column] = _merge_histograms(merged['histograms'].get(column, (0, np.zeros(0))),
+                                                             histogram)
+        for column, groups in part['groups'].items():
+            for key, (count, total, histogram) in groups.items():
+                previous_count, previous_total, previous_histogram = merged['groups'][column].get(
+                    key, (0, 0.0, (0, np.zeros(0))))
+                merged['groups'][column][key] = (previous_count + count, previous_total + total,
+                                                 _merge_histograms(previous_histogram, histogram))
+
+    # Keep each partition's share of the scatter sample proportional to its size (samples are in random order)
+    samples = []
+    for part in parts:
+        share = max(1, int(round(MAX_SCATTER_POINTS * part['rows'] / merged['rows'])))
+        samples.append(part['sample'].iloc[:share] if share < len(part['sample']) else part['sample'])
+    merged['sample'] = pd.concat(samples, ignore_index=True)
+    return merged
+
+
+def summary_tables(aggregates):
+    """Descriptive statistics, correlation and group means computed from the aggregates
+
+    Counts, means, standard deviations, extremes and correlations are exact.
+    The quartiles are estimated from the merged histograms, so they are only
+    accurate to within half a bin (BIN_WIDTHS).
+    """
+    n = aggregates['rows']
+    mean = aggregates['sum'] / n
+    covariance = aggregates['cross'] / n - np.outer(mean, mean)
+    std = np.sqrt(np.maximum(np.diag(covariance), 0) * n / max(n - 1, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = covariance / np.outer(np.sqrt(np.diag(covariance)), np.sqrt(np.diag(covariance)))
+
+    quartiles = np.array([_histogram_quantiles(aggregates['histograms'][column], BIN_WIDTHS[column],
+                                               [0.25, 0.5, 0.75]) for column in COLUMNS])
+    describe = pd.DataFrame({
+        'count': float(n), 'mean': mean, 'std': std, 'min': aggregates['min'],
+        '25%': quartiles[:, 0], '50%': quartiles[:, 1], '75%': quartiles[:, 2], 'max': aggregates['max'],
+    }, index=COLUMNS).T
+
+    group_means = {
+        column: pd.Series({key: total / count for key, (count, total, _) in sorted(groups.items())},
+                          name='price').rename_axis(column)
+        for column, groups in aggregates['groups'].items()
+    }
+
+    return {
+        "describe": describe,
+        "correlation": pd.DataFrame(correlation, index=COLUMNS, columns=COLUMNS),
+        "group_means": group_means,
+    }
+
+
+def _box_stats(groups):
+    """Box plot statistics per group from price histograms (whiskers at 1.5 IQR, no fliers)"""
+    width = BIN_WIDTHS['price']
+    stats = []
+    for key, (_, _, (offset, counts)) in sorted(groups.items()):
+        q1, median, q3 = _histogram_quantiles((offset, counts), width, [0.25, 0.5, 0.75])
+        centers = (offset + np.nonzero(counts)[0]) * width
+        iqr = q3 - q1
+        stats.append({
+            "label": str(key), "med": median, "q1": q1, "q3": q3,
+            "whislo": centers[centers >= q1 - 1.5 * iqr].min(),
+            "whishi": centers[centers <= q3 + 1.5 * iqr].max(),
+        })
+    return stats
+
+
+def _plot_time_series(aggregates, path, plt, sns):
+    daily = aggregates['daily']
+    plt.figure(figsize=(12, 6))
+    plt.fill_between(daily.index, daily['min'], daily['max'], alpha=0.2, label='Daily range')
+    plt.plot(daily.index, daily['mean'], marker='o' if len(daily) <= 400 else None, linestyle='-', alpha=0.7,
+             label='Daily mean')
+    plt.title('Electricity Price Over Time')
+    plt.xlabel('Date')
+    plt.ylabel('Price ($/MWh)')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(path)
+
+
+def _plot_distribution(aggregates, path, plt, sns):
+    offset, counts = aggregates['histograms']['price']
+    width = BIN_WIDTHS['price']
+    centers = (offset + np.arange(len(counts))) * width
+    plt.figure(figsize=(10, 6))
+    sns.histplot(x=centers, weights=counts, bins=20, kde=True)
+    plt.title('Distribution of Electricity Prices')
+    plt.xlabel('Price ($/MWh)')
+    plt.ylabel('Frequency')
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(path)
+
+
+def _plot_boxes(column, title, xlabel, figsize):
+    def plot(aggregates, path, plt, sns):
+        plt.figure(figsize=figsize)
+        plt.gca().bxp(_box_stats(aggregates['groups'][column]), showfliers=False)
+        plt.title(title)
+        plt.xlabel(xlabel)
         plt.ylabel('Price ($/MWh)')
         plt.grid(True, alpha=0.3)
         plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_vs_load.png'))
-        
-        # Price vs Temperature scatter plot
+        plt.savefig(path)
+    return plot
+
+
+def _plot_correlation(aggregates, path, plt, sns):
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(summary_tables(aggregates)['correlation'], annot=True, cmap='coolwarm', linewidths=0.5)
+    plt.title('Correlation Heatmap')
+    plt.tight_layout()
+    plt.savefig(path)
+
+
+def _plot_scatter(column, title, xlabel):
+    def plot(aggregates, path, plt, sns):
         plt.figure(figsize=(10, 6))
-        sns.scatterplot(x='temperature', y='price', hue='hour', data=data, palette='viridis', alpha=0.7)
-        plt.title('Electricity Price vs Temperature')
-        plt.xlabel('Temperature (°C)')
+        sns.scatterplot(x=column, y='price', hue='hour', data=aggregates['sample'], palette='viridis', alpha=0.7)
+        plt.title(title)
+        plt.xlabel(xlabel)
         plt.ylabel('Price ($/MWh)')
         plt.grid(True, alpha=0.3)
         plt.tight_layout()
-        plt.savefig(os.path.join(plots_dir, 'price_vs_temperature.png'))
-        
+        plt.savefig(path)
+    return plot
+
+
+PLOTS = {
+    'price_time_series.png': _plot_time_series,
+    'price_distribution.png': _plot_distribution,
+    'price_by_hour.png': _plot_boxes('hour', 'Electricity Price by Hour of Day', 'Hour', (10, 6)),
+    'price_weekend_weekday.png': _plot_boxes('is_weekend', 'Electricity Price: Weekend vs Weekday',
+                                             'Weekend (1) vs Weekday (0)', (8, 6)),
+    'price_holiday_nonholiday.png': _plot_boxes('is_holiday', 'Electricity Price: Holiday vs Non-Holiday',
+                                                'Holiday (1) vs Non-Holiday (0)', (8, 6)),
+    'correlation_heatmap.png': _plot_correlation,
+    'price_vs_load.png': _plot_scatter('load', 'Electricity Price vs Load', 'Load (MW)'),
+    'price_vs_temperature.png': _plot_scatter('temperature', 'Electricity Price vs Temperature', 'Temperature (°C)'),
+}
+
+
+def _render(task):
+    """Worker: draw one figure from the aggregates"""
+    filename, aggregates, plots_dir = task
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    PLOTS[filename](aggregates, os.path.join(plots_dir, filename), plt, sns)
+    plt.close('all')
+    return filename
+
+
+def _load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    import joblib
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable analysis cache: {str(e)}")
+        return {}
+
+
+def _save_cache(cache, path):
+    import joblib
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(cache, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def write_summary(aggregates, tables, summary_path):
+    """Write the text summary of the dataset"""
+    with open(summary_path, 'w') as f:
+        f.write("Electricity Price Prediction - Data Summary\n")
+        f.write("===========================================\n\n")
+        f.write(f"Dataset shape: ({aggregates['rows']}, {len(COLUMNS) + 1})\n")
+        f.write(f"Time range: {aggregates['time_range'][0]} to {aggregates['time_range'][1]}\n\n")
+        f.write("Descriptive Statistics:\n")
+        # Integer columns fall on bin centres, so only the continuous ones are approximate
+        f.write("(25%/50%/75% are estimated from histograms, to within "
+                + ", ".join(f"{BIN_WIDTHS[column] / 2:g} for {column}" for column in ('load', 'temperature', 'price'))
+                + ")\n")
+        f.write(f"{tables['describe'].to_string()}\n\n")
+        f.write("Correlation Matrix:\n")
+        f.write(f"{tables['correlation'].to_string()}\n\n")
+
+        # Additional statistics
+        f.write("Average price by hour:\n")
+        f.write(f"{tables['group_means']['hour'].to_string()}\n\n")
+
+        f.write("Average price by weekend/weekday:\n")
+        f.write(f"{tables['group_means']['is_weekend'].to_string()}\n\n")
+
+        f.write("Average price by holiday/non-holiday:\n")
+        f.write(f"{tables['group_means']['is_holiday'].to_string()}\n\n")
+
+
+def analyze_historical_aggregates(store_dir=STORE_DIR, plots_dir=PLOTS_DIR, workers=None):
+    """Analyze and visualize historical electricity price data without loading it all
+
+    Aggregates are computed per month partition and cached under the
+    partition's fingerprint, so a run only reads partitions that changed
+    since the last one. Figures are drawn in parallel worker processes from
+    the merged aggregates (histograms, group statistics, daily price bands
+    and a bounded point sample) rather than from every row, and are only
+    redrawn when the data changed. Returns the merged aggregates.
+    """
+    try:
+        # Bring the columnar store up to date with the CSV
+        manifest = ensure_store(store_dir=store_dir)
+        if manifest is None or not manifest['partitions']:
+            logger.error(f"No historical data found for the store at {store_dir}")
+            return
+
+        cache_path = os.path.join(plots_dir, CACHE_DIR_NAME, 'aggregates.pkl')
+        rendered_path = os.path.join(plots_dir, CACHE_DIR_NAME, 'rendered.json')
+
+        # Only aggregate partitions whose fingerprint changed
+        cache = _load_cache(cache_path)
+        fingerprints = {name: _partition_fingerprint(store_dir, name, info)
+                        for name, info in manifest['partitions'].items()}
+        stale = [name for name, fingerprint in fingerprints.items()
+                 if cache.get(name, (None,))[0] != fingerprint]
+        logger.info(f"{len(fingerprints) - len(stale)} partitions cached, {len(stale)} to aggregate")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if stale:
+                for name, aggregates in pool.map(_aggregate_task, [(store_dir, name) for name in stale]):
+                    cache[name] = (fingerprints[name], aggregates)
+                # Drop partitions that no longer exist
+                cache = {name: cache[name] for name in fingerprints}
+                _save_cache(cache, cache_path)
+
+            aggregates = merge_aggregates([cache[name][1] for name in sorted(fingerprints)])
+            tables = summary_tables(aggregates)
+
+            # Display basic information
+            logger.info(f"Dataset shape: ({aggregates['rows']}, {len(COLUMNS) + 1})")
+            logger.info("\nData summary:")
+            logger.info(f"\n{tables['describe']}")
+
+            # Skip drawing if nothing changed since the figures were last rendered
+            os.makedirs(plots_dir, exist_ok=True)
+            dataset_fingerprint = hashlib.sha256('|'.join(sorted(fingerprints.values())).encode()).hexdigest()
+            rendered = {}
+            if os.path.exists(rendered_path):
+                with open(rendered_path) as f:
+                    rendered = json.load(f)
+            pending = [filename for filename in PLOTS
+                       if rendered.get(filename) != dataset_fingerprint
+                       or not os.path.exists(os.path.join(plots_dir, filename))]
+
+            for filename in pool.map(_render, [(filename, aggregates, plots_dir) for filename in pending]):
+                rendered[filename] = dataset_fingerprint
+            logger.info(f"Rendered {len(pending)} of {len(PLOTS)} figures")
+
+        os.makedirs(os.path.dirname(rendered_path), exist_ok=True)
+        with open(rendered_path, 'w') as f:
+            json.dump(rendered, f, indent=2)
+
         # Generate summary statistics file
-        summary_path = os.path.join(plots_dir, 'data_summary.txt')
-        with open(summary_path, 'w') as f:
-            f.write("Electricity Price Prediction - Data Summary\n")
-            f.write("===========================================\n\n")
-            f.write(f"Dataset shape: {data.shape}\n\n")
-            f.write("Descriptive Statistics:\n")
-            f.write(f"{data.describe().to_string()}\n\n")
-            f.write("Correlation Matrix:\n")
-            f.write(f"{correlation.to_string()}\n\n")
-            
-            # Additional statistics
-            f.write("Average price by hour:\n")
-            f.write(f"{data.groupby('hour')['price'].mean().to_string()}\n\n")
-            
-            f.write("Average price by weekend/weekday:\n")
-            f.write(f"{data.groupby('is_weekend')['price'].mean().to_string()}\n\n")
-            
-            f.write("Average price by holiday/non-holiday:\n")
-            f.write(f"{data.groupby('is_holiday')['price'].mean().to_string()}\n\n")
-        
+        write_summary(aggregates, tables, os.path.join(plots_dir, 'data_summary.txt'))
+
         logger.info(f"Analysis completed. Plots and summary saved to {plots_dir}")
-        
-        # Return data for further analysis if needed
-        return data
-        
+
+        # Return aggregates for further analysis if needed
+        return aggregates
+
     except Exception as e:
         logger.error(f"Error analyzing historical data: {str(e)}")
-        
+
+
+def analyze_historical_data(store_dir=STORE_DIR, plots_dir=PLOTS_DIR, workers=None):
+    """Analyze and visualize historical electricity price data, returning the data as a DataFrame
+
+    This loads every row once the analysis is done; use
+    analyze_historical_aggregates for histories that do not fit in memory.
+    """
+    if analyze_historical_aggregates(store_dir, plots_dir, workers) is None:
+        return None
+    return load_data(store_dir=store_dir)
+
 if __name__ == "__main__":
-    analyze_historical_data() 
\ No newline at end of file
+    analyze_historical_aggregates()
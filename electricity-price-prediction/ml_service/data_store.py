@@ -0,0 +1,287 @@
+"""
+Columnar store for the historical electricity data.
+
+The CSV is parsed once into compact typed NumPy columns, partitioned by
+month under data/store/<YYYY-MM>/<column>.npy, with a manifest describing
+each partition's row count and timestamp range. Reads memory-map only the
+requested columns and skip partitions outside the requested time range.
+The CSV is converted in chunks, and rows appended to it later are merged
+into the affected partitions without re-parsing the whole file.
+"""
+import io
+import os
+import json
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.path.join('data', 'historical_electricity_data.csv')
+STORE_DIR = os.path.join('data', 'store')
+MANIFEST_NAME = 'manifest.json'
+
+# Rows parsed from the CSV at a time while building the store
+BUILD_CHUNK_ROWS = 500000
+
+# On-disk dtype of every column; timestamps are stored as int64 nanoseconds
+SCHEMA = {
+    'timestamp': 'int64',
+    'hour': 'int8',
+    'load': 'float32',
+    'temperature': 'float32',
+    'is_weekend': 'int8',
+    'is_holiday': 'int8',
+    'price': 'float32',
+}
+
+
+def _manifest_path(store_dir):
+    return os.path.join(store_dir, MANIFEST_NAME)
+
+
+def _read_manifest(store_dir):
+    path = _manifest_path(store_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(store_dir, manifest):
+    path = _manifest_path(store_dir)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _typed_frame(raw):
+    """Convert parsed CSV rows to the store schema"""
+    frame = pd.DataFrame({'timestamp': pd.to_datetime(raw['timestamp']).values.astype('datetime64[ns]').astype('int64')})
+    for column, dtype in SCHEMA.items():
+        if column != 'timestamp':
+            frame[column] = raw[column].astype(dtype)
+    return frame
+
+
+def write_partition(store_dir, name, frame):
+    """Write one month of rows, sorted by timestamp, as one .npy file per column"""
+    partition_dir = os.path.join(store_dir, name)
+    os.makedirs(partition_dir, exist_ok=True)
+    frame = frame.sort_values('timestamp', kind='stable')
+    for column, dtype in SCHEMA.items():
+        path = os.path.join(partition_dir, f"{column}.npy")
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, frame[column].to_numpy(dtype=dtype))
+        os.replace(f"{path}.tmp", path)
+
+    timestamps = frame['timestamp'].to_numpy()
+    return {
+        "rows": int(len(frame)),
+        "min_timestamp": int(timestamps[0]),
+        "max_timestamp": int(timestamps[-1]),
+    }
+
+
+def write_generated_manifest(store_dir, partitions, source):
+    """Write the manifest of a store produced directly (not converted from a CSV)"""
+    manifest = {
+        "source": None,
+        "generator": source,
+        "schema": SCHEMA,
+        "rows": int(sum(info['rows'] for info in partitions.values())),
+        "partitions": dict(sorted(partitions.items())),
+    }
+    _write_manifest(store_dir, manifest)
+    return manifest
+
+
+def _month_names(frame):
+    return pd.to_datetime(frame['timestamp']).dt.strftime('%Y-%m')
+
+
+def _read_partition(store_dir, name, columns, mmap=True):
+    """Load the requested columns of one partition"""
+    partition_dir = os.path.join(store_dir, name)
+    return {
+        column: np.load(os.path.join(partition_dir, f"{column}.npy"), mmap_mode='r' if mmap else None)
+        for column in columns
+    }
+
+
+def read_partition(name, columns=None, store_dir=STORE_DIR):
+    """Load one month partition as a DataFrame with parsed timestamps"""
+    frame = pd.DataFrame(_read_partition(store_dir, name, list(columns or SCHEMA), mmap=False))
+    if 'timestamp' in frame:
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    return frame
+
+
+def _merge_partition(store_dir, partitions, name, frames):
+    """Write buffered rows for one month, merging with rows already stored for it"""
+    if name in partitions:
+        frames = [pd.DataFrame(_read_partition(store_dir, name, SCHEMA, mmap=False))] + frames
+    partitions[name] = write_partition(store_dir, name, pd.concat(frames, ignore_index=True))
+
+
+def _ingest(reader, store_dir, partitions):
+    """Write CSV chunks into month partitions, returning the number of rows ingested
+
+    History is usually in time order, so a month is flushed as soon as a chunk
+    no longer contains it; only the months in flight are held in memory.
+    """
+    buffers = {}
+    rows = 0
+    for raw in reader:
+        frame = _typed_frame(raw)
+        rows += len(frame)
+        months = _month_names(frame)
+        for name, group in frame.groupby(months):
+            buffers.setdefault(name, []).append(group)
+        current = set(months.unique())
+        for name in [name for name in buffers if name not in current]:
+            _merge_partition(store_dir, partitions, name, buffers.pop(name))
+
+    for name, frames in buffers.items():
+        _merge_partition(store_dir, partitions, name, frames)
+    return rows
+
+
+def build_store(csv_path=DATA_PATH, store_dir=STORE_DIR):
+    """Parse the whole CSV once, in chunks, and write the partitioned columnar store"""
+    logger.info(f"Converting {csv_path} to columnar store at {store_dir}")
+
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.makedirs(store_dir)
+
+    partitions = {}
+    reader = pd.read_csv(csv_path, chunksize=BUILD_CHUNK_ROWS,
+                         dtype={c: d for c, d in SCHEMA.items() if c != 'timestamp'})
+    rows = _ingest(reader, store_dir, partitions)
+
+    stat = os.stat(csv_path)
+    manifest = {
+        "source": os.path.abspath(csv_path),
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+        "schema": SCHEMA,
+        "rows": rows,
+        "partitions": dict(sorted(partitions.items())),
+    }
+    _write_manifest(store_dir, manifest)
+    logger.info(f"Columnar store written with {manifest['rows']} rows in {len(partitions)} partitions")
+    return manifest
+
+
+def _append_to_store(csv_path, store_dir, manifest):
+    """Merge rows appended to the CSV since the store was built into their partitions"""
+    with open(csv_path, 'rb') as f:
+        header = f.readline().decode('utf-8').strip().split(',')
+        f.seek(manifest['source_size'])
+        chunk = f.read()
+
+    # Only consume complete lines; a partial last line is picked up next time
+    end = chunk.rfind(b'\n') + 1
+    if end > 0:
+        reader = pd.read_csv(io.BytesIO(chunk[:end]), names=header, header=None, chunksize=BUILD_CHUNK_ROWS)
+        rows = _ingest(reader, store_dir, manifest['partitions'])
+        manifest['partitions'] = dict(sorted(manifest['partitions'].items()))
+        manifest['rows'] += rows
+        logger.info(f"Appended {rows} new rows to the columnar store")
+
+    manifest['source_size'] += end
+    manifest['source_mtime'] = os.stat(csv_path).st_mtime
+    _write_manifest(store_dir, manifest)
+    return manifest
+
+
+def ensure_store(csv_path=DATA_PATH, store_dir=STORE_DIR):
+    """Return an up-to-date store manifest, converting or appending from the CSV as needed
+
+    With csv_path None the store is read as it is.
+    """
+    manifest = _read_manifest(store_dir)
+    if csv_path is None or not os.path.exists(csv_path) or (manifest is not None and manifest.get('source') is None):
+        # Nothing to sync: there is no CSV, or the store was generated rather than converted
+        return manifest
+
+    stat = os.stat(csv_path)
+    if manifest is None or manifest.get('schema') != SCHEMA or stat.st_size < manifest['source_size']:
+        return build_store(csv_path, store_dir)
+    if stat.st_size > manifest['source_size']:
+        return _append_to_store(csv_path, store_dir, manifest)
+    if stat.st_mtime != manifest['source_mtime']:
+        # Same size but rewritten in place
+        return build_store(csv_path, store_dir)
+    return manifest
+
+
+def _select_partitions(manifest, start, end):
+    """Names of partitions that may contain rows in [start, end]"""
+    names = []
+    for name, info in manifest['partitions'].items():
+        if start is not None and info['max_timestamp'] < start:
+            continue
+        if end is not None and info['min_timestamp'] > end:
+            continue
+        names.append(name)
+    return names
+
+
+def _to_ns(value):
+    return None if value is None else pd.Timestamp(value).value
+
+
+def iter_partitions(columns=None, start=None, end=None, chunk_rows=None, csv_path=DATA_PATH, store_dir=STORE_DIR):
+    """Yield DataFrames of the requested columns and time range, one per month partition
+
+    With chunk_rows, large partitions are sliced so no frame exceeds that many rows.
+    """
+    manifest = ensure_store(csv_path, store_dir)
+    if manifest is None:
+        return
+
+    columns = list(columns or SCHEMA)
+    start_ns, end_ns = _to_ns(start), _to_ns(end)
+    # The timestamp column is needed to apply the range filter
+    needed = columns if 'timestamp' in columns or (start_ns is None and end_ns is None) \
+        else ['timestamp'] + columns
+
+    for name in _select_partitions(manifest, start_ns, end_ns):
+        arrays = _read_partition(store_dir, name, needed)
+
+        # Partitions are sorted by timestamp, so the range is a contiguous slice
+        lo, hi = 0, manifest['partitions'][name]['rows']
+        if start_ns is not None:
+            lo = int(np.searchsorted(arrays['timestamp'], start_ns, side='left'))
+        if end_ns is not None:
+            hi = int(np.searchsorted(arrays['timestamp'], end_ns, side='right'))
+        if hi <= lo:
+            continue
+
+        step = chunk_rows or (hi - lo)
+        for offset in range(lo, hi, step):
+            stop = min(offset + step, hi)
+            frame = pd.DataFrame({column: arrays[column][offset:stop] for column in columns})
+            if 'timestamp' in frame:
+                frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+            yield frame
+
+
+def load_data(columns=None, start=None, end=None, csv_path=DATA_PATH, store_dir=STORE_DIR):
+    """Load historical data from the columnar store, or None if there is no data"""
+    if not os.path.exists(csv_path) and _read_manifest(store_dir) is None:
+        return None
+
+    frames = list(iter_partitions(columns, start, end, csv_path=csv_path, store_dir=store_dir))
+    if not frames:
+        return pd.DataFrame(columns=list(columns or SCHEMA))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    build_store()
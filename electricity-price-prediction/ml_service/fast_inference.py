@@ -0,0 +1,310 @@
+"""
+Compiled inference engine for the StandardScaler + RandomForestRegressor
+pipeline.
+
+At load time every tree of the fitted forest is copied into one contiguous
+node array and the scaler is folded into the split thresholds, so rows can
+be scored straight from the parsed JSON without building a DataFrame or
+going through the sklearn estimator dispatch.
+"""
+import os
+import numpy as np
+import logging
+
+from features import FEATURES, BOOLEAN_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Layout of a single tree node in the flattened forest
+NODE_DTYPE = np.dtype([
+    ('feature', np.int32),
+    ('threshold', np.float64),
+    ('left', np.int32),
+    ('right', np.int32),
+    ('value', np.float64),
+])
+
+# Compact node layout for compressed forests (see compress_model.py); value may also be float16
+COMPACT_NODE_DTYPE = np.dtype([
+    ('feature', np.int8),
+    ('threshold', np.float32),
+    ('left', np.int32),
+    ('right', np.int32),
+    ('value', np.float32),
+])
+
+# Rows traversed together by CompiledForest.predict; larger inputs are split into blocks
+LEAF_BLOCK_ROWS = 1024
+
+# Largest batch worth scoring with the compiled forest. Every tree is walked to the full forest
+# depth, so on the default 200-tree, unlimited-depth forest sklearn overtakes it at ~128 rows
+COMPILED_MAX_BATCH_ROWS = int(os.environ.get('COMPILED_MAX_BATCH_ROWS', 100))
+
+# Largest absolute difference tolerated between the compiled forest and the pipeline
+PARITY_TOLERANCE = 1e-6
+
+
+def _float32_split(threshold):
+    """Largest float64 split that agrees with sklearn's float32 comparison
+
+    sklearn casts the scaled input to float32 before comparing it with the
+    threshold, so `float32(s) <= t` has to be rewritten as `s <= t'` before
+    the scaler can be folded into the threshold.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    with np.errstate(over='ignore', invalid='ignore'):
+        lower = threshold.astype(np.float32)
+    lower = np.where(lower.astype(np.float64) > threshold, np.nextafter(lower, np.float32(-np.inf)), lower)
+    upper = np.nextafter(lower, np.float32(np.inf))
+
+    # Values below the midpoint round down to `lower`; the midpoint itself rounds to the even neighbour
+    midpoint = (lower.astype(np.float64) + upper.astype(np.float64)) / 2
+    lower_is_even = (lower.view(np.uint32) & 1) == 0
+    return np.where(lower_is_even, midpoint, np.nextafter(midpoint, -np.inf))
+
+
+def _kept_nodes(tree, max_depth=None):
+    """Node ids within max_depth of the root (all nodes if None), plus a mask of nodes cut to leaves"""
+    if max_depth is None:
+        return np.arange(tree.node_count), np.zeros(tree.node_count, dtype=bool)
+
+    levels, frontier = [], np.array([0])
+    for _ in range(max_depth + 1):
+        levels.append(frontier)
+        children = np.concatenate([tree.children_left[frontier], tree.children_right[frontier]])
+        frontier = np.sort(children[children != -1])
+        if len(frontier) == 0:
+            break
+
+    node_ids = np.sort(np.concatenate(levels))
+    # Internal nodes on the last kept level become leaves
+    truncated = np.isin(node_ids, levels[-1]) & (tree.children_left[node_ids] != -1) & (len(levels) > max_depth)
+    return node_ids, truncated
+
+
+class CompiledForest:
+    """Flattened RandomForest that evaluates all trees in lock-step"""
+
+    def __init__(self, nodes, roots, depth):
+        self.nodes = nodes
+        self.roots = roots
+        self.depth = depth
+
+        # Column views into the node array used by the traversal loop; plain ndarray views of a
+        # memory-mapped array skip np.memmap's per-operation overhead without copying it
+        self._feature = np.asarray(nodes['feature'])
+        self._threshold = np.asarray(nodes['threshold'])
+        self._left = np.asarray(nodes['left'])
+        self._right = np.asarray(nodes['right'])
+        self._value = np.asarray(nodes['value'])
+
+    @classmethod
+    def from_pipeline(cls, pipeline, trees=None, max_depth=None, dtype=NODE_DTYPE):
+        """Compile a fitted scaler + forest pipeline into a node array
+
+        trees selects a subset of the forest's estimators by index and
+        max_depth turns every node at that depth into a leaf holding the
+        node's mean value; both are used by compress_model.py, together with
+        a narrower node dtype.
+        """
+        scaler = pipeline['scaler']
+        forest = pipeline['regressor']
+        n_features = len(FEATURES)
+
+        # Undo the scaler on the thresholds: (x - mean) / scale <= t  <=>  x <= t * scale + mean
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n_features)
+
+        estimators = forest.estimators_ if trees is None else [forest.estimators_[i] for i in trees]
+        kept = [_kept_nodes(estimator.tree_, max_depth) for estimator in estimators]
+        total_nodes = sum(len(node_ids) for node_ids, _ in kept)
+        nodes = np.empty(total_nodes, dtype=dtype)
+        threshold_dtype = nodes.dtype['threshold']
+        roots = np.empty(len(estimators), dtype=np.int32)
+
+        offset = 0
+        for i, (estimator, (node_ids, truncated)) in enumerate(zip(estimators, kept)):
+            tree = estimator.tree_
+            count = len(node_ids)
+            block = nodes[offset:offset + count]
+            is_leaf = (tree.children_left[node_ids] == -1) | truncated
+            own_index = np.arange(offset, offset + count, dtype=np.int32)
+
+            # Position of every kept node in the new block (-1 for dropped nodes)
+            new_index = np.full(tree.node_count + 1, -1, dtype=np.int64)
+            new_index[node_ids] = np.arange(count)
+
+            features = np.where(is_leaf, 0, tree.feature[node_ids]).astype(np.int32)
+            block['feature'] = features
+            # Leaves always branch "left" onto themselves so traversal can run a fixed number of steps
+            threshold = _float32_split(tree.threshold[node_ids]) * scale[features] + mean[features]
+            if threshold_dtype != np.float64:
+                # Round narrow thresholds down, so every input representable in that dtype still splits exactly
+                narrow = threshold.astype(threshold_dtype)
+                threshold = np.where(narrow > threshold, np.nextafter(narrow, threshold_dtype.type(-np.inf)), narrow)
+            block['threshold'] = np.where(is_leaf, np.inf, threshold)
+            block['left'] = np.where(is_leaf, own_index, new_index[tree.children_left[node_ids]] + offset)
+            block['right'] = np.where(is_leaf, own_index, new_index[tree.children_right[node_ids]] + offset)
+            block['value'] = tree.value[node_ids, 0, 0]
+
+            roots[i] = offset
+            offset += count
+
+        depth = max(tree.max_depth for tree in (estimator.tree_ for estimator in estimators))
+        if max_depth is not None:
+            depth = min(depth, max_depth)
+        logger.info(f"Compiled forest with {len(estimators)} trees, {total_nodes} nodes, depth {depth}")
+        return cls(nodes, roots, depth)
+
+    def save(self, path):
+        """Dump the node arrays uncompressed so workers can memory-map a single copy"""
+        import joblib
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({'nodes': self.nodes, 'roots': self.roots, 'depth': self.depth}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a dumped forest; with mmap_mode the node array stays shared in the page cache"""
+        import joblib
+
+        data = joblib.load(path, mmap_mode=mmap_mode)
+        return cls(data['nodes'], data['roots'], data['depth'])
+
+    def save_arrays(self, directory, **metadata):
+        """Write the forest as plain .npy files plus a meta.json, replacing any previous copy
+
+        Unlike save, the result can be memory-mapped with np.load alone, so
+        loading it needs neither joblib nor sklearn.
+        """
+        import json
+        import shutil
+
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, 'nodes.npy'), self.nodes)
+        np.save(os.path.join(tmp_dir, 'roots.npy'), self.roots)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(dict(metadata, depth=int(self.depth), trees=len(self.roots), nodes=len(self.nodes),
+                           node_dtype=str(self.nodes.dtype)), f, indent=2)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+
+    @classmethod
+    def load_arrays(cls, directory, mmap_mode='r'):
+        """Load a forest written by save_arrays, returning (forest, metadata)"""
+        import json
+
+        with open(os.path.join(directory, 'meta.json')) as f:
+            metadata = json.load(f)
+        nodes = np.load(os.path.join(directory, 'nodes.npy'), mmap_mode=mmap_mode)
+        roots = np.load(os.path.join(directory, 'roots.npy'))
+        return cls(nodes, roots, metadata['depth']), metadata
+
+    def _leaves(self, X):
+        """Leaf node index reached by every (row, tree) pair"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+
+        # Large inputs are traversed in blocks so the working arrays stay in cache
+        if X.shape[0] > LEAF_BLOCK_ROWS:
+            return np.concatenate([self._leaves(X[start:start + LEAF_BLOCK_ROWS])
+                                   for start in range(0, X.shape[0], LEAF_BLOCK_ROWS)])
+
+        # Flat (row, tree) node indices. The row values are gathered with np.take, which is much cheaper
+        # than 2-D fancy indexing; the node columns are strided views of the node array, which np.take
+        # would copy whole on every call, so they are fancy-indexed
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        index = np.tile(self.roots.astype(np.intp), n_rows)
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, n_trees)
+        values = X.ravel()
+        for _ in range(self.depth):
+            go_left = np.take(values, row_offset + self._feature[index]) <= self._threshold[index]
+            index = np.where(go_left, self._left[index], self._right[index])
+        return index.reshape(n_rows, n_trees)
+
+    def predict(self, X):
+        """Predict prices for an (n_rows, n_features) matrix of raw feature values"""
+        return self._value[self._leaves(X)].mean(axis=1, dtype=np.float64)
+
+    def predict_trees(self, X):
+        """Per-tree predictions as an (n_trees, n_rows) array, from the same traversal as predict"""
+        return self._value[self._leaves(X)].astype(np.float64, copy=False).T
+
+    def predict_one(self, data):
+        """Predict the price for a single parsed JSON record"""
+        x = np.array([
+            (1.0 if data[field] else 0.0) if field in BOOLEAN_FEATURES else float(data[field])
+            for field in FEATURES
+        ])
+
+        index = self.roots
+        for _ in range(self.depth):
+            go_left = x[self._feature[index]] <= self._threshold[index]
+            index = np.where(go_left, self._left[index], self._right[index])
+
+        return float(self._value[index].mean(dtype=np.float64))
+
+
+def sample_domain(n_samples=2000, seed=0):
+    """Random feature rows spanning the documented input domain"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(0, 24, n_samples),
+        rng.uniform(10000, 22000, n_samples),
+        rng.uniform(2, 38, n_samples),
+        rng.integers(0, 2, n_samples),
+        rng.integers(0, 2, n_samples),
+    ]).astype(np.float64)
+
+
+def check_parity(pipeline, compiled, X=None):
+    """Return the largest absolute difference between the compiled forest and the pipeline"""
+    import pandas as pd
+
+    if X is None:
+        X = sample_domain()
+
+    expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+    batch = compiled.predict(X)
+    single = np.array([compiled.predict_one(dict(zip(FEATURES, row))) for row in X[:200]])
+
+    return float(max(np.max(np.abs(batch - expected)), np.max(np.abs(single - expected[:200]))))
+
+
+def compile_model(pipeline):
+    """Compile a pipeline and verify it against sklearn, returning None if it cannot be used"""
+    try:
+        compiled = CompiledForest.from_pipeline(pipeline)
+        max_error = check_parity(pipeline, compiled)
+        if max_error > PARITY_TOLERANCE:
+            logger.warning(f"Compiled forest differs from the pipeline by {max_error:.3g}; using sklearn instead")
+            return None
+        logger.info(f"Compiled forest matches the pipeline (max difference {max_error:.3g})")
+        return compiled
+    except Exception as e:
+        logger.error(f"Error compiling model: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    import time
+    import joblib
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    pipeline = joblib.load(os.path.join('model', 'electricity_price_model.pkl'))
+    compiled = CompiledForest.from_pipeline(pipeline)
+    logger.info(f"Max difference vs pipeline: {check_parity(pipeline, compiled):.3g}")
+
+    record = {'hour': 12, 'load': 15000, 'temperature': 25, 'is_weekend': False, 'is_holiday': False}
+    start = time.perf_counter()
+    for _ in range(1000):
+        compiled.predict_one(record)
+    logger.info(f"Single-row latency: {(time.perf_counter() - start):.3f} ms per prediction")
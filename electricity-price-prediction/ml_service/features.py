@@ -0,0 +1,74 @@
+"""
+Shared feature definitions and helpers for turning request payloads
+into model input matrices.
+"""
+import numpy as np
+
+# Model input columns, in the order the pipeline was trained on
+FEATURES = ['hour', 'load', 'temperature', 'is_weekend', 'is_holiday']
+
+# Columns that are sent as booleans and encoded as 0/1
+BOOLEAN_FEATURES = ['is_weekend', 'is_holiday']
+
+
+class FeatureValidationError(ValueError):
+    """Raised when a prediction payload cannot be turned into model input"""
+    pass
+
+
+def _column_to_array(name, values):
+    """Convert one feature column to a float64 array, encoding booleans as 0/1"""
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise FeatureValidationError(f"Field '{name}' must contain only numeric values")
+
+    if column.ndim != 1:
+        raise FeatureValidationError(f"Field '{name}' must be a flat list of values")
+
+    if name in BOOLEAN_FEATURES:
+        # NaN (a missing value) is kept so it is reported rather than read as True
+        column = np.where(np.isnan(column), np.nan, column != 0)
+
+    return column
+
+
+def records_to_matrix(records):
+    """Build an (n_rows, n_features) matrix from a list of feature records"""
+    if not isinstance(records, list):
+        raise FeatureValidationError("'records' must be a list of feature objects")
+    if not all(isinstance(record, dict) for record in records):
+        raise FeatureValidationError("Every record must be a JSON object")
+
+    columns = {}
+    for field in FEATURES:
+        # None marks a missing field so the whole batch is checked at once
+        columns[field] = [record.get(field) for record in records]
+
+    return columns_to_matrix(columns)
+
+
+def columns_to_matrix(columns):
+    """Build an (n_rows, n_features) matrix from a columnar payload"""
+    missing = [field for field in FEATURES if field not in columns]
+    if missing:
+        raise FeatureValidationError(f"Missing required field: {', '.join(missing)}")
+
+    arrays = [_column_to_array(field, columns[field]) for field in FEATURES]
+
+    lengths = {len(array) for array in arrays}
+    if len(lengths) != 1:
+        raise FeatureValidationError("All feature columns must have the same length")
+
+    matrix = np.column_stack(arrays)
+
+    # A None in any field shows up as NaN after conversion
+    invalid = ~np.isfinite(matrix)
+    if invalid.any():
+        rows, cols = np.nonzero(invalid)
+        raise FeatureValidationError(
+            f"Missing or invalid value for field '{FEATURES[cols[0]]}' in record {int(rows[0])}"
+            f" ({len(np.unique(rows))} invalid record(s) in total)"
+        )
+
+    return matrix
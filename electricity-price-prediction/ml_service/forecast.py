@@ -0,0 +1,140 @@
+"""
+Horizon forecasting: whole hourly price curves from one request.
+
+Callers send a start timestamp plus hourly load and temperature forecasts;
+hour, is_weekend and is_holiday are derived here from the timestamps and a
+holiday calendar, and each chunk of the horizon is scored with one
+vectorized model call.
+"""
+import os
+import logging
+from functools import lru_cache
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Longest horizon accepted in one request (one year of hours)
+MAX_FORECAST_HOURS = int(os.environ.get('MAX_FORECAST_HOURS', 8760))
+
+# Hours scored per vectorized call when streaming
+FORECAST_CHUNK_HOURS = int(os.environ.get('FORECAST_CHUNK_HOURS', 168))
+
+# Additional holiday dates (YYYY-MM-DD, comma separated) on top of the built-in calendar
+EXTRA_HOLIDAYS = [d.strip() for d in os.environ.get('EXTRA_HOLIDAYS', '').split(',') if d.strip()]
+
+
+class ForecastError(ValueError):
+    """Raised when a forecast request cannot be processed"""
+    pass
+
+
+@lru_cache(maxsize=1)
+def _calendar():
+    """Holiday calendar matching the days flagged in the historical data"""
+    from pandas.tseries.holiday import (AbstractHolidayCalendar, Holiday, USLaborDay,
+                                        USThanksgivingDay, sunday_to_monday)
+
+    class ElectricityHolidayCalendar(AbstractHolidayCalendar):
+        rules = [
+            Holiday("New Year's Day", month=1, day=1),
+            Holiday("New Year's Day (observed)", month=1, day=1, observance=sunday_to_monday),
+            Holiday("May Day", month=5, day=1),
+            Holiday("Independence Day", month=7, day=4),
+            USLaborDay,
+            USThanksgivingDay,
+            Holiday("Christmas Day", month=12, day=25),
+        ]
+
+    return ElectricityHolidayCalendar()
+
+
+def holiday_dates(start, end):
+    """Holiday dates (midnight timestamps) between start and end"""
+    import pandas as pd
+
+    holidays = _calendar().holidays(start.normalize(), end.normalize())
+    if EXTRA_HOLIDAYS:
+        holidays = holidays.union(pd.DatetimeIndex(EXTRA_HOLIDAYS))
+    return holidays
+
+
+def parse_request(data):
+    """Validate a forecast request, returning (start timestamp, load array, temperature array)"""
+    import pandas as pd
+
+    if not isinstance(data, dict):
+        raise ForecastError("Request body must be a JSON object")
+    for field in ('start', 'load', 'temperature'):
+        if field not in data:
+            raise ForecastError(f"Missing required field: {field}")
+
+    try:
+        start = pd.Timestamp(data['start'])
+    except (TypeError, ValueError):
+        raise ForecastError(f"Invalid start timestamp: {data['start']}")
+    if start != start.floor('h'):
+        raise ForecastError("start must be on the hour")
+
+    try:
+        load = np.asarray(data['load'], dtype=np.float64)
+        temperature = np.asarray(data['temperature'], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ForecastError("load and temperature must be lists of numbers")
+
+    if load.ndim != 1 or temperature.ndim != 1 or len(load) != len(temperature):
+        raise ForecastError("load and temperature must be lists of the same length")
+    if len(load) == 0:
+        raise ForecastError("Forecast horizon must contain at least one hour")
+    if len(load) > MAX_FORECAST_HOURS:
+        raise ForecastError(f"Forecast horizon of {len(load)} hours exceeds the maximum of {MAX_FORECAST_HOURS}")
+    if not (np.isfinite(load).all() and np.isfinite(temperature).all()):
+        raise ForecastError("load and temperature must not contain missing values")
+
+    return start, load, temperature
+
+
+def build_features(start, load, temperature):
+    """Hourly timestamps and the (n_hours, n_features) matrix for a horizon
+
+    A start with a UTC offset keeps it in the returned timestamps, but the
+    hour, weekend and holiday features are taken from the local wall time.
+    """
+    import pandas as pd
+
+    timestamps = pd.date_range(start, periods=len(load), freq='h')
+    local = timestamps.tz_localize(None) if timestamps.tz is not None else timestamps
+    holidays = holiday_dates(local[0], local[-1])
+    matrix = np.column_stack([
+        local.hour,
+        load,
+        temperature,
+        local.dayofweek >= 5,
+        local.normalize().isin(holidays),
+    ]).astype(np.float64)
+    return timestamps, matrix
+
+
+def forecast_chunks(loaded, start, load, temperature, chunk_hours=FORECAST_CHUNK_HOURS, on_scored=None):
+    """Yield lists of forecast records, scoring chunk_hours hours per model call
+
+    on_scored, if given, is called with each chunk's feature matrix and predictions.
+    """
+    import pandas as pd
+
+    for offset in range(0, len(load), chunk_hours):
+        chunk_start = start + pd.Timedelta(hours=offset)
+        chunk_load = load[offset:offset + chunk_hours]
+        timestamps, matrix = build_features(chunk_start, chunk_load, temperature[offset:offset + chunk_hours])
+        predictions = loaded.predict_matrix(matrix)
+        if on_scored is not None:
+            on_scored(matrix, predictions)
+
+        yield [{
+            "timestamp": timestamp.isoformat(),
+            "hour": int(row[0]),
+            "load": float(row[1]),
+            "temperature": float(row[2]),
+            "is_weekend": bool(row[3]),
+            "is_holiday": bool(row[4]),
+            "prediction": float(prediction),
+        } for timestamp, row, prediction in zip(timestamps, matrix, predictions)]
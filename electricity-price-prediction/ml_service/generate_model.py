@@ -11,6 +11,8 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 
+from data_store import load_data
+
 # Ensure model directory exists
 os.makedirs('model', exist_ok=True)
 
@@ -24,7 +26,7 @@ if not os.path.exists(data_path):
 
 # Load the data
 print(f"Loading data from {data_path}")
-data = pd.read_csv(data_path)
+data = load_data(columns=['hour', 'load', 'temperature', 'is_weekend', 'is_holiday', 'price'])
 
 # Display basic information
 print(f"Dataset shape: {data.shape}")
@@ -0,0 +1,224 @@
+"""
+Incremental retraining as new hourly data is appended to the history.
+
+Instead of refitting the whole forest, each update reads only the rows
+appended to the CSV since the last checkpoint, fits a few extra trees on a
+recent window of data with RandomForest warm_start, and retires the oldest
+trees once the forest reaches its size limit. Progress is kept in a
+training-state manifest next to the model.
+"""
+import io
+import os
+import json
+import time
+import logging
+import joblib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from features import FEATURES
+from data_store import load_data
+from model_registry import register_model, active_version
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.path.join('data', 'historical_electricity_data.csv')
+MODEL_PATH = os.path.join('model', 'electricity_price_model.pkl')
+STATE_PATH = os.path.join('model', 'training_state.json')
+WINDOW_PATH = os.path.join('model', 'training_window.npz')
+
+# Trees added per update, rows in the recent training window, and forest size limit
+TREES_PER_UPDATE = int(os.environ.get('INCREMENTAL_TREES', 10))
+WINDOW_ROWS = int(os.environ.get('INCREMENTAL_WINDOW_ROWS', 24 * 90))
+MAX_TREES = int(os.environ.get('INCREMENTAL_MAX_TREES', 300))
+
+
+def _atomic_write(path, write):
+    """Write a file through a temporary path so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_state():
+    """Load the training-state manifest, or None if there is no checkpoint"""
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    """Persist the training-state manifest"""
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(state, f, indent=2)
+    _atomic_write(STATE_PATH, write)
+
+
+def read_appended_rows(offset, columns):
+    """Read complete CSV lines appended after a byte offset, returning (rows, new offset)"""
+    with open(DATA_PATH, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+
+    # Leave a trailing partial line for the next update
+    end = chunk.rfind(b'\n') + 1
+    if end == 0:
+        return pd.DataFrame(columns=columns), offset
+
+    rows = pd.read_csv(io.BytesIO(chunk[:end]), names=columns, header=None)
+    return rows, offset + end
+
+
+def _csv_columns():
+    """Return the column names from the CSV header"""
+    with open(DATA_PATH) as f:
+        return f.readline().strip().split(',')
+
+
+def _load_window():
+    """Load the recent training window saved by the previous update"""
+    window = np.load(WINDOW_PATH)
+    return window['X'], window['y']
+
+
+def _save_window(X, y):
+    def write(path):
+        with open(path, 'wb') as f:
+            np.savez(f, X=X, y=y)
+    _atomic_write(WINDOW_PATH, write)
+
+
+def bootstrap():
+    """Create the first checkpoint from a full training run"""
+    from train_model import train_model
+
+    logger.info("No training checkpoint found; running a full training first...")
+    model = train_model()
+
+    data = load_data(columns=['timestamp'] + FEATURES + ['price']).sort_values('timestamp')
+    # Everything currently in the file is covered by the full training run
+    columns, offset = _csv_columns(), os.path.getsize(DATA_PATH)
+
+    window = data.tail(WINDOW_ROWS)
+    _save_window(window[FEATURES].to_numpy(dtype=np.float64), window['price'].to_numpy(dtype=np.float64))
+
+    state = {
+        "columns": columns,
+        "csv_offset": offset,
+        "last_timestamp": str(data['timestamp'].max()),
+        "rows_seen": int(len(data)),
+        "n_trees": len(model['regressor'].estimators_),
+        "updates": [],
+        "updated_at": datetime.now().isoformat()
+    }
+    save_state(state)
+    logger.info(f"Checkpoint created at {state['last_timestamp']} ({state['rows_seen']} rows)")
+    return model, state
+
+
+def grow_forest(forest, X, y, trees_per_update, max_trees, seed):
+    """Add trees_per_update trees with warm_start, then retire the oldest beyond max_trees
+
+    Returns the number of trees retired. Once the forest is full its size no
+    longer changes between updates, so warm_start would draw the same tree
+    seeds from a fixed random_state every time; a new seed per update keeps
+    the added trees diverse.
+    """
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + trees_per_update,
+                      random_state=seed)
+    forest.fit(X, y)
+
+    # Retire the oldest trees once the forest is full
+    retired = max(0, len(forest.estimators_) - max_trees)
+    if retired:
+        forest.estimators_ = forest.estimators_[retired:]
+        forest.set_params(n_estimators=len(forest.estimators_))
+    return retired
+
+
+def update_model(trees_per_update=TREES_PER_UPDATE, window_rows=WINDOW_ROWS, max_trees=MAX_TREES):
+    """Add trees for rows appended since the last checkpoint and save the updated model"""
+    if not os.path.exists(DATA_PATH):
+        logger.error(f"Historical data file not found at {DATA_PATH}")
+        return None, None
+
+    state = load_state()
+    if state is None or not os.path.exists(MODEL_PATH) or not os.path.exists(WINDOW_PATH):
+        return bootstrap()
+
+    start = time.perf_counter()
+
+    # A file shorter than the checkpoint was rewritten, so start again from scratch
+    if os.path.getsize(DATA_PATH) < state['csv_offset']:
+        logger.warning("Historical data file shrank since the last checkpoint; retraining from scratch")
+        return bootstrap()
+
+    new_rows, offset = read_appended_rows(state['csv_offset'], state['columns'])
+    if len(new_rows):
+        new_rows['timestamp'] = pd.to_datetime(new_rows['timestamp'])
+        new_rows = new_rows[new_rows['timestamp'] > pd.Timestamp(state['last_timestamp'])]
+
+    if new_rows.empty:
+        logger.info("No new rows since the last checkpoint")
+        state['csv_offset'] = offset
+        save_state(state)
+        return None, state
+
+    logger.info(f"Found {len(new_rows)} new rows after {state['last_timestamp']}")
+
+    # Slide the training window forward over the new rows
+    X_window, y_window = _load_window()
+    X_window = np.vstack([X_window, new_rows[FEATURES].to_numpy(dtype=np.float64)])[-window_rows:]
+    y_window = np.concatenate([y_window, new_rows['price'].to_numpy(dtype=np.float64)])[-window_rows:]
+
+    # Continue from the version the service is running, if the registry has one
+    _, active_path = active_version()
+    model = joblib.load(active_path or MODEL_PATH)
+    forest = model['regressor']
+
+    # Keep the scaler fixed so the existing trees stay valid
+    X_scaled = model['scaler'].transform(pd.DataFrame(X_window, columns=FEATURES))
+    update_count = state.get('update_count', len(state['updates'])) + 1
+    retired = grow_forest(forest, X_scaled, y_window, trees_per_update, max_trees, seed=update_count)
+
+    _atomic_write(MODEL_PATH, lambda path: joblib.dump(model, path))
+    _save_window(X_window, y_window)
+
+    elapsed = time.perf_counter() - start
+    register_model(model, source='incremental_train', metrics={
+        "new_rows": int(len(new_rows)),
+        "trees": len(forest.estimators_),
+        "last_timestamp": str(new_rows['timestamp'].max())
+    })
+    state['updates'] = (state['updates'] + [{
+        "from": str(new_rows['timestamp'].min()),
+        "to": str(new_rows['timestamp'].max()),
+        "new_rows": int(len(new_rows)),
+        "window_rows": int(len(y_window)),
+        "trees_added": trees_per_update,
+        "trees_retired": retired,
+        "seconds": round(elapsed, 3)
+    }])[-100:]
+    state.update({
+        "csv_offset": offset,
+        "last_timestamp": str(new_rows['timestamp'].max()),
+        "rows_seen": state['rows_seen'] + int(len(new_rows)),
+        "n_trees": len(forest.estimators_),
+        "update_count": update_count,
+        "updated_at": datetime.now().isoformat()
+    })
+    save_state(state)
+
+    logger.info(f"Added {trees_per_update} trees, retired {retired}; forest now has "
+                f"{len(forest.estimators_)} trees (update took {elapsed:.2f}s)")
+    return model, state
+
+
+if __name__ == "__main__":
+    update_model()
@@ -0,0 +1,239 @@
+"""
+Request instrumentation exposed in the Prometheus text format.
+
+Counters, gauges and histograms are plain in-process objects guarded by
+locks, so recording a sample costs a dictionary lookup and a few additions.
+With several gunicorn workers each worker keeps its own numbers.
+
+The sampling profiler runs cProfile on one request out of every N and
+writes the stats to PROFILE_DIR; N can be changed while the service runs.
+"""
+import os
+import time
+import bisect
+import itertools
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Stage and request duration buckets, in seconds
+DURATION_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+
+# Directory for sampled request profiles and how many of them are kept
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+
+
+class Histogram:
+    """Fixed-bucket histogram with cumulative snapshots"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        """Return cumulative bucket counts, total count and sum"""
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets + ['+Inf'], self._counts):
+                running += count
+                cumulative[str(bound)] = running
+            return {"buckets": cumulative, "count": self._count, "sum": self._sum}
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    """A named family of samples keyed by label values"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def replace(self, value, **labels):
+        """Set a single sample, dropping samples with other label values (e.g. the previous model version)"""
+        with self._lock:
+            self._values = {self._key(labels): value}
+
+
+class LabeledHistogram(_Metric):
+    """One fixed-bucket Histogram per combination of label values"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        histogram = self._values.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._values.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a block, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, histogram in items:
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot['buckets'].items():
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, {'le': bound})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {snapshot['sum']:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {snapshot['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.register(Counter(
+    'electricity_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status', 'model_version')))
+ERRORS = registry.register(Counter(
+    'electricity_request_errors_total', 'HTTP requests that ended in a 5xx response', ('endpoint',)))
+IN_FLIGHT = registry.register(Gauge(
+    'electricity_requests_in_flight', 'Requests currently being handled', ('endpoint',)))
+REQUEST_SECONDS = registry.register(LabeledHistogram(
+    'electricity_request_duration_seconds', 'Request wall time', ('endpoint',)))
+STAGE_SECONDS = registry.register(LabeledHistogram(
+    'electricity_stage_duration_seconds', 'Wall time of each stage of a prediction request', ('endpoint', 'stage')))
+MODEL_INFO = registry.register(Gauge(
+    'electricity_model_info', 'Model version being served (always 1)', ('model_version',)))
+CACHE_STATS = registry.register(Gauge(
+    'electricity_prediction_cache', 'Prediction cache hits, misses, evictions, expirations and size', ('stat',)))
+PROFILED = registry.register(Counter(
+    'electricity_profiled_requests_total', 'Requests profiled by the sampling profiler', ('endpoint',)))
+
+
+class SamplingProfiler:
+    """Profiles one request in every `every` with cProfile (0 disables it)"""
+
+    def __init__(self, every=0, output_dir=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.every = every
+        self.output_dir = output_dir
+        self.keep = keep
+        self._counter = itertools.count(1)
+        self._written = itertools.count(1)
+        # cProfile cannot run two profilers at once, so concurrent samples are skipped
+        self._busy = threading.Lock()
+
+    def start(self):
+        """Return an enabled profiler if this request is sampled, else None"""
+        if self.every <= 0 or next(self._counter) % self.every:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active
+            self._busy.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, label):
+        """Stop a sampled profiler and write its stats, returning the file path"""
+        try:
+            profiler.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._written)}-{label}.prof")
+            profiler.dump_stats(path)
+            self._prune()
+            return path
+        except Exception as e:
+            logger.error(f"Error writing request profile: {str(e)}")
+            return None
+        finally:
+            self._busy.release()
+
+    def _prune(self):
+        profiles = sorted((os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)
+                           if name.endswith('.prof')), key=os.path.getmtime)
+        for path in profiles[:-self.keep] if self.keep > 0 else []:
+            os.remove(path)
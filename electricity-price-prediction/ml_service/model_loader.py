@@ -0,0 +1,388 @@
+"""
+Model loading for the ML service.
+
+The model (and the compiled forest / prediction grid built from it) is
+loaded in a background thread so the Flask server can bind its port
+immediately; request handlers read the fully built LoadedModel through a
+single attribute, so they never see a half-loaded model. The loader can
+also watch the model registry and swap in a newly activated version the
+same way, without blocking requests.
+
+In shared mode (used by the multi-process server in serve.py) the compiled
+forest is dumped once per model version and memory-mapped by every worker,
+and the sklearn pipeline is only unpickled if an endpoint actually needs it.
+
+In compressed mode the loader memory-maps the pruned, reduced-precision
+forest written by compress_model.py for the version instead, falling back
+to the full model if that version has not been compressed.
+"""
+import os
+import json
+import time
+import threading
+import logging
+
+from fast_inference import compile_model, CompiledForest, COMPILED_MAX_BATCH_ROWS
+from prediction_grid import PredictionGrid, grid_paths
+from model_registry import active_version
+
+logger = logging.getLogger(__name__)
+
+# Path to the trained model
+MODEL_PATH = os.path.join('model', 'electricity_price_model.pkl')
+
+# Train a model when none exists yet; serve.py turns this off in its workers and trains once in the background
+TRAIN_IF_MISSING = os.environ.get('TRAIN_IF_MISSING', 'true').lower() == 'true'
+
+# Memory-mappable compiled forests, one file per model version
+COMPILED_DIR = os.path.join('model', 'compiled')
+
+# Compressed forests written by compress_model.py, one directory per model version
+COMPRESSED_DIR = os.path.join('model', 'compressed')
+
+# Version label for a model that was not loaded from the registry
+UNVERSIONED = 'unversioned'
+
+# Loader states reported on /health
+IDLE, LOADING, READY, FAILED = 'idle', 'loading', 'ready', 'failed'
+
+
+def load_model(path=MODEL_PATH, train_if_missing=None):
+    """Load the trained model, training one if the file is missing and train_if_missing (default TRAIN_IF_MISSING)"""
+    # joblib (and sklearn, via unpickling) are only imported once a model is needed
+    import joblib
+
+    try:
+        if os.path.exists(path):
+            logger.info(f"Loading model from {path}")
+            return joblib.load(path)
+        else:
+            logger.warning(f"Model file not found at {path}")
+            if not (TRAIN_IF_MISSING if train_if_missing is None else train_if_missing):
+                return None
+            # Attempt to train a model since one doesn't exist
+            from train_model import train_model
+            logger.info("Attempting to train a new model...")
+            model = train_model()
+            return model
+    except Exception as e:
+        logger.error(f"Error loading model: {str(e)}")
+        return None
+
+
+def load_grid(version=UNVERSIONED, model_path=MODEL_PATH, interpolation='linear'):
+    """Memory-map the prediction grid built for a model version, or return None to serve from the model"""
+    path, info_path = grid_paths(os.path.dirname(model_path) if version != UNVERSIONED else None)
+    if not os.path.exists(path):
+        logger.warning(f"No prediction grid for model version {version} at {path}; "
+                       "serving from the model (run prediction_grid.py to build one)")
+        return None
+    # The unversioned grid belongs to whichever model file was trained last
+    if version == UNVERSIONED and os.path.exists(model_path) and os.path.getmtime(path) < os.path.getmtime(model_path):
+        logger.warning("Prediction grid is older than the model; ignoring it")
+        return None
+    try:
+        grid = PredictionGrid.load(path, info_path, interpolation=interpolation)
+        logger.info(f"Loaded prediction grid {grid.values.shape} for model version {version} from {path}")
+        return grid
+    except Exception as e:
+        logger.error(f"Error loading prediction grid: {str(e)}")
+        return None
+
+
+def describe_pipeline(pipeline):
+    """Feature importances and hyperparameters of a pipeline's forest, as served on /model-info"""
+    from features import FEATURES
+
+    forest = pipeline['regressor']
+    info = {}
+    if hasattr(forest, 'feature_importances_'):
+        info["feature_importance"] = {feature: float(importance)
+                                      for feature, importance in zip(FEATURES, forest.feature_importances_)}
+    if hasattr(forest, 'get_params'):
+        info["hyperparameters"] = forest.get_params()
+    return info
+
+
+def _artifact_key(version, model_path):
+    # Unversioned models are keyed on their modification time so a new file gets a new dump
+    return version if version != UNVERSIONED else f"{UNVERSIONED}-{os.stat(model_path).st_mtime_ns}"
+
+
+def compiled_path(version, model_path):
+    """Location of the shared compiled forest for a model file"""
+    return os.path.join(COMPILED_DIR, f"{_artifact_key(version, model_path)}.joblib")
+
+
+def compiled_info_path(version, model_path):
+    """Location of the /model-info metadata saved next to the shared compiled forest"""
+    return os.path.join(COMPILED_DIR, f"{_artifact_key(version, model_path)}.json")
+
+
+def compressed_path(version, model_path):
+    """Location of the compressed forest for a model file"""
+    return os.path.join(COMPRESSED_DIR, _artifact_key(version, model_path))
+
+
+def export_compiled(version, model_path, pipeline=None):
+    """Compile a model and dump it for memory-mapping, returning the dump path (or None)"""
+    path = compiled_path(version, model_path)
+    if os.path.exists(path):
+        return path
+
+    pipeline = pipeline if pipeline is not None else load_model(model_path)
+    compiled = compile_model(pipeline) if pipeline is not None else None
+    if compiled is None:
+        return None
+
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+    # Written before the dump, so a worker that finds the dump also finds its metadata
+    info_path = compiled_info_path(version, model_path)
+    with open(f"{info_path}.{os.getpid()}.tmp", 'w') as f:
+        json.dump(describe_pipeline(pipeline), f, indent=2)
+    os.replace(f"{info_path}.{os.getpid()}.tmp", info_path)
+    compiled.save(path)
+    logger.info(f"Compiled forest for model version {version} dumped to {path}")
+    return path
+
+
+class LoadedModel:
+    """A pipeline together with the serving structures derived from it"""
+
+    def __init__(self, pipeline, fast_model=None, grid=None, version=UNVERSIONED, pipeline_path=None,
+                 compression=None, info=None):
+        self._pipeline = pipeline
+        self._pipeline_path = pipeline_path
+        self._pipeline_lock = threading.Lock()
+        self.fast_model = fast_model
+        self.grid = grid
+        self.version = version
+        # Report written by compress_model.py when serving a compressed forest
+        self.compression = compression
+        # Feature importances and hyperparameters saved with a shared or compressed forest
+        self._info = info
+        self.loaded_at = time.time()
+
+    @property
+    def pipeline(self):
+        """The sklearn pipeline, unpickled on first use in shared mode"""
+        if self._pipeline is None and self._pipeline_path is not None:
+            with self._pipeline_lock:
+                if self._pipeline is None:
+                    self._pipeline = load_model(self._pipeline_path)
+        return self._pipeline
+
+    @property
+    def info(self):
+        """Feature importances and hyperparameters, read from the pipeline only if none were saved"""
+        if self._info is None:
+            pipeline = self.pipeline
+            self._info = describe_pipeline(pipeline) if pipeline is not None else {}
+        return self._info
+
+    def predict_matrix(self, X):
+        """Predict an (n_rows, n_features) matrix
+
+        Small batches go through the compiled forest and large ones through
+        sklearn, unpickling the pipeline in shared mode. A compressed forest
+        scores every batch, since the full pipeline would predict differently.
+        """
+        if self.fast_model is not None and (len(X) <= COMPILED_MAX_BATCH_ROWS or self.compression is not None):
+            return self.fast_model.predict(X)
+
+        import pandas as pd
+        from features import FEATURES
+
+        pipeline = self.pipeline
+        if pipeline is None:
+            return self.fast_model.predict(X)
+        return pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+
+    def predict_trees(self, X):
+        """Per-tree predictions as an (n_trees, n_rows) array, for prediction intervals
+
+        Uses the same batch-size cutoff as predict_matrix: large batches go
+        through the sklearn estimators unless a compressed forest is served.
+        """
+        if self.fast_model is not None and (len(X) <= COMPILED_MAX_BATCH_ROWS or self.compression is not None):
+            return self.fast_model.predict_trees(X)
+
+        from prediction_intervals import pipeline_tree_outputs
+
+        pipeline = self.pipeline
+        if pipeline is None:
+            return self.fast_model.predict_trees(X)
+        return pipeline_tree_outputs(pipeline, X)
+
+
+class ModelLoader:
+    """Loads the model synchronously or in a background thread and tracks its state"""
+
+    def __init__(self, model_path=MODEL_PATH, fast_inference=True, use_grid=False, grid_interpolation='linear',
+                 shared=False, compressed=False):
+        self.model_path = model_path
+        self.shared = shared
+        self.compressed = compressed
+        self.fast_inference = fast_inference
+        self.use_grid = use_grid
+        self.grid_interpolation = grid_interpolation
+
+        self.state = IDLE
+        self.current = None
+        self.error = None
+        self.timings = {}
+        self._thread = None
+        self._watcher = None
+        self._ready = threading.Event()
+        self._build_lock = threading.Lock()
+
+    def _timed(self, phase, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.timings[phase] = round(time.perf_counter() - start, 4)
+        logger.info(f"Load phase '{phase}' took {self.timings[phase]:.3f}s")
+        return result
+
+    def resolve(self):
+        """Return (version, path) of the model to serve: the active registry version if any"""
+        version, path = active_version()
+        if version is None:
+            return UNVERSIONED, self.model_path
+        return version, path
+
+    def _build(self, version, path):
+        """Load a model file and build everything needed to serve it"""
+        if self.compressed and os.path.exists(path):
+            loaded = self._build_compressed(version, path)
+            if loaded is not None:
+                return loaded
+        if self.shared and os.path.exists(path):
+            return self._build_shared(version, path)
+
+        pipeline = self._timed('load_model', load_model, path)
+        if pipeline is None:
+            raise RuntimeError(f"No model could be loaded from {path}")
+
+        fast_model = self._timed('compile', compile_model, pipeline) if self.fast_inference else None
+        grid = self._timed('load_grid', load_grid, version, path, self.grid_interpolation) if self.use_grid else None
+        return LoadedModel(pipeline, fast_model, grid, version, info=describe_pipeline(pipeline))
+
+    def _build_shared(self, version, path):
+        """Memory-map the compiled forest for a version, compiling it first if no worker has yet"""
+        dump_path = self._timed('compile', export_compiled, version, path)
+        if dump_path is None:
+            raise RuntimeError(f"Model at {path} could not be compiled for shared serving")
+
+        fast_model = self._timed('mmap_compiled', CompiledForest.load, dump_path, mmap_mode='r')
+        grid = self._timed('load_grid', load_grid, version, path, self.grid_interpolation) if self.use_grid else None
+        info = None
+        info_path = compiled_info_path(version, path)
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                info = json.load(f)
+        return LoadedModel(None, fast_model, grid, version, pipeline_path=path, info=info)
+
+    def _build_compressed(self, version, path):
+        """Memory-map the compressed forest for a version, or None if it has not been compressed"""
+        directory = compressed_path(version, path)
+        if not os.path.exists(directory):
+            logger.warning(f"No compressed forest for model version {version} at {directory}; "
+                           "serving the full model (run compress_model.py to create one)")
+            return None
+
+        fast_model, report = self._timed('mmap_compressed', CompiledForest.load_arrays, directory, mmap_mode='r')
+        grid = self._timed('load_grid', load_grid, version, path, self.grid_interpolation) if self.use_grid else None
+        info = report.pop('model_info', None)
+        return LoadedModel(None, fast_model, grid, version, pipeline_path=path, compression=report, info=info)
+
+    def load(self):
+        """Load the model and build its serving structures in the calling thread"""
+        self.state = LOADING
+        start = time.perf_counter()
+        try:
+            with self._build_lock:
+                loaded = self._build(*self.resolve())
+
+            # Publish the complete model in one assignment
+            self.current = loaded
+            self.state = READY
+            logger.info(f"Serving model version {loaded.version}")
+        except Exception as e:
+            logger.error(f"Error loading model: {str(e)}")
+            self.error = str(e)
+            self.state = FAILED
+        finally:
+            self.timings['total'] = round(time.perf_counter() - start, 4)
+            self._ready.set()
+        return self.current
+
+    def reload(self, force=False):
+        """Swap in the active registry version if it differs from the one being served
+
+        The new model is built while the current one keeps serving requests,
+        then replaced with a single reference assignment. Returns True if the
+        served model changed.
+        """
+        with self._build_lock:
+            version, path = self.resolve()
+            if not force and self.current is not None and self.current.version == version:
+                return False
+
+            logger.info(f"Loading model version {version} in the background...")
+            try:
+                loaded = self._build(version, path)
+            except Exception as e:
+                # Keep serving the previous model if the new one is broken
+                logger.error(f"Error loading model version {version}: {str(e)}")
+                self.error = str(e)
+                return False
+
+            previous = self.current.version if self.current is not None else None
+            self.current = loaded
+            self.state = READY
+            self.error = None
+            self._ready.set()
+            logger.info(f"Swapped model version {previous} -> {version}")
+            return True
+
+    def start(self):
+        """Load the model in a background thread and return immediately"""
+        if self._thread is None:
+            self.state = LOADING
+            self._thread = threading.Thread(target=self.load, name='model-loader', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def watch(self, interval):
+        """Poll the registry every interval seconds and hot-swap newly activated versions"""
+        def run():
+            self._ready.wait()
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"Error checking for a new model version: {str(e)}")
+
+        if self._watcher is None and interval > 0:
+            self._watcher = threading.Thread(target=run, name='model-watcher', daemon=True)
+            self._watcher.start()
+        return self._watcher
+
+    def wait(self, timeout=None):
+        """Block until loading has finished; returns True if a model is ready"""
+        self._ready.wait(timeout)
+        return self.state == READY
+
+    def status(self):
+        """Return the loader state for the health endpoint"""
+        status = {
+            "state": self.state,
+            "model_version": self.current.version if self.current is not None else None,
+            "shared": self.shared,
+            "compressed": self.current is not None and self.current.compression is not None,
+            "startup_timings": dict(self.timings),
+        }
+        if self.error:
+            status["error"] = self.error
+        return status
@@ -0,0 +1,254 @@
+"""
+Versioned model registry.
+
+Every trained model is written to model/registry/<version>/ and recorded in
+model/registry/manifest.json together with its metrics. The manifest names
+the active version and keeps an activation history so a bad model can be
+rolled back. Versions rolled back from are remembered until the next
+activation, so repeated rollbacks keep walking back through the history
+instead of flipping between the last two versions. The ML service watches the manifest and swaps in the active
+version without a restart.
+
+Every read-modify-write of the manifest holds a lock file (and a thread
+lock), so a training run, /model/rollback and several gunicorn workers can
+update it concurrently without losing changes.
+"""
+import os
+import json
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process lock on Windows; the thread lock still covers a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = os.path.join('model', 'registry')
+MANIFEST_PATH = os.path.join(REGISTRY_DIR, 'manifest.json')
+LOCK_PATH = os.path.join(REGISTRY_DIR, 'manifest.lock')
+ARTIFACT_NAME = 'electricity_price_model.pkl'
+HOLDOUT_NAME = 'holdout.npz'
+
+# Number of versions kept on disk; older inactive versions are deleted
+KEEP_VERSIONS = int(os.environ.get('REGISTRY_KEEP_VERSIONS', 10))
+
+# Largest number of held-out evaluation rows stored with a version (a random sample beyond that)
+MAX_HOLDOUT_ROWS = int(os.environ.get('REGISTRY_MAX_HOLDOUT_ROWS', 100000))
+
+
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def _manifest_lock():
+    """Hold the registry lock for a read-modify-write of the manifest"""
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    with _thread_lock, open(LOCK_PATH, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest():
+    """Return the registry manifest, or None if nothing has been registered"""
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def artifact_path(version):
+    """Path of the model file for a registered version"""
+    return os.path.join(REGISTRY_DIR, version, ARTIFACT_NAME)
+
+
+def holdout_path(version):
+    """Path of the held-out rows a registered version was evaluated on"""
+    return os.path.join(REGISTRY_DIR, version, HOLDOUT_NAME)
+
+
+def load_holdout(version):
+    """(X, y) rows the version was never trained on, or None if none were stored with it"""
+    import numpy as np
+
+    path = holdout_path(version)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as holdout:
+        return holdout['X'], holdout['y']
+
+
+def _save_holdout(version, holdout):
+    import numpy as np
+
+    X, y = (np.asarray(values, dtype=np.float64) for values in holdout)
+    if len(y) > MAX_HOLDOUT_ROWS:
+        keep = np.sort(np.random.default_rng(42).choice(len(y), MAX_HOLDOUT_ROWS, replace=False))
+        X, y = X[keep], y[keep]
+    path = holdout_path(version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, X=X, y=y)
+    os.replace(tmp_path, path)
+
+
+def active_version():
+    """Return (version, artifact path) of the active model, or (None, None)"""
+    manifest = read_manifest()
+    if not manifest or not manifest.get('active'):
+        return None, None
+    return manifest['active'], artifact_path(manifest['active'])
+
+
+def _new_version(manifest):
+    version = datetime.now().strftime('v%Y%m%d-%H%M%S')
+    existing = {entry['version'] for entry in manifest['versions']}
+    suffix = 1
+    candidate = version
+    while candidate in existing:
+        suffix += 1
+        candidate = f"{version}-{suffix}"
+    return candidate
+
+
+def _remove_version_files(version):
+    """Delete a version's artifact and the compiled and compressed dumps derived from it"""
+    from model_loader import compiled_path, compiled_info_path, compressed_path
+
+    path = artifact_path(version)
+    shutil.rmtree(os.path.join(REGISTRY_DIR, version), ignore_errors=True)
+    shutil.rmtree(compressed_path(version, path), ignore_errors=True)
+    for derived in (compiled_path(version, path), compiled_info_path(version, path)):
+        if os.path.exists(derived):
+            os.remove(derived)
+
+
+def _prune(manifest):
+    """Delete the oldest versions beyond KEEP_VERSIONS, never the active one"""
+    while len(manifest['versions']) > KEEP_VERSIONS:
+        removable = [entry for entry in manifest['versions'] if entry['version'] != manifest['active']]
+        if not removable:
+            break
+        oldest = removable[0]
+        manifest['versions'].remove(oldest)
+        _remove_version_files(oldest['version'])
+        logger.info(f"Pruned model version {oldest['version']}")
+
+
+def register_model(pipeline, metrics=None, source=None, activate=True, holdout=None):
+    """Write a new model version and (by default) make it the active one
+
+    holdout, if given, is the (X, y) of rows held out from training; it is
+    stored with the version so compress_model.py can evaluate on data the
+    model has never seen, whatever the history holds by then.
+    """
+    import joblib
+
+    # Write the artifact completely, outside the lock, before the manifest points at it
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp_path = os.path.join(REGISTRY_DIR, f"{ARTIFACT_NAME}.{os.getpid()}.{threading.get_ident()}.tmp")
+    joblib.dump(pipeline, tmp_path)
+
+    with _manifest_lock():
+        manifest = read_manifest() or {"active": None, "versions": [], "history": []}
+        version = _new_version(manifest)
+        os.makedirs(os.path.join(REGISTRY_DIR, version), exist_ok=True)
+        os.replace(tmp_path, artifact_path(version))
+        if holdout is not None:
+            _save_holdout(version, holdout)
+
+        manifest['versions'].append({
+            "version": version,
+            "created_at": datetime.now().isoformat(),
+            "source": source,
+            "metrics": metrics or {},
+        })
+        if activate:
+            manifest['active'] = version
+            manifest['history'].append(version)
+            manifest['rolled_back'] = []
+        _prune(manifest)
+        _write_manifest(manifest)
+
+    logger.info(f"Registered model version {version}" + (" (active)" if activate else ""))
+    return version
+
+
+def _set_active(manifest, version, rolled_back):
+    if not manifest or version not in {entry['version'] for entry in manifest['versions']}:
+        raise ValueError(f"Unknown model version: {version}")
+    if not os.path.exists(artifact_path(version)):
+        raise ValueError(f"Artifact for model version {version} is missing")
+
+    manifest['active'] = version
+    manifest['history'].append(version)
+    manifest['rolled_back'] = rolled_back
+    _write_manifest(manifest)
+
+
+def activate(version):
+    """Make a registered version the active one"""
+    with _manifest_lock():
+        _set_active(read_manifest(), version, [])
+    logger.info(f"Activated model version {version}")
+    return version
+
+
+def rollback(version=None):
+    """Re-activate the given version, or the latest earlier one that has not been rolled back from"""
+    with _manifest_lock():
+        manifest = read_manifest()
+        if not manifest:
+            raise ValueError("No models are registered")
+
+        rolled_back = manifest.get('rolled_back', []) + [manifest['active']]
+        if version is None:
+            available = {entry['version'] for entry in manifest['versions']}
+            previous = [v for v in reversed(manifest['history'])
+                        if v not in rolled_back and v in available]
+            if not previous:
+                raise ValueError("No earlier model version to roll back to")
+            version = previous[0]
+
+        _set_active(manifest, version, [v for v in rolled_back if v != version])
+    logger.info(f"Rolled back model version {rolled_back[-1]} -> {version}")
+    return version
+
+
+def list_versions():
+    """Return the registered versions and which one is active"""
+    manifest = read_manifest() or {"active": None, "versions": []}
+    return {"active": manifest['active'], "versions": manifest['versions']}
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Usage: python model_registry.py [list | activate <version> | rollback [version]]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'activate':
+        activate(sys.argv[2])
+    elif command == 'rollback':
+        rollback(sys.argv[2] if len(sys.argv) > 2 else None)
+    print(json.dumps(list_versions(), indent=2))
@@ -0,0 +1,135 @@
+"""
+In-process cache for single-row price predictions.
+
+Callers tend to ask for the same (hour, load, temperature, is_weekend,
+is_holiday) combinations repeatedly, so results are kept in a bounded LRU
+map keyed on the (optionally quantized) feature values. Every entry comes
+from the model the cache is bound to: binding a different model clears
+it, and results computed by any other model are never stored.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from features import FEATURES, BOOLEAN_FEATURES, FeatureValidationError, records_to_matrix
+
+
+class PredictionCache:
+    """Thread-safe LRU/TTL cache of predictions, tied to one loaded model"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, load_step=0, temperature_step=0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.steps = {'load': load_step, 'temperature': temperature_step}
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def quantize(self, data):
+        """Return the feature values the cache key (and prediction) is based on
+
+        The record goes through the same checks as batch input, so missing,
+        null or non-numeric fields raise FeatureValidationError, as does a
+        fractional hour (which would otherwise be truncated by the key).
+        """
+        row = records_to_matrix([data])[0]
+        features = {}
+        for field, value in zip(FEATURES, row.tolist()):
+            if field == 'hour' and not value.is_integer():
+                raise FeatureValidationError(f"Field 'hour' must be a whole number, got {value}")
+            if field in BOOLEAN_FEATURES or field == 'hour':
+                features[field] = int(value)
+            else:
+                step = self.steps.get(field, 0)
+                features[field] = round(round(value / step) * step, 6) if step else value
+        return features
+
+    @staticmethod
+    def make_key(features):
+        """Build a hashable key from quantized feature values"""
+        return tuple(features[field] for field in FEATURES)
+
+    def bind_model(self, model):
+        """Drop all entries if predictions were made by a different model"""
+        with self._lock:
+            if model is not self._model:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._model = model
+
+    def get(self, key):
+        """Return the cached prediction for a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, model):
+        """Store a prediction made by model, evicting the least recently used entries if full
+
+        A prediction made by a model other than the bound one (e.g. one still
+        in flight when a new version was swapped in) is dropped.
+        """
+        if not self.enabled:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if model is not self._model:
+                self.stale_puts += 1
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all cached predictions"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache counters for the health/stats endpoints"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "load_step": self.steps['load'],
+                "temperature_step": self.steps['temperature'],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
@@ -0,0 +1,200 @@
+"""
+Precomputed prediction grid over the bounded input domain.
+
+The model only accepts a small domain (see model/model_info.txt), so the
+fitted pipeline can be scored once over a dense grid and stored as a
+memory-mappable .npy array next to the model (in model/registry/<version>/
+for registered versions, so every version keeps its own grid). Predictions
+are then answered by lookup with multilinear interpolation over load and
+temperature instead of walking the forest.
+
+Usage (builds the grid for an already trained version):
+    python prediction_grid.py [version]
+"""
+import os
+import json
+import logging
+import numpy as np
+
+from features import FEATURES
+from fast_inference import sample_domain
+
+logger = logging.getLogger(__name__)
+
+# Grid of a model that is not in the registry
+GRID_PATH = os.path.join('model', 'electricity_price_grid.npy')
+GRID_INFO_PATH = os.path.join('model', 'electricity_price_grid.json')
+
+# File names of a registered version's grid inside its registry directory
+GRID_NAME = 'grid.npy'
+GRID_INFO_NAME = 'grid.json'
+
+# Documented input domain
+HOURS = 24
+LOAD_RANGE = (10000.0, 22000.0)
+TEMPERATURE_RANGE = (2.0, 38.0)
+
+# Default spacing between grid points
+DEFAULT_LOAD_STEP = 100.0
+DEFAULT_TEMPERATURE_STEP = 0.5
+
+
+def grid_paths(directory=None):
+    """(grid, metadata) paths inside a registry version directory, or the unversioned paths if None"""
+    if directory is None:
+        return GRID_PATH, GRID_INFO_PATH
+    return os.path.join(directory, GRID_NAME), os.path.join(directory, GRID_INFO_NAME)
+
+
+def _axis(bounds, step):
+    """Evenly spaced grid coordinates covering the bounds"""
+    n_points = int(round((bounds[1] - bounds[0]) / step)) + 1
+    return np.linspace(bounds[0], bounds[1], n_points)
+
+
+def build_grid(pipeline, load_step=DEFAULT_LOAD_STEP, temperature_step=DEFAULT_TEMPERATURE_STEP):
+    """Score the pipeline over the full domain, returning a (hour, load, temperature, weekend, holiday) array"""
+    import pandas as pd
+
+    loads = _axis(LOAD_RANGE, load_step)
+    temperatures = _axis(TEMPERATURE_RANGE, temperature_step)
+
+    hour, load, temperature, weekend, holiday = np.meshgrid(
+        np.arange(HOURS), loads, temperatures, [0, 1], [0, 1], indexing='ij')
+    X = pd.DataFrame({
+        'hour': hour.ravel(),
+        'load': load.ravel(),
+        'temperature': temperature.ravel(),
+        'is_weekend': weekend.ravel(),
+        'is_holiday': holiday.ravel()
+    })
+
+    logger.info(f"Scoring prediction grid with {len(X)} points...")
+    return pipeline.predict(X).astype(np.float32).reshape(hour.shape)
+
+
+class PredictionGrid:
+    """Lookup/interpolation over a precomputed prediction grid"""
+
+    def __init__(self, values, interpolation='linear', info=None):
+        self.values = values
+        self.interpolation = interpolation
+        self.info = info or {}
+
+        # Grid spacing follows from the number of points along each axis
+        self.load_step = (LOAD_RANGE[1] - LOAD_RANGE[0]) / (values.shape[1] - 1)
+        self.temperature_step = (TEMPERATURE_RANGE[1] - TEMPERATURE_RANGE[0]) / (values.shape[2] - 1)
+
+    @classmethod
+    def load(cls, path=GRID_PATH, info_path=GRID_INFO_PATH, interpolation='linear'):
+        """Memory-map a saved grid and its metadata"""
+        info = {}
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                info = json.load(f)
+        values = np.load(path, mmap_mode='r')
+        return cls(values, interpolation, info)
+
+    def save(self, path=GRID_PATH, info_path=GRID_INFO_PATH):
+        """Write the grid as .npy and its metadata as JSON"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, np.ascontiguousarray(self.values, dtype=np.float32))
+        info = dict(self.info, load_step=self.load_step, temperature_step=self.temperature_step,
+                    shape=list(self.values.shape))
+        with open(info_path, 'w') as f:
+            json.dump(info, f, indent=2)
+        logger.info(f"Prediction grid saved to {path}")
+
+    def predict(self, X):
+        """Predict an (n_rows, n_features) matrix; rows outside the grid come back as NaN"""
+        X = np.asarray(X, dtype=np.float64)
+        hour, load, temperature, weekend, holiday = X.T
+
+        # Position of each row along the continuous axes
+        load_pos = (load - LOAD_RANGE[0]) / self.load_step
+        temperature_pos = (temperature - TEMPERATURE_RANGE[0]) / self.temperature_step
+        n_load, n_temperature = self.values.shape[1], self.values.shape[2]
+
+        inside = ((hour == np.round(hour)) & (hour >= 0) & (hour < HOURS)
+                  & (load_pos >= 0) & (load_pos <= n_load - 1)
+                  & (temperature_pos >= 0) & (temperature_pos <= n_temperature - 1))
+
+        result = np.full(len(X), np.nan)
+        if not inside.any():
+            return result
+
+        h = hour[inside].astype(np.intp)
+        w = (weekend[inside] != 0).astype(np.intp)
+        d = (holiday[inside] != 0).astype(np.intp)
+        lp = load_pos[inside]
+        tp = temperature_pos[inside]
+
+        if self.interpolation == 'nearest':
+            result[inside] = self.values[h, np.round(lp).astype(np.intp), np.round(tp).astype(np.intp), w, d]
+            return result
+
+        # Bilinear interpolation between the four surrounding load/temperature points
+        l0 = np.minimum(np.floor(lp).astype(np.intp), n_load - 2)
+        t0 = np.minimum(np.floor(tp).astype(np.intp), n_temperature - 2)
+        fl = lp - l0
+        ft = tp - t0
+        result[inside] = (
+            self.values[h, l0, t0, w, d] * (1 - fl) * (1 - ft)
+            + self.values[h, l0 + 1, t0, w, d] * fl * (1 - ft)
+            + self.values[h, l0, t0 + 1, w, d] * (1 - fl) * ft
+            + self.values[h, l0 + 1, t0 + 1, w, d] * fl * ft
+        )
+        return result
+
+    def predict_one(self, features):
+        """Predict one record of feature values, or return None if it is outside the grid"""
+        row = np.array([[float(features[field]) for field in FEATURES]])
+        value = self.predict(row)[0]
+        return None if np.isnan(value) else float(value)
+
+
+def evaluate_grid(pipeline, grid, n_samples=5000, seed=0):
+    """Compare grid predictions with the pipeline on random points inside the domain"""
+    import pandas as pd
+
+    X = sample_domain(n_samples, seed)
+    errors = np.abs(grid.predict(X) - pipeline.predict(pd.DataFrame(X, columns=FEATURES)))
+    return {
+        "max_abs_error": float(errors.max()),
+        "mean_abs_error": float(errors.mean()),
+        "evaluated_points": n_samples
+    }
+
+
+def build_and_save_grid(pipeline, directory=None, load_step=None, temperature_step=None):
+    """Build a grid for a freshly trained pipeline, report its error and save it
+
+    directory is the registry directory of the pipeline's version (None for
+    an unversioned model).
+    """
+    load_step = load_step or float(os.environ.get('GRID_LOAD_STEP', DEFAULT_LOAD_STEP))
+    temperature_step = temperature_step or float(os.environ.get('GRID_TEMPERATURE_STEP', DEFAULT_TEMPERATURE_STEP))
+
+    grid = PredictionGrid(build_grid(pipeline, load_step, temperature_step))
+    grid.info = evaluate_grid(pipeline, grid)
+    logger.info(f"Prediction grid max error vs model: {grid.info['max_abs_error']:.4f} "
+                f"(mean {grid.info['mean_abs_error']:.4f})")
+    grid.save(*grid_paths(directory))
+    return grid
+
+
+if __name__ == "__main__":
+    import sys
+    import joblib
+    from model_registry import active_version, artifact_path
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    version = sys.argv[1] if len(sys.argv) > 1 else active_version()[0]
+    if version is None:
+        model_path, directory = os.path.join('model', 'electricity_price_model.pkl'), None
+    else:
+        model_path = artifact_path(version)
+        directory = os.path.dirname(model_path)
+    build_and_save_grid(joblib.load(model_path), directory)
@@ -0,0 +1,124 @@
+"""
+Prediction intervals from the spread of the forest's trees.
+
+All per-tree predictions are gathered into one (n_trees, n_rows) array in a
+single vectorized pass (the compiled forest's lock-step traversal, or
+forest.apply plus a flat leaf-value table for the sklearn pipeline), and
+quantiles and the standard deviation are taken along the tree axis.
+
+Running this module benchmarks the extra cost against plain prediction.
+"""
+import os
+import logging
+import numpy as np
+
+from features import FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Quantiles returned when a request does not name its own
+DEFAULT_QUANTILES = [float(q) for q in os.environ.get('PREDICTION_QUANTILES', '0.1,0.5,0.9').split(',') if q.strip()]
+
+
+def parse_quantiles(value):
+    """Validate quantiles given as a list or a comma-separated string"""
+    if value is None:
+        return DEFAULT_QUANTILES
+    if isinstance(value, str):
+        value = [q for q in value.split(',') if q.strip()]
+    try:
+        quantiles = [float(q) for q in value]
+    except (TypeError, ValueError):
+        raise ValueError("quantiles must be a list of numbers between 0 and 1")
+    if not quantiles or not all(0 <= q <= 1 for q in quantiles):
+        raise ValueError("quantiles must be a list of numbers between 0 and 1")
+    return quantiles
+
+
+def _leaf_value_table(forest):
+    """Leaf values of every tree in one flat array, plus each tree's offset into it"""
+    table = getattr(forest, '_leaf_value_table', None)
+    if table is None or len(table[1]) != len(forest.estimators_):
+        values = [estimator.tree_.value[:, 0, 0] for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [len(v) for v in values[:-1]])
+        table = (np.concatenate(values), offsets)
+        # Cached on the fitted forest so it is built once per model
+        forest._leaf_value_table = table
+    return table
+
+
+def pipeline_tree_outputs(pipeline, X):
+    """Per-tree predictions of a scaler + forest pipeline as an (n_trees, n_rows) array"""
+    import pandas as pd
+
+    forest = pipeline['regressor']
+    scaled = pipeline['scaler'].transform(pd.DataFrame(np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES)),
+                                                       columns=FEATURES))
+    values, offsets = _leaf_value_table(forest)
+
+    # apply() walks every tree once and returns the leaf each row lands in
+    leaves = forest.apply(scaled)
+    return values[leaves + offsets].T
+
+
+def summarize(per_tree, quantiles=None):
+    """Mean, std and quantiles over the tree axis of an (n_trees, n_rows) array"""
+    quantiles = DEFAULT_QUANTILES if quantiles is None else quantiles
+    per_tree = np.asarray(per_tree, dtype=np.float64)
+
+    summary = {
+        "mean": per_tree.mean(axis=0),
+        "std": per_tree.std(axis=0),
+    }
+    if quantiles:
+        values = np.quantile(per_tree, quantiles, axis=0)
+        summary["quantiles"] = {quantile_label(q): row for q, row in zip(quantiles, values)}
+    return summary
+
+
+def quantile_label(q):
+    """Response key for a quantile, e.g. 0.1 -> 'p10'"""
+    return f"p{q * 100:g}"
+
+
+def _time(func, *args, repeat=20):
+    """Best-of-repeat wall time of a call, in milliseconds"""
+    import time
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+    from fast_inference import CompiledForest, sample_domain
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    pipeline = joblib.load(os.path.join('model', 'electricity_price_model.pkl'))
+    compiled = CompiledForest.from_pipeline(pipeline)
+
+    # The tree outputs must average back to the model's prediction
+    X = sample_domain(1000)
+    expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+    for name, per_tree in (('compiled', compiled.predict_trees(X)), ('pipeline', pipeline_tree_outputs(pipeline, X))):
+        logger.info(f"{name}: max difference of tree mean vs pipeline {np.max(np.abs(per_tree.mean(axis=0) - expected)):.3g}")
+
+    for n_rows in (1, 100, 1000):
+        X = sample_domain(n_rows)
+        frame = pd.DataFrame(X, columns=FEATURES)
+        plain = _time(compiled.predict, X)
+        intervals = _time(lambda: summarize(compiled.predict_trees(X)))
+        logger.info(f"compiled, {n_rows} rows: predict {plain:.3f} ms, "
+                    f"with intervals {intervals:.3f} ms ({intervals / plain:.2f}x)")
+
+        plain = _time(pipeline.predict, frame)
+        intervals = _time(lambda: summarize(pipeline_tree_outputs(pipeline, X)))
+        logger.info(f"pipeline, {n_rows} rows: predict {plain:.3f} ms, "
+                    f"with intervals {intervals:.3f} ms ({intervals / plain:.2f}x)")
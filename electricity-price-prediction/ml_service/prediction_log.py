@@ -0,0 +1,425 @@
+"""
+Persistent log of the predictions served by the ML service.
+
+Request handlers only append the scored rows to an in-memory buffer; a
+background thread writes the buffer to SQLite in one transaction every
+flush interval, so the request path never waits on disk. When the buffer
+is full (the disk cannot keep up), new predictions are dropped and
+counted rather than blocking requests.
+
+Every flush also updates an hourly rollup table (count, sum, sum of
+squares, min and max per hour bucket, model version and hour-of-day
+feature), so aggregate queries read a few rows per hour of history instead
+of every logged prediction; only the partial hours at the edges of a
+range are aggregated from the raw rows. Range queries use the index on
+created_at. Rows still in the buffer become visible after the next flush.
+
+With retention_days set, raw rows older than that (rounded down to a whole
+bucket) are deleted about once per bucket; their rollup rows are kept, so
+aggregates over whole hours still cover the full history.
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+import atexit
+import logging
+from datetime import datetime, timezone
+import numpy as np
+
+from features import FEATURES, BOOLEAN_FEATURES
+
+logger = logging.getLogger(__name__)
+
+LOG_PATH = os.path.join('data', 'prediction_log.sqlite')
+
+# Size of one rollup bucket, in seconds
+BUCKET_SECONDS = 3600
+
+# Largest number of rows a range query returns
+MAX_QUERY_ROWS = 10000
+
+GROUP_BY = ('hour', 'day', 'model_version', 'none')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    endpoint TEXT,
+    model_version TEXT,
+    hour INTEGER,
+    load REAL,
+    temperature REAL,
+    is_weekend INTEGER,
+    is_holiday INTEGER,
+    prediction REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at);
+CREATE TABLE IF NOT EXISTS prediction_rollup (
+    bucket INTEGER NOT NULL,
+    model_version TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    sum_squares REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (bucket, model_version, hour)
+);
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO prediction_rollup (bucket, model_version, hour, count, sum, sum_squares, min, max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (bucket, model_version, hour) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    sum_squares = sum_squares + excluded.sum_squares,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+# Group key of the rollup and raw tables for each group_by option
+ROLLUP_KEYS = {'hour': 'hour', 'day': f'bucket / {86400 // BUCKET_SECONDS}', 'model_version': 'model_version',
+               'none': "''"}
+RAW_KEYS = {'hour': 'hour', 'day': 'CAST(created_at / 86400 AS INTEGER)', 'model_version': 'model_version',
+            'none': "''"}
+
+
+# A time followed by a space and a UTC offset, e.g. '12:00:00 01:00'
+_SPACED_OFFSET = re.compile(r'(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}:\d{2})$')
+
+
+def parse_time(value):
+    """Unix seconds from an ISO 8601 string or a number (None passes through); naive times are UTC"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    text = str(value).strip()
+    # datetime.fromisoformat only accepts 'Z' from Python 3.11
+    if text.endswith(('Z', 'z')):
+        text = text[:-1] + '+00:00'
+    # An unencoded '+' in a query string arrives as a space
+    text = _SPACED_OFFSET.sub(r'\1+\2', text)
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}': use ISO 8601 or unix seconds")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+
+class PredictionLog:
+    """Buffered, bulk-written SQLite log of served predictions"""
+
+    def __init__(self, path=LOG_PATH, flush_seconds=1.0, max_buffer_rows=200000, retention_days=None):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_buffer_rows = max_buffer_rows
+        self.retention_days = retention_days
+
+        self._buffer = []
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._local = threading.local()
+        self._readers = []
+        self._writer_connection = None
+        self._last_prune = None
+        self._stats = {"written": 0, "dropped": 0, "flushes": 0, "errors": 0, "pruned": 0,
+                       "last_flush_seconds": None}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self, check_same_thread=True):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=check_same_thread)
+        # WAL lets readers (and other worker processes) run while a flush is writing
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _reader(self):
+        """One read connection per request thread, tracked so close() can close them all"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Only used by this thread, but closed from whichever thread calls close()
+            connection = self._local.connection = self._connect(check_same_thread=False)
+            with self._lock:
+                self._readers.append(connection)
+        return connection
+
+    def record(self, matrix, predictions, model_version, endpoint):
+        """Queue an (n_rows, n_features) matrix and its predictions; never touches the disk"""
+        self._append((time.time(), endpoint, model_version, matrix, predictions), len(predictions))
+
+    def record_one(self, features, prediction, model_version, endpoint):
+        """Queue a single prediction from its feature record"""
+        row = [(1.0 if features[field] else 0.0) if field in BOOLEAN_FEATURES else float(features[field])
+               for field in FEATURES]
+        self._append((time.time(), endpoint, model_version, [row], [prediction]), 1)
+
+    def _append(self, entry, n_rows):
+        with self._lock:
+            if self._buffered_rows + n_rows > self.max_buffer_rows:
+                self._stats["dropped"] += n_rows
+                return
+            self._buffer.append(entry)
+            self._buffered_rows += n_rows
+            full = self._buffered_rows >= self.max_buffer_rows // 2
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything buffered so far in one transaction, returning the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+                self._buffered_rows = 0
+            if not entries:
+                return 0
+
+            start = time.perf_counter()
+            rows, rollup = [], {}
+            for created_at, endpoint, model_version, matrix, predictions in entries:
+                matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(FEATURES))
+                predictions = np.asarray(predictions, dtype=np.float64)
+                hours = matrix[:, 0].astype(np.int64)
+                rows.extend(zip([created_at] * len(predictions), [endpoint] * len(predictions),
+                                [model_version] * len(predictions), hours.tolist(), matrix[:, 1].tolist(),
+                                matrix[:, 2].tolist(), matrix[:, 3].astype(np.int64).tolist(),
+                                matrix[:, 4].astype(np.int64).tolist(), predictions.tolist()))
+
+                # Pre-aggregate this entry per hour-of-day before merging it into the rollup
+                bucket = int(created_at // BUCKET_SECONDS)
+                keys, inverse = np.unique(hours, return_inverse=True)
+                counts = np.bincount(inverse)
+                sums = np.bincount(inverse, weights=predictions)
+                squares = np.bincount(inverse, weights=predictions ** 2)
+                minimums = np.full(len(keys), np.inf)
+                maximums = np.full(len(keys), -np.inf)
+                np.minimum.at(minimums, inverse, predictions)
+                np.maximum.at(maximums, inverse, predictions)
+                for i, hour in enumerate(keys.tolist()):
+                    key = (bucket, model_version or '', hour)
+                    total = rollup.get(key)
+                    if total is None:
+                        rollup[key] = [int(counts[i]), sums[i], squares[i], minimums[i], maximums[i]]
+                    else:
+                        total[0] += int(counts[i])
+                        total[1] += sums[i]
+                        total[2] += squares[i]
+                        total[3] = min(total[3], minimums[i])
+                        total[4] = max(total[4], maximums[i])
+
+            try:
+                with self._writer:
+                    self._writer.executemany(
+                        'INSERT INTO predictions (created_at, endpoint, model_version, hour, load, temperature, '
+                        'is_weekend, is_holiday, prediction) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                    self._writer.executemany(UPSERT_ROLLUP, [key + tuple(float(value) for value in total)
+                                                             for key, total in rollup.items()])
+            except sqlite3.Error as e:
+                logger.error(f"Error writing {len(rows)} predictions to the log: {str(e)}")
+                self._stats["errors"] += 1
+                self._stats["dropped"] += len(rows)
+                return 0
+
+            self._stats["written"] += len(rows)
+            self._stats["flushes"] += 1
+            self._stats["last_flush_seconds"] = round(time.perf_counter() - start, 4)
+            return len(rows)
+
+    @property
+    def _writer(self):
+        """The write connection, used only under _flush_lock from whichever thread flushes"""
+        if self._writer_connection is None:
+            self._writer_connection = self._connect(check_same_thread=False)
+        return self._writer_connection
+
+    def prune(self, now=None):
+        """Delete raw rows older than retention_days, returning the number deleted
+
+        The cutoff is rounded down to a bucket boundary, so every remaining
+        bucket still has all its raw rows.
+        """
+        if not self.retention_days:
+            return 0
+        now = time.time() if now is None else now
+        cutoff = (now - self.retention_days * 86400) // BUCKET_SECONDS * BUCKET_SECONDS
+        with self._flush_lock:
+            try:
+                with self._writer:
+                    deleted = self._writer.execute('DELETE FROM predictions WHERE created_at < ?', (cutoff,)).rowcount
+            except sqlite3.Error as e:
+                logger.error(f"Error pruning the prediction log: {str(e)}")
+                self._stats["errors"] += 1
+                return 0
+        self._last_prune = now
+        self._stats["pruned"] += deleted
+        if deleted:
+            logger.info(f"Pruned {deleted} logged predictions older than {format_time(cutoff)}")
+        return deleted
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+                # Raw rows are rolled up at flush, so they can be pruned right after
+                if self.retention_days and (self._last_prune is None
+                                            or time.time() - self._last_prune >= BUCKET_SECONDS):
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Error flushing the prediction log: {str(e)}")
+
+    def start(self):
+        """Start the background flush thread and flush whatever is left at exit"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def close(self):
+        """Stop the flush thread, write out the buffer and close every connection"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+        with self._lock:
+            readers, self._readers = self._readers, []
+            # Threads that query after this reconnect instead of using a closed connection
+            self._local = threading.local()
+        for connection in readers:
+            connection.close()
+        with self._flush_lock:
+            if self._writer_connection is not None:
+                self._writer_connection.close()
+                self._writer_connection = None
+
+    def query(self, start=None, end=None, model_version=None, limit=100):
+        """Logged predictions with start <= created_at < end, newest first"""
+        conditions, params = self._range(start, end, model_version)
+        cursor = self._reader().execute(
+            'SELECT created_at, endpoint, model_version, hour, load, temperature, is_weekend, is_holiday, prediction '
+            f'FROM predictions {conditions} ORDER BY created_at DESC, id DESC LIMIT ?',
+            params + [max(1, min(int(limit), MAX_QUERY_ROWS))])
+        return [{
+            "created_at": format_time(created_at),
+            "endpoint": endpoint,
+            "model_version": model_version,
+            "input": {"hour": hour, "load": load, "temperature": temperature,
+                      "is_weekend": bool(is_weekend), "is_holiday": bool(is_holiday)},
+            "prediction": prediction,
+        } for created_at, endpoint, model_version, hour, load, temperature, is_weekend, is_holiday, prediction
+            in cursor.fetchall()]
+
+    @staticmethod
+    def _range(start, end, model_version, column='created_at'):
+        conditions, params = [], []
+        if start is not None:
+            conditions.append(f'{column} >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append(f'{column} < ?')
+            params.append(end)
+        if model_version is not None:
+            conditions.append('model_version = ?')
+            params.append(model_version)
+        return ('WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+    def aggregate(self, start=None, end=None, group_by='hour', model_version=None):
+        """Count, mean, std, min and max of the predictions in [start, end), grouped by group_by
+
+        group_by is 'hour' (the hour-of-day feature), 'day' (UTC date the
+        prediction was made), 'model_version' or 'none'.
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+
+        # Whole buckets inside the range come from the rollup, the partial ones at either end from raw rows
+        first_bucket = None if start is None else int(-(-start // BUCKET_SECONDS))
+        last_bucket = None if end is None else int(end // BUCKET_SECONDS)
+        if first_bucket is not None and last_bucket is not None and last_bucket < first_bucket:
+            first_bucket = last_bucket = None
+            raw_ranges = [(start, end)]
+        else:
+            raw_ranges = []
+            if first_bucket is not None and start < first_bucket * BUCKET_SECONDS:
+                raw_ranges.append((start, first_bucket * BUCKET_SECONDS))
+            if last_bucket is not None and last_bucket * BUCKET_SECONDS < end:
+                raw_ranges.append((last_bucket * BUCKET_SECONDS, end))
+
+        connection = self._reader()
+        totals = {}
+
+        def merge(rows):
+            for key, count, total, squares, minimum, maximum in rows:
+                current = totals.get(key)
+                if current is None:
+                    totals[key] = [count, total, squares, minimum, maximum]
+                else:
+                    current[0] += count
+                    current[1] += total
+                    current[2] += squares
+                    current[3] = min(current[3], minimum)
+                    current[4] = max(current[4], maximum)
+
+        if start is None or end is None or first_bucket is not None:
+            conditions, params = self._range(first_bucket, last_bucket, model_version, column='bucket')
+            merge(connection.execute(
+                f'SELECT {ROLLUP_KEYS[group_by]} AS key, SUM(count), SUM(sum), SUM(sum_squares), MIN(min), MAX(max) '
+                f'FROM prediction_rollup {conditions} GROUP BY key', params).fetchall())
+        for range_start, range_end in raw_ranges:
+            conditions, params = self._range(range_start, range_end, model_version)
+            merge(connection.execute(
+                f'SELECT {RAW_KEYS[group_by]} AS key, COUNT(*), SUM(prediction), SUM(prediction * prediction), '
+                f'MIN(prediction), MAX(prediction) FROM predictions {conditions} GROUP BY key', params).fetchall())
+
+        groups = []
+        for key, (count, total, squares, minimum, maximum) in sorted(totals.items()):
+            if not count:
+                continue
+            mean = total / count
+            group = {
+                "count": count,
+                "mean": mean,
+                "std": float(np.sqrt(max(squares / count - mean * mean, 0.0))),
+                "min": minimum,
+                "max": maximum,
+            }
+            if group_by == 'day':
+                group = dict(day=datetime.fromtimestamp(key * 86400, tz=timezone.utc).date().isoformat(), **group)
+            elif group_by != 'none':
+                group = dict({group_by: key}, **group)
+            groups.append(group)
+        return groups
+
+    def stats(self):
+        """Buffer and write counters for /health"""
+        with self._lock:
+            buffered = self._buffered_rows
+        return dict(self._stats, enabled=True, buffered=buffered, path=self.path,
+                    retention_days=self.retention_days)
@@ -0,0 +1,147 @@
+"""
+Micro-batching of concurrent single-row predictions.
+
+Request threads hand their feature row to a RequestCoalescer and wait; a
+background thread collects rows for a short window (or until a batch is
+full, or the earliest request's latency budget requires it) and scores the
+whole batch with one vectorized call, then wakes every waiting request with
+its result.
+"""
+import time
+import queue
+import threading
+import logging
+import numpy as np
+
+from features import FEATURES, BOOLEAN_FEATURES
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+QUEUE_WAIT_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100]
+
+
+class _Pending:
+    """One request waiting for its row to be scored"""
+    __slots__ = ('loaded', 'row', 'enqueued', 'flush_by', 'done', 'result', 'error', 'abandoned')
+
+    def __init__(self, loaded, row, flush_by):
+        self.loaded = loaded
+        self.row = row
+        self.enqueued = time.perf_counter()
+        self.flush_by = self.enqueued + flush_by
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class RequestCoalescer:
+    """Gathers concurrent single-row predictions into vectorized batches"""
+
+    def __init__(self, window_ms=2.0, max_batch=64):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_waits = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.timeouts = 0
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Start the batching thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='request-coalescer', daemon=True)
+            self._thread.start()
+        return self
+
+    def predict(self, loaded, features, budget_ms):
+        """Score one record through the next batch; raises TimeoutError if the budget runs out"""
+        row = [(1.0 if features[field] else 0.0) if field in BOOLEAN_FEATURES else float(features[field])
+               for field in FEATURES]
+        budget = budget_ms / 1000
+
+        # Never hold a row longer than half its budget so there is time left to score it
+        pending = _Pending(loaded, row, min(self.window, budget / 2))
+        self._queue.put(pending)
+
+        if not pending.done.wait(budget):
+            pending.abandoned = True
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Prediction not ready within {budget_ms} ms")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get())
+                flush_by = batch[0].flush_by
+
+                # Keep collecting until the window closes or the batch is full
+                while len(batch) < self.max_batch:
+                    timeout = flush_by - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        pending = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    batch.append(pending)
+                    flush_by = min(flush_by, pending.flush_by)
+
+                self._execute(batch)
+            except Exception as e:
+                # Keep the thread alive, and fail this batch now instead of letting it wait out its budget
+                logger.error(f"Error in the request coalescer: {str(e)}")
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.error = e
+                        pending.done.set()
+
+    def _execute(self, batch):
+        start = time.perf_counter()
+        batch = [pending for pending in batch if not pending.abandoned]
+        if not batch:
+            return
+
+        # Requests that raced with a model swap are scored by the model they started with
+        groups = {}
+        for pending in batch:
+            groups.setdefault(id(pending.loaded), []).append(pending)
+
+        for group in groups.values():
+            loaded = group[0].loaded
+            X = np.array([pending.row for pending in group])
+            try:
+                predictions = loaded.predict_matrix(X)
+                for pending, prediction in zip(group, predictions):
+                    pending.result = float(prediction)
+            except Exception as e:
+                logger.error(f"Error scoring coalesced batch: {str(e)}")
+                for pending in group:
+                    pending.error = e
+
+            self.batch_sizes.observe(len(group))
+            for pending in group:
+                self.queue_waits.observe((start - pending.enqueued) * 1000)
+                pending.done.set()
+
+    def stats(self):
+        """Return batch-size and queue-wait histograms"""
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queued": self._queue.qsize(),
+            "timeouts": self.timeouts,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_waits.snapshot(),
+        }
@@ -0,0 +1,115 @@
+"""
+Production entry point for the ML service.
+
+Runs the Flask app in N pre-forked gunicorn workers, each with a pool of
+threads. The master process compiles the active model once and dumps it
+uncompressed; every worker then memory-maps that dump (mmap_mode='r'), so
+the forest lives once in the page cache no matter how many workers run.
+
+If no model has been trained yet, the master starts training one in a
+separate process and binds the port straight away; workers report the model
+as failed on /health until training registers it, then pick it up through
+the registry watcher.
+
+Usage: WEB_WORKERS=4 WEB_THREADS=8 python serve.py
+"""
+import os
+import logging
+import multiprocessing
+
+# Workers serve from the shared, memory-mapped compiled model
+os.environ.setdefault('SHARED_MODEL', 'true')
+
+# Workers never train a missing model themselves; the master trains one in the background instead
+os.environ.setdefault('TRAIN_IF_MISSING', 'false')
+
+from gunicorn.app.base import BaseApplication
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Serving settings
+BIND = os.environ.get('BIND', '0.0.0.0:5000')
+WORKERS = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count()))
+THREADS = int(os.environ.get('WEB_THREADS', 4))
+TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 120))
+
+
+def train_initial_model(finished):
+    """Train, register and dump the first model; runs in its own process while the workers serve"""
+    from model_loader import ModelLoader, export_compiled
+    from train_model import train_model
+
+    try:
+        pipeline = train_model()
+        if pipeline is None:
+            logger.error("Initial training failed; workers will report the model as failed")
+            return
+        export_compiled(*ModelLoader(shared=True).resolve(), pipeline)
+    finally:
+        finished.set()
+
+
+def prepare_shared_model():
+    """Compile and dump the active model before forking so workers only have to map it
+
+    With no model at all, training is started in a background process, so
+    the port is bound without waiting for it. Returns the process and an
+    event set when it is done (None, None if nothing needs training).
+    """
+    from model_loader import ModelLoader, export_compiled
+
+    version, path = ModelLoader(shared=True).resolve()
+    if os.path.exists(path):
+        export_compiled(version, path)
+        return None, None
+
+    logger.warning("No trained model found; training one in the background. Workers will serve it "
+                   "once it is registered (MODEL_WATCH_INTERVAL must be > 0)")
+    finished = multiprocessing.Event()
+    trainer = multiprocessing.Process(target=train_initial_model, args=(finished,), name='initial-training')
+    trainer.start()
+    return trainer, finished
+
+
+class ServiceApplication(BaseApplication):
+    """Gunicorn application that imports the Flask app inside each worker"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Imported after the fork so each worker starts its own loader and watcher threads
+        from app import app
+        return app
+
+
+def stop_trainer(trainer, finished):
+    """Gunicorn on_exit hook: do not keep the server from shutting down while initial training runs"""
+    def on_exit(arbiter):
+        # The arbiter reaps every child, so is_alive() cannot tell; the trainer reports finishing itself
+        if trainer is not None and not finished.is_set():
+            logger.info("Stopping initial training")
+            trainer.terminate()
+    return on_exit
+
+
+if __name__ == "__main__":
+    trainer, finished = prepare_shared_model()
+    logger.info(f"Starting {WORKERS} workers x {THREADS} threads on {BIND}")
+    ServiceApplication({
+        'bind': BIND,
+        'workers': WORKERS,
+        'threads': THREADS,
+        'worker_class': 'gthread',
+        'timeout': TIMEOUT,
+        'preload_app': False,
+        'on_exit': stop_trainer(trainer, finished),
+    }).run()
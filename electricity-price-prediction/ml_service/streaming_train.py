@@ -0,0 +1,175 @@
+"""
+Out-of-core training for histories that do not fit in memory.
+
+History is streamed from the columnar data store in fixed-size chunks. A
+first pass fits the StandardScaler incrementally with partial_fit; a second
+pass trains a small forest on (a subsample of) each chunk, or of each group
+of chunks when there are more chunks than trees, and merges the trees into
+one RandomForestRegressor of at most max_trees trees; a final pass scores
+the held-out rows. Peak memory is bounded by the chunk size and the forest,
+not by the size of the history.
+"""
+import os
+import time
+import logging
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
+
+from features import FEATURES
+from data_store import iter_partitions, ensure_store, STORE_DIR
+from model_registry import register_model, MAX_HOLDOUT_ROWS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join('model', 'electricity_price_model.pkl')
+
+# Streaming settings
+CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 200000))
+MAX_ROWS_PER_FOREST = int(os.environ.get('STREAM_MAX_ROWS_PER_FOREST', 50000))
+MAX_TREES = int(os.environ.get('STREAM_MAX_TREES', 200))
+TEST_SIZE = 0.2
+
+# Columnar store to train from, e.g. a region generated by synthetic_data.py
+HISTORY_STORE_DIR = os.environ.get('STREAM_STORE_DIR', STORE_DIR)
+
+
+def history_chunks(chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of about chunk_rows rows from the columnar history"""
+    buffer, buffered = [], 0
+    for frame in iter_partitions(columns=FEATURES + ['price'], chunk_rows=chunk_rows, store_dir=HISTORY_STORE_DIR):
+        buffer.append(frame)
+        buffered += len(frame)
+        # Months are often smaller than a chunk, so combine them until the chunk is full
+        if buffered >= chunk_rows:
+            combined = pd.concat(buffer, ignore_index=True)
+            buffer, buffered = [combined.iloc[chunk_rows:]], len(combined) - chunk_rows
+            yield combined.iloc[:chunk_rows]
+    if buffered:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def _split(chunk, chunk_index, test_size=TEST_SIZE):
+    """Deterministic per-chunk train/test mask so every pass sees the same split"""
+    rng = np.random.default_rng(chunk_index)
+    return rng.random(len(chunk)) < test_size
+
+
+def train_streaming(chunks=history_chunks, chunk_rows=CHUNK_ROWS, max_rows_per_forest=MAX_ROWS_PER_FOREST,
+                    max_trees=MAX_TREES, max_depth=20, save=True):
+    """Train a scaler + forest pipeline over a chunked data source with bounded memory
+
+    chunks is a callable returning a fresh iterator of DataFrames with the
+    feature columns and 'price'; it is called once per pass.
+    """
+    start = time.perf_counter()
+
+    # Pass 1: fit the scaler incrementally and count the rows
+    scaler = StandardScaler()
+    n_chunks, n_rows = 0, 0
+    for i, chunk in enumerate(chunks(chunk_rows)):
+        train = chunk[~_split(chunk, i)]
+        if len(train):
+            scaler.partial_fit(train[FEATURES])
+        n_chunks, n_rows = i + 1, n_rows + len(chunk)
+
+    if n_rows == 0:
+        logger.error("No data available for streaming training")
+        return None
+    logger.info(f"Scaler fitted over {n_rows} rows in {n_chunks} chunks")
+
+    # Pass 2: one small forest per group of consecutive chunks, merged into a single forest. There are
+    # at most max_trees groups, so with more chunks than trees several chunks are pooled into each one
+    n_groups = min(n_chunks, max_trees)
+    group_sizes = np.bincount(np.arange(n_chunks) * n_groups // n_chunks, minlength=n_groups)
+    forest, pooled = None, []
+    for i, chunk in enumerate(chunks(chunk_rows)):
+        group = i * n_groups // n_chunks
+        train = chunk[~_split(chunk, i)]
+        # Each chunk contributes an equal share of the group's rows
+        rows_per_chunk = max(1, max_rows_per_forest // group_sizes[group])
+        if len(train) > rows_per_chunk:
+            train = train.sample(rows_per_chunk, random_state=i)
+        pooled.append(train)
+        if (i + 1) * n_groups // n_chunks == group:
+            # More chunks of this group to come
+            continue
+
+        train = pd.concat(pooled, ignore_index=True)
+        pooled = []
+        if len(train) == 0:
+            continue
+
+        # Spread max_trees over the groups, giving the remainder to the first ones
+        n_trees = max_trees // n_groups + (1 if group < max_trees % n_groups else 0)
+        chunk_forest = RandomForestRegressor(n_estimators=n_trees, max_depth=max_depth,
+                                             random_state=42 + group, n_jobs=-1)
+        chunk_forest.fit(scaler.transform(train[FEATURES]), train['price'].to_numpy())
+
+        if forest is None:
+            forest = chunk_forest
+        else:
+            forest.estimators_ += chunk_forest.estimators_
+        forest.n_estimators = len(forest.estimators_)
+        logger.info(f"Chunk {i + 1}/{n_chunks}: {len(train)} training rows, {forest.n_estimators} trees so far")
+
+    if forest is None:
+        raise ValueError(f"No trees were fitted: none of the {n_chunks} chunks has any training rows")
+
+    pipeline = Pipeline([
+        ('scaler', scaler),
+        ('regressor', forest)
+    ])
+
+    # Pass 3: accumulate holdout metrics without keeping predictions around. The first held-out
+    # rows are kept (up to MAX_HOLDOUT_ROWS) and stored with the version for compress_model.py
+    sse, sae, sum_y, sum_y2, n_test = 0.0, 0.0, 0.0, 0.0, 0
+    holdout_X, holdout_y = [], []
+    for i, chunk in enumerate(chunks(chunk_rows)):
+        test = chunk[_split(chunk, i)]
+        if len(test) == 0:
+            continue
+        y = test['price'].to_numpy(dtype=np.float64)
+        keep = max(0, MAX_HOLDOUT_ROWS - n_test)
+        if keep:
+            holdout_X.append(test[FEATURES].to_numpy(dtype=np.float64)[:keep])
+            holdout_y.append(y[:keep])
+        error = y - pipeline.predict(test[FEATURES])
+        sse += float(np.sum(error ** 2))
+        sae += float(np.sum(np.abs(error)))
+        sum_y += float(np.sum(y))
+        sum_y2 += float(np.sum(y ** 2))
+        n_test += len(y)
+
+    metrics = {"rows": n_rows, "trees": forest.n_estimators}
+    if n_test:
+        total = sum_y2 - sum_y ** 2 / n_test
+        metrics.update(rmse=float(np.sqrt(sse / n_test)), mae=sae / n_test,
+                       r2=1 - sse / total if total else None)
+        logger.info("Model evaluation metrics:")
+        logger.info(f"RMSE: {metrics['rmse']:.2f}")
+        logger.info(f"MAE: {metrics['mae']:.2f}")
+        if metrics['r2'] is not None:
+            logger.info(f"R²: {metrics['r2']:.4f}")
+
+    logger.info(f"Streaming training finished in {time.perf_counter() - start:.2f}s")
+
+    if save:
+        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+        joblib.dump(pipeline, MODEL_PATH)
+        logger.info(f"Model successfully saved to {MODEL_PATH}")
+        holdout = (np.vstack(holdout_X), np.concatenate(holdout_y)) if holdout_X else None
+        register_model(pipeline, metrics=metrics, source='streaming_train', holdout=holdout)
+
+    return pipeline
+
+
+if __name__ == "__main__":
+    ensure_store(store_dir=HISTORY_STORE_DIR)
+    train_streaming()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The service modules live one directory up and import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing app must not start a prediction log writing into the working tree
+os.environ.setdefault('PREDICTION_LOG', 'false')
+
+
+@pytest.fixture(scope='session')
+def pipeline():
+    """A small fitted scaler + forest pipeline on synthetic data"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.pipeline import Pipeline
+    from features import FEATURES
+    from train_model import generate_synthetic_data
+
+    data = generate_synthetic_data(n_samples=2000)
+    model = Pipeline([
+        ('scaler', StandardScaler()),
+        ('regressor', RandomForestRegressor(n_estimators=20, random_state=42, n_jobs=1))
+    ])
+    return model.fit(data[FEATURES], data['price'])
@@ -0,0 +1,52 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import build_feature_cache
+from data_store import DATA_PATH, build_store
+from train_model import generate_synthetic_data
+
+
+def write_csv(path, rows):
+    data = generate_synthetic_data(n_samples=rows)
+    data.insert(0, 'timestamp', pd.date_range('2023-01-01', periods=rows, freq='h'))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data.to_csv(path, index=False)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_custom_store_is_not_synced_from_default_csv(workdir):
+    write_csv('other.csv', 300)
+    build_store('other.csv', 'custom')
+    # A larger default CSV used to be appended to whichever store was backtested
+    write_csv(DATA_PATH, 500)
+
+    paths = build_feature_cache('custom', 'cache')
+    assert len(np.load(paths['y'])) == 300
+
+
+def test_default_store_is_synced_from_default_csv(workdir):
+    write_csv(DATA_PATH, 400)
+    paths = build_feature_cache(cache_dir='cache')
+    assert len(np.load(paths['y'])) == 400
+
+
+def test_only_latest_caches_are_kept(workdir):
+    write_csv('other.csv', 100)
+    directories = []
+    for i in range(4):
+        # Rewriting the store changes its fingerprint, so each run writes a new cache
+        time.sleep(0.01)
+        build_store('other.csv', 'custom')
+        paths = build_feature_cache('custom', 'cache', keep=2)
+        directories.append(os.path.dirname(paths['y']))
+
+    assert sorted(os.listdir('cache')) == sorted(os.path.basename(path) for path in directories[-2:])
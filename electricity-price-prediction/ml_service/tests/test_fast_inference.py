@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import FEATURES
+from fast_inference import (CompiledForest, NODE_DTYPE, COMPACT_NODE_DTYPE, PARITY_TOLERANCE,
+                            COMPILED_MAX_BATCH_ROWS, sample_domain)
+from model_loader import LoadedModel
+
+# Compact nodes store leaf values as float32 (about 7 significant digits on prices in the tens)
+COMPACT_TOLERANCE = 1e-4
+
+
+def compact_dtype(value_dtype):
+    return np.dtype([(name, COMPACT_NODE_DTYPE[name] if name != 'value' else np.dtype(value_dtype))
+                     for name in COMPACT_NODE_DTYPE.names])
+
+
+def tree_predictions(pipeline, X, trees=None, max_depth=None):
+    """sklearn's per-tree predictions as an (n_trees, n_rows) array, with trees cut at max_depth"""
+    scaled = pipeline['scaler'].transform(pd.DataFrame(X, columns=FEATURES)).astype(np.float32)
+    estimators = pipeline['regressor'].estimators_
+    outputs = []
+    for estimator in (estimators if trees is None else [estimators[i] for i in trees]):
+        if max_depth is None:
+            outputs.append(estimator.predict(scaled))
+            continue
+
+        tree = estimator.tree_
+        depth = np.zeros(tree.node_count, dtype=np.int64)
+        # Children always have higher ids than their parent
+        for node in range(tree.node_count):
+            for child in (tree.children_left[node], tree.children_right[node]):
+                if child != -1:
+                    depth[child] = depth[node] + 1
+        # Deepest node within max_depth on each row's decision path
+        path = estimator.decision_path(scaled).toarray()
+        reached = np.argmax(path * np.where(depth <= max_depth, depth + 1, 0), axis=1)
+        outputs.append(tree.value[reached, 0, 0])
+    return np.array(outputs)
+
+
+@pytest.fixture(scope='module')
+def X():
+    return sample_domain(1000, seed=7)
+
+
+def test_predict_matches_pipeline(pipeline, X):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+    assert np.max(np.abs(compiled.predict(X) - expected)) <= PARITY_TOLERANCE
+
+
+def test_predict_one_matches_pipeline(pipeline, X):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    rows = X[:200]
+    expected = pipeline.predict(pd.DataFrame(rows, columns=FEATURES))
+    single = [compiled.predict_one(dict(zip(FEATURES, row))) for row in rows]
+    assert np.max(np.abs(np.array(single) - expected)) <= PARITY_TOLERANCE
+
+
+def test_predict_one_accepts_booleans(pipeline):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    record = {'hour': 18, 'load': 19000, 'temperature': 31, 'is_weekend': True, 'is_holiday': False}
+    expected = pipeline.predict(pd.DataFrame([record], columns=FEATURES))[0]
+    assert abs(compiled.predict_one(record) - expected) <= PARITY_TOLERANCE
+
+
+def test_predict_trees_matches_estimators(pipeline, X):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    per_tree = compiled.predict_trees(X)
+    assert per_tree.shape == (len(pipeline['regressor'].estimators_), len(X))
+    assert np.max(np.abs(per_tree - tree_predictions(pipeline, X))) <= PARITY_TOLERANCE
+    assert np.allclose(per_tree.mean(axis=0), compiled.predict(X))
+
+
+def test_large_batches_are_split_into_blocks(pipeline):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    X = sample_domain(2500, seed=11)
+    expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+    assert np.max(np.abs(compiled.predict(X) - expected)) <= PARITY_TOLERANCE
+
+
+@pytest.mark.parametrize('max_depth', [1, 4, 8])
+def test_depth_capped_matches_truncated_trees(pipeline, X, max_depth):
+    compiled = CompiledForest.from_pipeline(pipeline, max_depth=max_depth)
+    assert compiled.depth == max_depth
+    expected = tree_predictions(pipeline, X, max_depth=max_depth)
+
+    assert np.max(np.abs(compiled.predict_trees(X) - expected)) <= PARITY_TOLERANCE
+    assert np.max(np.abs(compiled.predict(X) - expected.mean(axis=0))) <= PARITY_TOLERANCE
+    single = [compiled.predict_one(dict(zip(FEATURES, row))) for row in X[:50]]
+    assert np.max(np.abs(np.array(single) - expected.mean(axis=0)[:50])) <= PARITY_TOLERANCE
+
+
+def test_depth_cap_beyond_forest_depth_changes_nothing(pipeline, X):
+    full = CompiledForest.from_pipeline(pipeline)
+    capped = CompiledForest.from_pipeline(pipeline, max_depth=full.depth + 5)
+    assert capped.depth == full.depth
+    assert np.array_equal(capped.predict(X), full.predict(X))
+
+
+@pytest.mark.parametrize('max_depth', [None, 6])
+def test_compact_dtype_matches_pipeline(pipeline, X, max_depth):
+    compact = CompiledForest.from_pipeline(pipeline, max_depth=max_depth, dtype=COMPACT_NODE_DTYPE)
+    assert compact.nodes.dtype == COMPACT_NODE_DTYPE
+    expected = tree_predictions(pipeline, X, max_depth=max_depth)
+
+    assert np.max(np.abs(compact.predict_trees(X) - expected)) <= COMPACT_TOLERANCE
+    assert np.max(np.abs(compact.predict(X) - expected.mean(axis=0))) <= COMPACT_TOLERANCE
+    single = [compact.predict_one(dict(zip(FEATURES, row))) for row in X[:50]]
+    assert np.max(np.abs(np.array(single) - expected.mean(axis=0)[:50])) <= COMPACT_TOLERANCE
+
+
+def test_compact_thresholds_split_integer_inputs_exactly(pipeline):
+    # Training values sit right on the float64 splits, so rounding a split to the nearest float32
+    # (rather than down) would send inputs such as hour=10 the wrong way
+    X = np.round(sample_domain(2000, seed=3))
+    full = CompiledForest.from_pipeline(pipeline)
+    compact = CompiledForest.from_pipeline(pipeline, dtype=COMPACT_NODE_DTYPE)
+    assert np.array_equal(compact._leaves(X), full._leaves(X))
+
+
+def test_float16_values(pipeline, X):
+    compact = CompiledForest.from_pipeline(pipeline, dtype=compact_dtype('float16'))
+    expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+    # float16 keeps about 3 significant digits of each leaf value
+    assert np.max(np.abs(compact.predict(X) - expected)) <= np.max(np.abs(expected)) * 1e-3
+
+
+def test_saved_arrays_round_trip(pipeline, X, tmp_path):
+    trees = [0, 3, 5, 11]
+    compact = CompiledForest.from_pipeline(pipeline, trees=trees, max_depth=5, dtype=COMPACT_NODE_DTYPE)
+    directory = str(tmp_path / 'compressed')
+    compact.save_arrays(directory, source_version='test')
+
+    loaded, metadata = CompiledForest.load_arrays(directory, mmap_mode='r')
+    assert metadata['source_version'] == 'test'
+    assert metadata['trees'] == len(trees)
+    assert metadata['depth'] == 5
+
+    expected = tree_predictions(pipeline, X, trees=trees, max_depth=5)
+    assert np.max(np.abs(loaded.predict_trees(X) - expected)) <= COMPACT_TOLERANCE
+    assert np.array_equal(loaded.predict(X), compact.predict(X))
+
+
+def test_saved_dump_round_trip(pipeline, X, tmp_path):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    path = str(tmp_path / 'forest.joblib')
+    compiled.save(path)
+    assert np.array_equal(CompiledForest.load(path, mmap_mode='r').predict(X), compiled.predict(X))
+
+
+def test_predict_matrix_uses_compiled_forest_for_small_batches_only(pipeline, monkeypatch):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    loaded = LoadedModel(pipeline, compiled)
+    calls = []
+    predict = compiled.predict
+    monkeypatch.setattr(compiled, 'predict', lambda X: calls.append(len(X)) or predict(X))
+
+    for n_rows in (1, COMPILED_MAX_BATCH_ROWS, COMPILED_MAX_BATCH_ROWS + 1):
+        X = sample_domain(n_rows, seed=n_rows)
+        expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+        assert np.max(np.abs(loaded.predict_matrix(X) - expected)) <= PARITY_TOLERANCE
+    assert calls == [1, COMPILED_MAX_BATCH_ROWS]
+
+
+def test_predict_trees_uses_compiled_forest_for_small_batches_only(pipeline, monkeypatch):
+    compiled = CompiledForest.from_pipeline(pipeline)
+    loaded = LoadedModel(pipeline, compiled)
+    calls = []
+    predict_trees = compiled.predict_trees
+    monkeypatch.setattr(compiled, 'predict_trees', lambda X: calls.append(len(X)) or predict_trees(X))
+
+    for n_rows in (1, COMPILED_MAX_BATCH_ROWS, COMPILED_MAX_BATCH_ROWS + 1):
+        X = sample_domain(n_rows, seed=n_rows)
+        per_tree = loaded.predict_trees(X)
+        assert per_tree.shape == (len(pipeline['regressor'].estimators_), n_rows)
+        expected = pipeline.predict(pd.DataFrame(X, columns=FEATURES))
+        assert np.max(np.abs(per_tree.mean(axis=0) - expected)) <= PARITY_TOLERANCE
+    assert calls == [1, COMPILED_MAX_BATCH_ROWS]
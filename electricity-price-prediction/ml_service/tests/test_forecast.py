@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from forecast import ForecastError, parse_request, build_features
+
+
+def features_for(start, hours=3):
+    start, load, temperature = parse_request({'start': start, 'load': [15000] * hours,
+                                              'temperature': [10] * hours})
+    return build_features(start, load, temperature)
+
+
+@pytest.mark.parametrize('start', ['2024-01-01T00:00:00', '2024-01-01T00:00:00+05:00',
+                                   '2024-01-01T00:00:00-08:00'])
+def test_offset_start_uses_local_wall_time(start):
+    timestamps, matrix = features_for(start)
+    # Hour 0 of Monday, New Year's Day, whatever the offset
+    assert matrix[0].tolist() == [0, 15000, 10, 0, 1]
+    assert matrix[:, 0].tolist() == [0, 1, 2]
+    assert timestamps[0].isoformat() == start
+
+
+def test_horizon_crossing_midnight_with_offset():
+    timestamps, matrix = features_for('2023-12-31T23:00:00+05:00', hours=2)
+    # Sunday 23:00 (weekend, not a holiday), then Monday 00:00 (New Year's Day)
+    assert matrix[:, [0, 3, 4]].tolist() == [[23, 1, 0], [0, 0, 1]]
+
+
+def test_start_must_be_on_the_hour():
+    with pytest.raises(ForecastError):
+        features_for('2024-01-01T00:30:00+05:00')
+
+
+def test_feature_matrix_is_float64():
+    _, matrix = features_for('2024-07-04T12:00:00')
+    assert matrix.dtype == np.float64
+    assert matrix[0, 4] == 1
@@ -0,0 +1,26 @@
+import copy
+
+import numpy as np
+
+from features import FEATURES
+from incremental_train import grow_forest
+from train_model import generate_synthetic_data
+
+
+def test_consecutive_updates_add_different_trees(pipeline):
+    forest = copy.deepcopy(pipeline['regressor'])
+    max_trees = len(forest.estimators_)
+    data = generate_synthetic_data(n_samples=500)
+    X = pipeline['scaler'].transform(data[FEATURES])
+    y = data['price'].to_numpy()
+
+    # The forest is already full, so each update retires as many trees as it adds
+    assert grow_forest(forest, X, y, 5, max_trees, seed=1) == 5
+    first = forest.estimators_[-5:]
+    assert grow_forest(forest, X, y, 5, max_trees, seed=2) == 5
+    second = forest.estimators_[-5:]
+
+    assert len(forest.estimators_) == forest.n_estimators == max_trees
+    assert [tree.random_state for tree in first] != [tree.random_state for tree in second]
+    for old, new in zip(first, second):
+        assert not np.array_equal(old.predict(X), new.predict(X))
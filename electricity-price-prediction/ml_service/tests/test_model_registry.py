@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from model_registry import register_model, activate, rollback, artifact_path, read_manifest
+from model_loader import ModelLoader
+from prediction_grid import build_and_save_grid
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Run against an empty model/ directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_grid_follows_the_served_version(registry, pipeline):
+    first = register_model(pipeline)
+    build_and_save_grid(pipeline, os.path.dirname(artifact_path(first)), load_step=2000, temperature_step=6)
+    second = register_model(pipeline)
+    build_and_save_grid(pipeline, os.path.dirname(artifact_path(second)), load_step=1000, temperature_step=6)
+    third = register_model(pipeline)
+
+    loader = ModelLoader(fast_inference=False, use_grid=True)
+    # A version trained without a grid is served from the model
+    assert loader.load().version == third
+    assert loader.current.grid is None
+
+    rollback(second)
+    assert loader.reload()
+    assert loader.current.version == second
+    assert loader.current.grid.load_step == 1000
+
+    rollback(first)
+    assert loader.reload()
+    assert loader.current.grid.load_step == 2000
+
+
+def test_repeated_rollbacks_walk_back_through_history(registry, pipeline):
+    v1, v2, v3 = (register_model(pipeline) for _ in range(3))
+
+    assert rollback() == v2
+    # Previously this flipped back to v3, the version just rolled back from
+    assert rollback() == v1
+    with pytest.raises(ValueError):
+        rollback()
+
+
+def test_activation_resets_rollbacks(registry, pipeline):
+    v1, v2, v3 = (register_model(pipeline) for _ in range(3))
+    rollback()
+    rollback()
+    # Re-activating v3 by hand starts a new rollback chain from there
+    activate(v3)
+    assert rollback() == v1
+    assert rollback() == v2
+
+
+def test_rollback_to_explicit_version(registry, pipeline):
+    v1, v2, v3 = (register_model(pipeline) for _ in range(3))
+    assert rollback(v1) == v1
+    assert rollback() == v2
+
+
+def _register(i):
+    # Any picklable object will do as the artifact
+    return register_model({'model': i}, source=f'worker-{i}')
+
+
+def test_concurrent_registrations_are_all_recorded(registry):
+    import multiprocessing
+
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        versions = pool.map(_register, range(8))
+
+    manifest = read_manifest()
+    assert sorted(entry['version'] for entry in manifest['versions']) == sorted(versions)
+    assert len(set(versions)) == 8
+    assert not [name for name in os.listdir('model/registry') if name.endswith('.tmp')]
+
+
+def test_pruning_removes_derived_dumps(registry, pipeline, monkeypatch):
+    import model_registry
+    from model_loader import export_compiled, compressed_path
+
+    monkeypatch.setattr(model_registry, 'KEEP_VERSIONS', 2)
+    first = register_model(pipeline)
+    dump = export_compiled(first, artifact_path(first), pipeline)
+    os.makedirs(compressed_path(first, artifact_path(first)))
+
+    register_model(pipeline)
+    register_model(pipeline)
+    assert first not in {entry['version'] for entry in read_manifest()['versions']}
+    assert not os.path.exists(dump)
+    assert not os.path.exists(dump.replace('.joblib', '.json'))
+    assert not os.path.exists(compressed_path(first, artifact_path(first)))
+
+
+def test_holdout_is_stored_with_the_version(registry, pipeline, monkeypatch):
+    import numpy as np
+    import model_registry
+    from model_registry import load_holdout
+    from compress_model import validation_splits
+
+    X, y = np.arange(50.0).reshape(10, 5), np.arange(10.0)
+    version = register_model(pipeline, holdout=(X, y))
+    stored_X, stored_y = load_holdout(version)
+    assert np.array_equal(stored_X, X) and np.array_equal(stored_y, y)
+
+    # compress_model.py selects and reports on exactly these rows, split in two
+    (X_select, y_select), (X_report, y_report) = validation_splits(version)
+    assert sorted(np.concatenate([y_select, y_report])) == list(y)
+
+    monkeypatch.setattr(model_registry, 'MAX_HOLDOUT_ROWS', 4)
+    capped = register_model(pipeline, holdout=(X, y))
+    assert len(load_holdout(capped)[1]) == 4
+    assert load_holdout(register_model(pipeline)) is None
@@ -0,0 +1,39 @@
+import pytest
+
+from features import FeatureValidationError
+from prediction_cache import PredictionCache
+
+RECORD = {'hour': 18, 'load': 19012.4, 'temperature': 31.2, 'is_weekend': True, 'is_holiday': 0}
+
+
+def test_quantize_rounds_to_steps():
+    cache = PredictionCache(load_step=50, temperature_step=0.5)
+    assert cache.quantize(RECORD) == {'hour': 18, 'load': 19000.0, 'temperature': 31.0,
+                                      'is_weekend': 1, 'is_holiday': 0}
+
+
+@pytest.mark.parametrize('field, value', [('hour', 'noon'), ('hour', None), ('hour', 12.7), ('load', [1, 2]),
+                                          ('is_weekend', None)])
+def test_quantize_rejects_invalid_fields(field, value):
+    with pytest.raises(FeatureValidationError):
+        PredictionCache().quantize(dict(RECORD, **{field: value}))
+
+
+def test_quantize_accepts_whole_float_hour():
+    assert PredictionCache().quantize(dict(RECORD, hour=18.0))['hour'] == 18
+
+
+def test_put_from_another_model_is_dropped():
+    cache = PredictionCache()
+    old, new = object(), object()
+    cache.bind_model(old)
+    key = cache.make_key(cache.quantize(RECORD))
+
+    # A request started on the old model finishes after the new one was bound
+    cache.bind_model(new)
+    cache.put(key, 41.0, old)
+    assert cache.get(key) is None
+    assert cache.stats()['stale_puts'] == 1
+
+    cache.put(key, 42.0, new)
+    assert cache.get(key) == 42.0
@@ -0,0 +1,89 @@
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from prediction_log import PredictionLog, BUCKET_SECONDS, MAX_QUERY_ROWS, parse_time
+
+ROW = [12, 15000.0, 25.0, 0, 0]
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = PredictionLog(path=str(tmp_path / 'log.sqlite'), retention_days=1)
+    yield log
+    log.close()
+
+
+def test_prune_keeps_rollups(log):
+    now = time.time()
+    old, recent = now - 3 * 86400, now - 60
+    # record() stamps the current time, so queue entries with explicit times
+    log._append((old, 'predict', 'v1', [ROW], [40.0]), 1)
+    log._append((recent, 'predict', 'v1', [ROW, ROW], [50.0, 60.0]), 2)
+    log.flush()
+
+    assert log.prune(now) == 1
+    assert [row['prediction'] for row in log.query()] == [60.0, 50.0]
+    # Whole hours still come from the rollup, pruned rows included
+    [group] = log.aggregate(end=(now // BUCKET_SECONDS) * BUCKET_SECONDS + BUCKET_SECONDS, group_by='none')
+    assert group['count'] == 3
+    assert log.stats()['pruned'] == 1
+
+
+def test_no_retention_prunes_nothing(tmp_path):
+    log = PredictionLog(path=str(tmp_path / 'log.sqlite'))
+    log._append((time.time() - 365 * 86400, 'predict', 'v1', [ROW], [40.0]), 1)
+    log.flush()
+    assert log.prune() == 0
+    assert len(log.query()) == 1
+    log.close()
+
+
+def test_close_closes_reader_connections(log):
+    log.record(np.array([ROW]), [42.0], 'v1', 'forecast')
+    log.flush()
+    assert len(log.query()) == 1
+    readers = list(log._readers)
+    log.close()
+
+    assert log._readers == []
+    with pytest.raises(sqlite3.ProgrammingError):
+        readers[0].execute('SELECT 1')
+    # A query after close opens a fresh connection
+    assert len(log.query()) == 1
+
+
+@pytest.mark.parametrize('limit', [0, -1, -100000])
+def test_query_limit_is_at_least_one(log, limit):
+    # SQLite treats a negative LIMIT as no limit at all
+    log._append((time.time(), 'predict', 'v1', [ROW] * 3, [40.0, 50.0, 60.0]), 3)
+    log.flush()
+    assert len(log.query(limit=limit)) == 1
+
+
+def test_query_limit_is_capped(log, monkeypatch):
+    monkeypatch.setattr('prediction_log.MAX_QUERY_ROWS', 2)
+    log._append((time.time(), 'predict', 'v1', [ROW] * 3, [40.0, 50.0, 60.0]), 3)
+    log.flush()
+    assert len(log.query(limit=MAX_QUERY_ROWS)) == 2
+
+
+@pytest.mark.parametrize('value', [
+    '2024-03-01T12:00:00+00:00',
+    '2024-03-01T12:00:00Z',
+    '2024-03-01T12:00:00z',
+    '2024-03-01T13:00:00 01:00',
+    '2024-03-01 13:00 01:00',
+    '2024-03-01T13:00:00.000 01:00',
+    '2024-03-01 12:00:00',
+    '1709294400',
+])
+def test_parse_time(value):
+    assert parse_time(value) == 1709294400.0
+
+
+def test_parse_time_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_time('yesterday')
@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+import pytest
+
+from request_coalescer import RequestCoalescer
+
+RECORD = {'hour': 12, 'load': 15000.0, 'temperature': 25.0, 'is_weekend': False, 'is_holiday': False}
+
+
+class DoublingModel:
+    def predict_matrix(self, X):
+        return X[:, 0] * 2
+
+
+def test_batching_thread_survives_unexpected_errors(monkeypatch):
+    coalescer = RequestCoalescer(window_ms=1).start()
+    observe = coalescer.batch_sizes.observe
+    calls = []
+
+    def fail_once(value):
+        calls.append(value)
+        if len(calls) == 1:
+            raise RuntimeError("histogram broke")
+        observe(value)
+
+    # Fails outside the per-group scoring try, which used to kill the thread
+    monkeypatch.setattr(coalescer.batch_sizes, 'observe', fail_once)
+    with pytest.raises(RuntimeError, match="histogram broke"):
+        coalescer.predict(DoublingModel(), RECORD, budget_ms=5000)
+
+    assert coalescer._thread.is_alive()
+    assert coalescer.predict(DoublingModel(), RECORD, budget_ms=5000) == 24.0
+
+
+def test_timeouts_are_counted_from_every_thread():
+    class SlowModel:
+        def __init__(self):
+            self.release = threading.Event()
+
+        def predict_matrix(self, X):
+            self.release.wait()
+            return np.zeros(len(X))
+
+    model = SlowModel()
+    coalescer = RequestCoalescer(window_ms=1).start()
+
+    def request():
+        with pytest.raises(TimeoutError):
+            coalescer.predict(model, RECORD, budget_ms=20)
+
+    threads = [threading.Thread(target=request) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    model.release.set()
+    assert coalescer.stats()['timeouts'] == 16
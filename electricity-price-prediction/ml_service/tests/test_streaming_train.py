@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from streaming_train import train_streaming
+from train_model import generate_synthetic_data
+
+DATA = generate_synthetic_data(n_samples=2000)
+
+
+def chunks_of(rows):
+    return lambda chunk_rows: (DATA.iloc[start:start + rows] for start in range(0, len(DATA), rows))
+
+
+@pytest.mark.parametrize('max_trees', [1, 7, 20, 45])
+def test_forest_never_exceeds_max_trees(max_trees):
+    # 20 chunks of 100 rows: fewer, as many and more trees than chunks
+    pipeline = train_streaming(chunks=chunks_of(100), max_trees=max_trees, max_depth=6, save=False)
+    forest = pipeline['regressor']
+    assert len(forest.estimators_) <= max_trees
+    assert len(forest.estimators_) == forest.n_estimators == max_trees
+
+
+def test_pooled_chunks_respect_row_budget():
+    pipeline = train_streaming(chunks=chunks_of(100), max_trees=4, max_rows_per_forest=150, max_depth=6,
+                               save=False)
+    # Each of the 4 forests pools 5 chunks, each contributing at most 150 // 5 rows
+    assert max(tree.tree_.n_node_samples[0] for tree in pipeline['regressor'].estimators_) <= 150
+
+
+
+def test_no_training_rows_raises(monkeypatch):
+    import streaming_train
+
+    # Every row held out, as with a store too small to leave any training rows
+    monkeypatch.setattr(streaming_train, '_split', lambda chunk, chunk_index: np.ones(len(chunk), dtype=bool))
+    with pytest.raises(ValueError, match="No trees were fitted"):
+        train_streaming(chunks=chunks_of(100), max_trees=5, save=False)
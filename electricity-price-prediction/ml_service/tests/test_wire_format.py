@@ -0,0 +1,75 @@
+import io
+
+import numpy as np
+import pytest
+
+import wire_format
+from features import FeatureValidationError, records_to_matrix
+
+# load and temperature are exactly representable as float32, so every layout decodes to the same matrix
+RECORDS = [
+    {'hour': 0, 'load': 10000.5, 'temperature': 2.25, 'is_weekend': False, 'is_holiday': False},
+    {'hour': 12, 'load': 15000.0, 'temperature': 25.5, 'is_weekend': True, 'is_holiday': False},
+    {'hour': 23, 'load': 21999.75, 'temperature': 37.75, 'is_weekend': True, 'is_holiday': True},
+]
+
+
+def npy_body(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def json_matrix():
+    return records_to_matrix(RECORDS)
+
+
+def test_records_round_trip(json_matrix):
+    body = wire_format.encode_records(json_matrix)
+    assert len(body) == len(RECORDS) * wire_format.RECORD_DTYPE.itemsize
+    assert np.array_equal(wire_format.decode(body, wire_format.RECORDS_MIMETYPE), json_matrix)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32, np.int64])
+def test_npy_matches_json(json_matrix, dtype):
+    if np.dtype(dtype).kind == 'i':
+        json_matrix = np.floor(json_matrix)
+    body = npy_body(json_matrix.astype(dtype))
+    assert np.array_equal(wire_format.decode(body, wire_format.NPY_MIMETYPE), json_matrix)
+
+
+def test_npy_fortran_order_and_single_row(json_matrix):
+    assert np.array_equal(wire_format.decode_npy(npy_body(np.asfortranarray(json_matrix))), json_matrix)
+    assert np.array_equal(wire_format.decode_npy(npy_body(json_matrix[1])), json_matrix[1:2])
+
+
+def test_npy_flags_are_normalized_like_json():
+    raw = np.array([[3, 12000, 10, 2, -1], [4, 12000, 10, 0, 0.5]], dtype=np.float64)
+    records = [{'hour': 3, 'load': 12000, 'temperature': 10, 'is_weekend': 2, 'is_holiday': -1},
+               {'hour': 4, 'load': 12000, 'temperature': 10, 'is_weekend': 0, 'is_holiday': 0.5}]
+    decoded = wire_format.decode(npy_body(raw), wire_format.NPY_MIMETYPE)
+    assert np.array_equal(decoded, records_to_matrix(records))
+    assert decoded[:, 3:].tolist() == [[1, 1], [0, 1]]
+
+
+def test_npy_missing_flag_is_rejected():
+    raw = np.array([[3, 12000, 10, np.nan, 3]])
+    with pytest.raises(FeatureValidationError):
+        wire_format.decode(npy_body(raw), wire_format.NPY_MIMETYPE)
+
+
+@pytest.mark.parametrize('body, mimetype', [
+    (b'\x00' * 7, wire_format.RECORDS_MIMETYPE),
+    (b'not an npy file', wire_format.NPY_MIMETYPE),
+    (npy_body(np.zeros((2, 4))), wire_format.NPY_MIMETYPE),
+    (npy_body(np.zeros((2, 5)))[:-8], wire_format.NPY_MIMETYPE),
+])
+def test_malformed_bodies_are_rejected(body, mimetype):
+    with pytest.raises(FeatureValidationError):
+        wire_format.decode(body, mimetype)
+
+
+def test_predictions_are_little_endian_float32():
+    body = wire_format.encode_predictions([1.5, 42.25])
+    assert np.frombuffer(body, dtype='<f4').tolist() == [1.5, 42.25]
@@ -2,28 +2,36 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+import time
+import shutil
+import tempfile
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import logging
 
+from data_store import load_data
+from model_registry import register_model
+
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def load_historical_data():
-    """Load historical electricity price data from CSV file"""
+    """Load historical electricity price data from the columnar data store"""
     try:
         # Path to historical data
         data_path = os.path.join('data', 'historical_electricity_data.csv')
         
-        # Check if the file exists
-        if os.path.exists(data_path):
-            logger.info(f"Loading historical data from {data_path}")
-            data = pd.read_csv(data_path)
+        # Check if the data exists
+        data = load_data(columns=['hour', 'load', 'temperature', 'is_weekend', 'is_holiday', 'price'])
+        if data is not None:
+            logger.info(f"Loaded historical data from {data_path} via the columnar store")
             return data
         else:
             logger.warning(f"Historical data file not found at {data_path}. Will generate synthetic data instead.")
@@ -80,17 +88,52 @@ def generate_synthetic_data(n_samples=1000):
     
     return df
 
-def train_model():
-    """Train a model to predict electricity prices using either historical or synthetic data"""
+def log_candidate_timings(search):
+    """Log wall time and score for every hyperparameter candidate"""
+    results = search.cv_results_
+    n_splits = search.n_splits_
+    logger.info("Candidate timings:")
+    for i, params in enumerate(results['params']):
+        wall_time = (results['mean_fit_time'][i] + results['mean_score_time'][i]) * n_splits
+        rmse = np.sqrt(-results['mean_test_score'][i])
+        label = ", ".join(f"{k.split('__')[-1]}={v}" for k, v in params.items())
+        iteration = f" (iteration {results['iter'][i]})" if 'iter' in results else ""
+        logger.info(f"  {label}{iteration}: {wall_time:.2f}s, CV RMSE {rmse:.2f}")
+
+def train_model(grid_mode=None, search=None, n_jobs=None, data=None):
+    """Train a model to predict electricity prices using either historical or synthetic data
+
+    With grid_mode (or GRID_MODE=true) the fitted pipeline is also scored over
+    the whole input domain and saved as a lookup grid next to the registered
+    model version.
+
+    search selects the hyperparameter search ('grid' for the exhaustive
+    GridSearchCV, 'halving' for successive halving) and n_jobs the number of
+    worker processes evaluating candidates; both default to the TRAIN_SEARCH
+    and TRAIN_N_JOBS environment variables.
+
+    data, if given, is a DataFrame with the feature and price columns to
+    train on instead of the historical data (used by benchmark.py).
+    """
+    if grid_mode is None:
+        grid_mode = os.environ.get('GRID_MODE', 'false').lower() == 'true'
+    if search is None:
+        search = os.environ.get('TRAIN_SEARCH', 'grid').lower()
+    if n_jobs is None:
+        n_jobs = int(os.environ.get('TRAIN_N_JOBS', 1))
+
     try:
-        # Try to load historical data first
-        data = load_historical_data()
-        
-        # If historical data is not available, generate synthetic data
-        if data is None:
-            data = generate_synthetic_data(n_samples=10000)
+        if data is not None:
+            logger.info(f"Training on {len(data)} supplied records")
         else:
-            logger.info(f"Loaded historical data with {len(data)} records")
+            # Try to load historical data first
+            data = load_historical_data()
+            
+            # If historical data is not available, generate synthetic data
+            if data is None:
+                data = generate_synthetic_data(n_samples=10000)
+            else:
+                logger.info(f"Loaded historical data with {len(data)} records")
         
         # Split features and target
         X = data[['hour', 'load', 'temperature', 'is_weekend', 'is_holiday']]
@@ -100,11 +143,14 @@ def train_model():
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
         logger.info("Training model...")
+        # Cache fitted scalers so candidates sharing a CV fold reuse the same one
+        cache_dir = tempfile.mkdtemp(prefix='pipeline_cache_')
+
         # Define model pipeline with preprocessing
         pipeline = Pipeline([
             ('scaler', StandardScaler()),
             ('regressor', RandomForestRegressor(random_state=42))
-        ])
+        ], memory=cache_dir)
         
         # Define hyperparameters for grid search
         param_grid = {
@@ -112,12 +158,28 @@ def train_model():
             'regressor__max_depth': [None, 10, 20, 30]
         }
         
-        # Perform grid search
-        grid_search = GridSearchCV(pipeline, param_grid, cv=3, scoring='neg_mean_squared_error')
-        grid_search.fit(X_train, y_train)
+        # Perform the hyperparameter search, evaluating candidates in n_jobs worker processes
+        if search == 'halving':
+            grid_search = HalvingGridSearchCV(pipeline, param_grid, cv=3, scoring='neg_mean_squared_error',
+                                              factor=2, n_jobs=n_jobs, random_state=42)
+        elif search == 'grid':
+            grid_search = GridSearchCV(pipeline, param_grid, cv=3, scoring='neg_mean_squared_error',
+                                       n_jobs=n_jobs)
+        else:
+            raise ValueError(f"Unknown search mode: {search}")
+
+        logger.info(f"Running {search} search with n_jobs={n_jobs}...")
+        search_start = time.perf_counter()
+        try:
+            grid_search.fit(X_train, y_train)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        logger.info(f"Search finished in {time.perf_counter() - search_start:.2f}s")
+        log_candidate_timings(grid_search)
         
-        # Get best model
+        # Get best model, detached from the temporary cache directory
         best_model = grid_search.best_estimator_
+        best_model.set_params(memory=None)
         logger.info(f"Best parameters: {grid_search.best_params_}")
         
         # Evaluate model
@@ -137,6 +199,18 @@ def train_model():
         model_path = os.path.join(model_dir, 'electricity_price_model.pkl')
         joblib.dump(best_model, model_path)
         logger.info(f"Model successfully saved to {model_path}")
+
+        # Record the model as a new version in the registry the service watches
+        version = register_model(best_model, source='train_model', metrics={
+            "rmse": float(rmse), "mae": float(mae), "r2": float(r2),
+            "params": {k: v for k, v in grid_search.best_params_.items()}
+        }, holdout=(X_test.to_numpy(dtype=np.float64), y_test.to_numpy(dtype=np.float64)))
+
+        # Precompute the prediction grid for lookup-based serving
+        if grid_mode:
+            from prediction_grid import build_and_save_grid
+            from model_registry import artifact_path
+            build_and_save_grid(best_model, os.path.dirname(artifact_path(version)))
         
         # Save feature importance
         if hasattr(best_model['regressor'], 'feature_importances_'):
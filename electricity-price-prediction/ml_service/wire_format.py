@@ -0,0 +1,118 @@
+"""
+Compact binary request/response bodies for high-volume prediction traffic.
+
+Two request layouts are accepted, both decoded with np.frombuffer straight
+from the request body:
+
+- application/x-electricity-records: packed little-endian records of
+  int8 hour, float32 load, float32 temperature and a uint8 flag byte
+  (bit 0 = weekend, bit 1 = holiday), 10 bytes per row.
+- application/x-npy: a .npy file holding an (n_rows, 5) or (5,) numeric
+  array with the columns in FEATURES order; any non-zero flag counts as 1.
+
+Predictions can be returned as a raw little-endian float32 buffer
+(application/octet-stream), one value per row.
+"""
+import io
+import numpy as np
+
+from features import FEATURES, BOOLEAN_FEATURES, FeatureValidationError
+
+RECORDS_MIMETYPE = 'application/x-electricity-records'
+NPY_MIMETYPE = 'application/x-npy'
+FLOAT32_MIMETYPE = 'application/octet-stream'
+
+RECORD_DTYPE = np.dtype([
+    ('hour', '<i1'),
+    ('load', '<f4'),
+    ('temperature', '<f4'),
+    ('flags', 'u1'),
+])
+
+WEEKEND_FLAG = 1
+HOLIDAY_FLAG = 2
+
+
+def encode_records(matrix):
+    """Pack an (n_rows, n_features) matrix into the fixed record layout (used by clients and tests)"""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float64))
+    records = np.empty(len(matrix), dtype=RECORD_DTYPE)
+    records['hour'] = matrix[:, FEATURES.index('hour')]
+    records['load'] = matrix[:, FEATURES.index('load')]
+    records['temperature'] = matrix[:, FEATURES.index('temperature')]
+    records['flags'] = ((matrix[:, FEATURES.index('is_weekend')] != 0) * WEEKEND_FLAG
+                        | (matrix[:, FEATURES.index('is_holiday')] != 0) * HOLIDAY_FLAG)
+    return records.tobytes()
+
+
+def decode_records(body):
+    """Feature matrix from packed records"""
+    if len(body) % RECORD_DTYPE.itemsize:
+        raise FeatureValidationError(
+            f"Body length {len(body)} is not a multiple of the {RECORD_DTYPE.itemsize}-byte record size")
+    records = np.frombuffer(body, dtype=RECORD_DTYPE)
+
+    columns = {
+        'hour': records['hour'],
+        'load': records['load'],
+        'temperature': records['temperature'],
+        'is_weekend': records['flags'] & WEEKEND_FLAG,
+        'is_holiday': (records['flags'] & HOLIDAY_FLAG) >> 1,
+    }
+    matrix = np.empty((len(records), len(FEATURES)), dtype=np.float64)
+    for i, field in enumerate(FEATURES):
+        matrix[:, i] = columns[field]
+    return matrix
+
+
+def decode_npy(body):
+    """Feature matrix from a .npy body, viewing the array data in place"""
+    header = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(header)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+        else:
+            raise ValueError(f"unsupported format version {version}")
+    except ValueError as e:
+        raise FeatureValidationError(f"Invalid .npy body: {str(e)}")
+    if dtype.kind not in 'biuf':
+        raise FeatureValidationError(f"Unsupported .npy dtype: {dtype}")
+    if len(shape) not in (1, 2) or shape[-1] != len(FEATURES):
+        raise FeatureValidationError(f".npy array must have shape (n_rows, {len(FEATURES)}), got {shape}")
+
+    count = int(np.prod(shape))
+    if len(body) - header.tell() < count * dtype.itemsize:
+        raise FeatureValidationError(".npy body is truncated")
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=header.tell())
+    array = array.reshape(shape[::-1]).T if fortran_order else array.reshape(shape)
+    matrix = np.atleast_2d(array).astype(np.float64, copy=False)
+
+    # Booleans are encoded as 0/1 like on the JSON path; the body is only copied if a flag needs it
+    flags = [FEATURES.index(field) for field in BOOLEAN_FEATURES]
+    values = matrix[:, flags]
+    if ((values != 0) & (values != 1) & ~np.isnan(values)).any():
+        matrix = matrix.copy()
+        matrix[:, flags] = np.where(np.isnan(values), np.nan, values != 0)
+    return matrix
+
+
+DECODERS = {
+    RECORDS_MIMETYPE: decode_records,
+    NPY_MIMETYPE: decode_npy,
+}
+
+
+def decode(body, mimetype):
+    """Validated (n_rows, n_features) float64 matrix from a binary request body"""
+    matrix = DECODERS[mimetype](body)
+    if not np.isfinite(matrix).all():
+        raise FeatureValidationError("Features must not contain missing or infinite values")
+    return matrix
+
+
+def encode_predictions(predictions):
+    """Predictions as a raw little-endian float32 buffer"""
+    return np.asarray(predictions, dtype='<f4').tobytes()
@@ -1,6 +1,7 @@
 import os
 import sys
 import subprocess
+import importlib.util
 
 # Add the ml_service directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'ml_service'))
@@ -8,17 +9,15 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'ml_service'))
 # Change to the ml_service directory
 os.chdir(os.path.join(os.path.dirname(__file__), 'ml_service'))
 
-# Install required dependencies
-print("Installing required packages...")
-subprocess.call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+# Install required dependencies only if some are missing
+required = ['pandas', 'numpy', 'sklearn', 'flask', 'flask_cors', 'joblib']
+if any(importlib.util.find_spec(name) is None for name in required):
+    print("Installing required packages...")
+    subprocess.call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
 
-# Generate the model if it doesn't exist
+# A missing model is generated by the service in the background once it is listening
 if not os.path.exists(os.path.join('model', 'electricity_price_model.pkl')):
-    print("Generating model from historical data...")
-    try:
-        import generate_model
-    except Exception as e:
-        print(f"Error generating model: {str(e)}")
+    print("Model not found; it will be trained in the background after startup.")
 
 # Start the Flask app
 print("Starting Flask application...")